@@ -0,0 +1,191 @@
+"""Run-history estimates and admission of due runs against host budgets.
+
+RunHistory keeps each task's most recent executions ("history_runs", 50 by
+default), loaded from the runs table and updated whenever a run finishes.
+From them it estimates:
+- typical and long duration (p50 and p95 of wall time);
+- peak memory (p95 of the peak RSS);
+- CPU use (the median number of cores a run keeps busy, CPU time / wall).
+Memory and CPU are only measured by the thread engine on POSIX systems.
+
+Admission holds queued runs back while their predicted memory or CPU would
+take the running total over "memory_budget_mb" or "cpu_budget" (cores).
+The worker pool and the asyncio supervisor start the first queued run that
+fits, so lighter runs overtake a heavy one that has to wait. Once a run has
+been held for "admission_max_delay" seconds, nothing behind it may overtake
+it any more, so it starts as soon as enough has finished. Tasks with no
+recorded runs, or none that were measured, count as using nothing. A run
+is always admitted when nothing else is running.
+"""
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+# Statuses of runs that actually executed (not skipped, unchanged or failed to start)
+EXECUTED = ("ok", "failed", "timeout", "cpu_limit", "killed")
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def format_duration(seconds):
+    # Short human form: "850ms", "12.3s", "4m05s", "2h10m"
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+class RunHistory:
+    def __init__(self, window=50):
+        self.window = max(1, int(window))
+        self._runs = {}  # task id -> deque of (duration, max_rss_mb, cores)
+        self._stats = {}  # task id -> summary, dropped when a run is added
+        self._lock = threading.Lock()
+
+    def load(self, store):
+        # Seed from the run history in tasks.db (one query for every task)
+        runs = {}
+        for task_id, duration, cpu_user, cpu_sys, max_rss_mb in store.recent_runs(self.window, EXECUTED):
+            runs.setdefault(task_id, deque(maxlen=self.window)).append(self._sample(duration, cpu_user, cpu_sys, max_rss_mb))
+        with self._lock:
+            for task_id, samples in runs.items():
+                # Runs that finished while loading are newer than the loaded ones
+                samples.extend(self._runs.get(task_id, ()))
+                self._runs[task_id] = samples
+            self._stats.clear()
+
+    @staticmethod
+    def _sample(duration, cpu_user, cpu_sys, max_rss_mb):
+        cores = None
+        if cpu_user is not None and duration:
+            cores = (cpu_user + (cpu_sys or 0)) / duration
+        return duration, max_rss_mb, cores
+
+    def observe(self, task_id, status, wall, usage):
+        if status not in EXECUTED or wall is None:
+            return
+        sample = self._sample(wall, usage.get("cpu_user"), usage.get("cpu_sys"), usage.get("max_rss_mb"))
+        with self._lock:
+            self._runs.setdefault(task_id, deque(maxlen=self.window)).append(sample)
+            self._stats.pop(task_id, None)
+
+    def forget(self, task_id):
+        with self._lock:
+            self._runs.pop(task_id, None)
+            self._stats.pop(task_id, None)
+
+    def stats(self, task_id):
+        # {"runs", "p50", "p95", "rss_mb", "cores"} (None where unknown), or None without history
+        with self._lock:
+            stats = self._stats.get(task_id)
+            if stats is not None or task_id not in self._runs:
+                return stats
+            samples = list(self._runs[task_id])
+        durations = [s[0] for s in samples]
+        rss = [s[1] for s in samples if s[1] is not None]
+        cores = [s[2] for s in samples if s[2] is not None]
+        stats = {
+            "runs": len(samples),
+            "p50": _pct(durations, 0.50),
+            "p95": _pct(durations, 0.95),
+            "rss_mb": _pct(rss, 0.95) if rss else None,
+            "cores": _pct(cores, 0.50) if cores else None,
+        }
+        with self._lock:
+            if task_id in self._runs:
+                self._stats[task_id] = stats
+        return stats
+
+    def predict(self, task_id):
+        # (memory MB, cores) a run of the task is expected to need
+        stats = self.stats(task_id)
+        if stats is None:
+            return 0.0, 0.0
+        return stats["rss_mb"] or 0.0, stats["cores"] or 0.0
+
+class Admission:
+    # Reservations of running jobs, by key (task id): the predicted memory
+    # and CPU of each, and when it started
+    def __init__(self, history, memory_mb=0, cpu=0, max_delay=300):
+        self.history = history
+        self.memory_mb = float(memory_mb or 0)
+        self.cpu = float(cpu or 0)
+        self.max_delay = float(max_delay)
+        self._running = {}  # key -> [(memory MB, cores, started)]
+        self._memory = 0.0
+        self._cores = 0.0
+        self._held = set()  # (key, enqueued) of queued jobs that were held back
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.delayed = 0
+
+    def add_listener(self, listener):
+        # listener() is called after every release, from the releasing
+        # thread, so each pool sharing this budget can retry its held jobs
+        self._listeners.append(listener)
+
+    def acquire(self, key, enqueued, waited):
+        # Called by a pool choosing its next job: True to start the job now
+        # (its prediction is reserved until release(key)), False to try the
+        # jobs behind it, None if none of them may overtake it
+        memory, cores = self.history.predict(key)
+        with self._lock:
+            fits = not self._running or (
+                (not self.memory_mb or self._memory + memory <= self.memory_mb)
+                and (not self.cpu or self._cores + cores <= self.cpu))
+            if not fits:
+                self._held.add((key, enqueued))
+                return None if waited >= self.max_delay else False
+            if (key, enqueued) in self._held:
+                self._held.discard((key, enqueued))
+                self.delayed += 1
+            self._running.setdefault(key, []).append((memory, cores, datetime.now()))
+            self._memory += memory
+            self._cores += cores
+            return True
+
+    def discard(self, key, enqueued):
+        # A queued job was dropped before it started: forget that it was held
+        with self._lock:
+            self._held.discard((key, enqueued))
+
+    def release(self, key):
+        with self._lock:
+            jobs = self._running.get(key)
+            if not jobs:
+                return
+            memory, cores, _ = jobs.pop(0)
+            if not jobs:
+                del self._running[key]
+            self._memory -= memory
+            self._cores -= cores
+            if not self._running:
+                self._memory = self._cores = 0.0  # no float drift
+        for listener in list(self._listeners):
+            try:
+                listener()
+            except Exception as e:
+                logging.error(f"Admission listener failed: {e}")
+
+    def predicted_end(self, key):
+        # Expected end of the task's oldest running job from its median
+        # duration, or None if it is not running or has no history
+        with self._lock:
+            jobs = self._running.get(key)
+            started = jobs[0][2] if jobs else None
+        stats = self.history.stats(key)
+        if started is None or stats is None:
+            return None
+        return started + timedelta(seconds=stats["p50"])
+
+    def stats(self):
+        with self._lock:
+            return {"memory_budget_mb": self.memory_mb, "cpu_budget": self.cpu,
+                    "reserved_memory_mb": self._memory, "reserved_cores": self._cores,
+                    "running": sum(len(jobs) for jobs in self._running.values()),
+                    "held": len(self._held), "delayed": self.delayed}
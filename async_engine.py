@@ -0,0 +1,306 @@
+"""Event-loop execution engine ("engine": "asyncio" in settings.json).
+
+The default engine gives every running task a pool thread that blocks on
+the child's output. Here one asyncio loop, on its own thread, supervises all
+children: output is read as it arrives, timeouts and cancellation are loop
+timers, and the scheduler hands runs over through a lock-protected queue.
+Run history, log segments, live tails and metrics are recorded through the
+same task_core.ExecutionRecord as TaskEngine._execute_task; its SQLite and
+file I/O, and writing the output, run in worker threads off the loop.
+
+Warm Python tasks and pipeline nodes still go through the thread pool.
+CPU time and peak memory are not recorded here, since the loop's child
+watcher reaps the processes.
+"""
+import os
+import sys
+import time
+import signal
+import shutil
+import asyncio
+import logging
+import threading
+import subprocess
+from collections import deque
+
+import limits
+from fingerprint import UNCHANGED
+from task_core import ExecutionRecord, OutputCapture, OUTPUT_CHUNK_SIZE, task_env
+
+NO_USAGE = {"cpu_user": None, "cpu_sys": None, "max_rss_mb": None}
+
+def build_argv(task):
+    # The command _execute_task runs through the shell, as an argv list
+    path = task["file_path"]
+    ext = os.path.splitext(path)[1].lower()
+    if task.get("command"):
+        argv = ["cmd", "/c", task["command"]] if os.name == "nt" else ["/bin/sh", "-c", task["command"]]
+    elif ext in (".bat", ".cmd"):
+        argv = ["cmd", "/c", path]
+    elif ext == ".py":
+        argv = [shutil.which("python") or sys.executable, path]
+    else:
+        argv = [path]
+    return limits.io_prefix(task) + argv
+
+async def terminate_tree(proc, grace=limits.KILL_GRACE):
+    # limits.terminate_tree without blocking the loop
+    if os.name == "nt":
+        await asyncio.to_thread(subprocess.run, ["taskkill", "/T", "/PID", str(proc.pid)], capture_output=True)
+        try:
+            await asyncio.wait_for(proc.wait(), grace)
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(subprocess.run, ["taskkill", "/T", "/F", "/PID", str(proc.pid)],
+                                    capture_output=True)
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    for _ in range(int(grace * 10)):
+        await asyncio.sleep(0.1)
+        try:
+            os.killpg(proc.pid, 0)
+        except ProcessLookupError:
+            return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+async def off_loop(func, *args):
+    # asyncio.to_thread that, if the run is cancelled meanwhile, still waits
+    # for func to return, so the bookkeeping after it sees its effects
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await future
+        raise
+
+def _use_pidfd_watcher(loop):
+    # Before 3.12 the default child watcher starts a thread per child; pidfds
+    # let the loop itself wait for thousands of them
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return  # kernel older than 5.3
+    watcher = asyncio.PidfdChildWatcher()
+    asyncio.set_child_watcher(watcher)
+    watcher.attach_loop(loop)
+
+class AsyncSupervisor:
+    # Same queueing rules as ExecutionPool: at most max_jobs runs at once, at
+    # most max_instances overlapping runs per task, and a task already waiting
+    # in the queue is not queued twice, and runs wait for the admission
+    # controller (adaptive.Admission) as they do there
+    def __init__(self, engine, max_jobs=1000, wait_samples=1000, admission=None):
+        self.engine = engine
+        self.admission = admission
+        self.max_jobs = max(1, int(max_jobs))
+        self._queue = deque()  # (key, task, manual, fire_lag, on_done, enqueued_at)
+        self._running = {}
+        self._active = 0
+        self._jobs = {}  # key -> asyncio tasks, only touched on the loop
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=wait_samples)
+        self.loop = asyncio.new_event_loop()
+        _use_pidfd_watcher(self.loop)
+        if admission is not None:
+            # Budget freed by another pool sharing it (the worker threads)
+            admission.add_listener(lambda: self.loop.call_soon_threadsafe(self._pump))
+        self._thread = threading.Thread(target=self._run_loop, name="async-supervisor", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, key, task, manual=False, fire_lag=0.0, on_done=None, unique=True):
+        # Thread-safe; on_done(status) is called on the loop once the run is
+        # over, with "cancelled" if cancel() dropped it from the queue.
+        # Like ExecutionPool.submit, a queued task is not queued again unless
+        # unique is False
+        with self._cond:
+            if unique and any(job[0] == key for job in self._queue):
+                return False
+            self._queue.append((key, task, manual, fire_lag, on_done, time.monotonic()))
+        self.loop.call_soon_threadsafe(self._pump)
+        return True
+
+    def cancel(self, key=None):
+        # Terminate the runs of one task (every run if key is None) and drop
+        # its queued runs; cancelled runs are recorded as killed
+        with self._cond:
+            dropped = [job for job in self._queue if key is None or job[0] == key]
+            self._queue = deque(job for job in self._queue if key is not None and job[0] != key)
+            self._cond.notify_all()
+        def cancel_jobs():
+            for job_key, jobs in self._jobs.items():
+                if key is None or job_key == key:
+                    for job in jobs:
+                        job.cancel()
+            for job_key, _, _, _, on_done, enqueued in dropped:
+                if self.admission is not None:
+                    self.admission.discard(job_key, enqueued)
+                if on_done is not None:
+                    try:
+                        on_done("cancelled")
+                    except Exception as e:
+                        logging.error(f"[ASYNC] Cancelling job {job_key} failed: {e}")
+        self.loop.call_soon_threadsafe(cancel_jobs)
+
+    def running_count(self, key):
+        with self._cond:
+            return self._running.get(key, 0)
+
+    def is_queued(self, key):
+        with self._cond:
+            return any(job[0] == key for job in self._queue)
+
+    def _next_job(self):
+        now = time.monotonic()
+        for i, job in enumerate(self._queue):
+            if self._running.get(job[0], 0) >= max(1, int(job[1].get("max_instances", 1))):
+                continue
+            if self.admission is not None:
+                admitted = self.admission.acquire(job[0], job[5], now - job[5])
+                if admitted is None:
+                    return None  # held too long: nothing behind it may start first
+                if not admitted:
+                    continue
+            del self._queue[i]
+            return job
+        return None
+
+    def _pump(self):
+        # On the loop: start queued runs while there is room
+        batch = []
+        with self._cond:
+            while self._active < self.max_jobs:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._running[job[0]] = self._running.get(job[0], 0) + 1
+                self._active += 1
+                batch.append(job)
+        for job in batch:
+            self._jobs.setdefault(job[0], set()).add(self.loop.create_task(self._supervise(job)))
+
+    async def _supervise(self, job):
+        key, task, manual, fire_lag, on_done, enqueued = job
+        wait = time.monotonic() - enqueued
+        self._waits.append(wait)
+        status = "error"
+        try:
+            status = await self._execute(task, manual, wait, fire_lag)
+        except asyncio.CancelledError:
+            status = "killed"
+        except Exception as e:
+            logging.error(f"[ASYNC] Job {key} failed: {e}")
+        finally:
+            if self.admission is not None:
+                self.admission.release(key)
+            jobs = self._jobs.get(key)
+            if jobs is not None:
+                jobs.discard(asyncio.current_task())
+                if not jobs:
+                    del self._jobs[key]
+            with self._cond:
+                self._running[key] -= 1
+                if not self._running[key]:
+                    del self._running[key]
+                self._active -= 1
+                self._cond.notify_all()
+            if on_done is not None:
+                on_done(status)
+            self._pump()
+
+    async def _execute(self, task, manual, wait, fire_lag):
+        # TaskEngine._execute_task with the process on the loop
+        run = ExecutionRecord(self.engine, task, manual, wait, fire_lag)
+        run.usage = NO_USAGE
+        if await off_loop(run.unchanged):
+            return UNCHANGED
+        try:
+            task_dir, extra_env = await off_loop(run.prepare)
+            argv = build_argv(task)
+            await off_loop(run.start, subprocess.list2cmdline(argv))
+            proc = await asyncio.create_subprocess_exec(*argv, cwd=task_dir, env=task_env(task, extra_env),
+                                                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                                                        **limits.popen_kwargs(task))
+            limits.apply_limits(task, proc.pid)
+            await self._stream_to_log(run, proc)
+            await off_loop(run.completed)
+        except Exception as e:
+            await off_loop(run.failed, e)
+        finally:
+            await off_loop(run.finish)
+        return run.status
+
+    async def _stream_to_log(self, run, proc):
+        timeout = limits.task_limit(run.task, "timeout")
+        try:
+            write = await off_loop(run.open_log)
+            capture = OutputCapture(write, run.tail, run.max_bytes)
+            reader = asyncio.ensure_future(self._read(proc, capture))
+            stopped = None
+            try:
+                # shield: on timeout or cancellation keep reading until
+                # the terminated tree closes its end of the pipe
+                await asyncio.wait_for(asyncio.shield(reader), timeout or None)
+            except asyncio.TimeoutError:
+                stopped = "timeout"
+                logging.info(f"Run of pid {proc.pid} exceeded its {timeout}s timeout, terminating")
+                await terminate_tree(proc)
+            except asyncio.CancelledError:
+                stopped = "killed"
+                await terminate_tree(proc)
+            await reader
+            exit_code = await proc.wait()
+            total, dropped = await off_loop(capture.close)
+            await off_loop(run.end_log, exit_code, stopped or limits.run_status(exit_code), timeout, total, dropped)
+        finally:
+            await off_loop(run.close_log)
+
+    @staticmethod
+    async def _read(proc, capture):
+        while True:
+            data = await proc.stdout.read(OUTPUT_CHUNK_SIZE)
+            if not data:
+                break
+            # Decoding and writing the log file: off the loop
+            await off_loop(capture.feed, data)
+
+    def wait_idle(self, timeout=None):
+        # Wait until nothing is queued or running; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self):
+        # Callbacks already handed to the loop (cancel's on_done) run first
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(5)
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+            running = self._active
+        waits = sorted(self._waits)
+        stats = {"queued": queued, "running": running, "max_jobs": self.max_jobs}
+        if waits:
+            stats.update({
+                "wait_mean": sum(waits) / len(waits),
+                "wait_p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))],
+                "wait_max": waits[-1],
+            })
+        return stats
@@ -0,0 +1,116 @@
+"""Supervisor cost of the thread pool engine against the asyncio engine.
+
+    python benchmarks/bench_async_engine.py [--jobs 1000] [--sleep 2] [--out results.json]
+
+Starts --jobs runs of a shell stub that sleeps, all at once, and measures
+the runner process itself while they are in flight: peak RSS, peak OS
+thread count, CPU time (excluding the children) and the wall time until
+the last run is recorded. Each engine is measured in a fresh process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def read_status():
+    # (RSS MB, OS threads) of this process; Linux only, else (None, thread count)
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["Threads"])
+    except OSError:
+        return None, threading.active_count()
+
+def measure(engine_name, jobs, sleep, folder):
+    # Runs in the child process; returns one result dict
+    from task_core import TaskEngine, DEFAULT_SETTINGS
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+    stub = os.path.join(folder, "stub.sh")
+    with open(stub, "w") as f:
+        f.write(f"#!/bin/sh\necho started\nsleep {sleep}\necho done\n")
+    os.chmod(stub, 0o755)
+    os.chdir(folder)  # the engine keeps logs/ relative to the working directory
+    # Each engine gets room for every run at once (the thread pool starts its
+    # threads up front, so only the engine under test gets the large limit)
+    settings = dict(DEFAULT_SETTINGS, engine=engine_name, async_max_jobs=jobs, python_workers=0, log_level="WARNING")
+    if engine_name == "threads":
+        settings["max_workers"] = jobs
+    engine = TaskEngine(settings, db_file=os.path.join(folder, f"{engine_name}.db"),
+                        tasks_file=os.path.join(folder, "none.json"))
+    tasks = []
+    for i in range(jobs):
+        task = {"name": f"job-{i}", "file_path": stub, "cron_expr": "0 0 1 1 *", "retention": 1, "log_executions": 1}
+        engine.add_task(task)
+        tasks.append(task)
+    finished = threading.Semaphore(0)
+    engine.add_listener(lambda event, task, detail: finished.release() if event in ("finished", "error") else None)
+    rss_before, threads_before = read_status()
+    peak = {"rss": rss_before, "threads": threads_before}
+    sampling = threading.Event()
+    def sample():
+        while not sampling.wait(0.05):
+            rss, threads = read_status()
+            peak["rss"] = max(peak["rss"] or 0, rss or 0) or None
+            peak["threads"] = max(peak["threads"], threads)
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    cpu_before = os.times()
+    start = time.perf_counter()
+    for task in tasks:
+        engine._run_scheduled_task(task)
+    for _ in tasks:
+        finished.acquire()
+    wall = time.perf_counter() - start
+    cpu_after = os.times()
+    sampling.set()
+    sampler.join()
+    engine.stop(10)
+    return {
+        "wall_s": wall,
+        "overhead_s": wall - sleep,
+        "cpu_s": (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system),
+        "rss_before_mb": rss_before,
+        "rss_peak_mb": peak["rss"],
+        "threads_before": threads_before,
+        "threads_peak": peak["threads"] - 1,  # not counting the sampler
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=1000, help="concurrent runs")
+    parser.add_argument("--sleep", type=float, default=2.0, help="seconds each run sleeps")
+    parser.add_argument("--engines", default="threads,asyncio")
+    parser.add_argument("--out", help="write the JSON results here (default: print them)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        with tempfile.TemporaryDirectory() as folder:
+            print(json.dumps(measure(args.child, args.jobs, args.sleep, folder)))
+        return 0
+    report = {"jobs": args.jobs, "sleep": args.sleep, "results": {}}
+    for name in args.engines.split(","):
+        print(f"{name}: {args.jobs} concurrent runs...", file=sys.stderr)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, "--jobs", str(args.jobs),
+                              "--sleep", str(args.sleep)], capture_output=True, text=True, check=True).stdout
+        report["results"][name] = json.loads(out.strip().splitlines()[-1])
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
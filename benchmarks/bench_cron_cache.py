@@ -0,0 +1,63 @@
+"""Compare next-run calculation through CronCache against a fresh croniter per call.
+
+    python benchmarks/bench_cron_cache.py [--tasks 10000] [--distinct 200] [--k 1]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from croniter import croniter
+from cron_cache import CronCache
+
+def make_fleet(n, distinct, seed=1):
+    # Fleet where many tasks share a schedule, like a real one
+    rng = random.Random(seed)
+    exprs = ["* * * * *", "*/5 * * * *", "0 * * * *", "0 0 * * *", "*/15 9-17 * * 1-5"]
+    while len(exprs) < distinct:
+        exprs.append(f"{rng.randrange(60)} {rng.randrange(24)} * * {rng.choice(['*', '1-5', '0,6'])}")
+    return [(i, rng.choice(exprs)) for i in range(n)]
+
+def per_call_croniter(fleet, base, k):
+    for _, expr in fleet:
+        itr = croniter(expr, base)
+        for _ in range(k):
+            itr.get_next(datetime)
+
+def per_call_cache(fleet, base, k, cache):
+    for _, expr in fleet:
+        cache.compile(expr).next_times(base, k)
+
+def batch_cache(fleet, base, k, cache):
+    cache.next_runs(fleet, base, k)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--distinct", type=int, default=200)
+    parser.add_argument("--k", type=int, default=1, help="next fire times per task")
+    args = parser.parse_args()
+    fleet = make_fleet(args.tasks, args.distinct)
+    base = datetime.now()
+    cache = CronCache()
+    results = {
+        "croniter per call": timed(per_call_croniter, fleet, base, args.k),
+        "cache per call (cold)": timed(per_call_cache, fleet, base, args.k, cache),
+        "cache per call (warm)": timed(per_call_cache, fleet, base, args.k, cache),
+        "cache batch (warm)": timed(batch_cache, fleet, base, args.k, cache),
+    }
+    print(f"{args.tasks} tasks, {args.distinct} distinct expressions, k={args.k}")
+    baseline = results["croniter per call"]
+    for name, seconds in results.items():
+        print(f"  {name:<24} {seconds * 1000:9.1f} ms  {baseline / seconds:6.1f}x")
+
+if __name__ == "__main__":
+    main()
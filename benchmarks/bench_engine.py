@@ -0,0 +1,251 @@
+"""Benchmark the scheduler core with synthetic task fleets, without the GUI.
+
+    python benchmarks/bench_engine.py [--fleets 100,1000,10000,50000] [--out results.json]
+    python benchmarks/bench_engine.py --compare baseline.json [--threshold 0.2]
+
+Measures, per fleet size: timer heap tick cost, fire-time lag distribution,
+task store persistence cost, log store append/trim throughput against log
+size, and process-launch overhead. Results are written as JSON; --compare
+reports the ratio to an earlier result file and exits 1 on regressions.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_cron_cache import make_fleet
+from cron_cache import cron_cache
+from task_core import TimerHeapScheduler, LogStore, TaskEngine, DEFAULT_SETTINGS, stream_output
+from task_store import TaskStore
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    def pct(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+    return {"mean": sum(samples) / len(samples), "p50": pct(0.50), "p95": pct(0.95),
+            "p99": pct(0.99), "max": samples[-1]}
+
+def make_tasks(n, folder):
+    return [{"name": f"task-{i}", "file_path": os.path.join(folder, f"task-{i}.py"), "cron_expr": expr,
+             "retention": 1, "log_executions": 3, "status": "Active"}
+            for i, expr in make_fleet(n, min(200, max(5, n // 10)))]
+
+def write_stub(folder, name, sleep=0.0, output_bytes=0):
+    # Stub task: sleeps and prints a configurable volume of output
+    path = os.path.join(folder, name)
+    with open(path, "w") as f:
+        f.write("import sys, time\n")
+        if sleep:
+            f.write(f"time.sleep({sleep})\n")
+        if output_bytes:
+            f.write(f"line = 'x' * 99 + '\\n'\n"
+                    f"for _ in range({output_bytes // 100}):\n"
+                    f"    sys.stdout.write(line)\n")
+    return path
+
+# --- sections ---
+
+def bench_tick(n):
+    # Cost of one fire: pop the due entry, compute its next time, push it back
+    base = datetime.now()
+    fleet = make_fleet(n, min(200, max(5, n // 10)))
+    done = threading.Event()
+    fired = [0]
+    def on_due(key, expr, when):
+        scheduler.schedule(key, cron_cache.next_run(expr, when) + timedelta(days=3650), expr)
+        fired[0] += 1
+        if fired[0] == n:
+            done.set()
+    scheduler = TimerHeapScheduler(on_due)
+    start = time.perf_counter()
+    for key, expr in fleet:
+        scheduler.schedule(key, base - timedelta(seconds=1), expr)
+    schedule_cost = (time.perf_counter() - start) / n
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    done.wait()
+    fire_cost = (time.perf_counter() - start) / n
+    scheduler.stop()
+    start = time.perf_counter()
+    for _ in range(1000):
+        scheduler.next_fire_time()
+    idle_cost = (time.perf_counter() - start) / 1000
+    return {"schedule_s": schedule_cost, "fire_s": fire_cost, "peek_s": idle_cost}
+
+def bench_lag(n, seconds, fires=200):
+    # `fires` timers due within `seconds`, among n - fires far in the future
+    now = datetime.now()
+    scheduler = TimerHeapScheduler(lambda key, item, when: None, lag_samples=fires)
+    for i in range(n - fires):
+        scheduler.schedule(("idle", i), now + timedelta(days=1))
+    for i in range(fires):
+        scheduler.schedule(i, now + timedelta(seconds=0.2 + seconds * i / fires))
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    time.sleep(seconds + 0.5)
+    scheduler.stop()
+    return {k: v for k, v in scheduler.lag_stats().items() if k != "last"}
+
+def bench_store(n, folder):
+    path = os.path.join(folder, f"store-{n}.db")
+    store = TaskStore(path)
+    tasks = make_tasks(n, folder)
+    start = time.perf_counter()
+    for task in tasks:
+        store.insert_task(task)
+    insert = (time.perf_counter() - start) / n
+    samples = []
+    for task in tasks[:200]:
+        task["last_execution"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        start = time.perf_counter()
+        store.update_task(task)
+        samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    store.update_tasks(tasks)
+    update_all = time.perf_counter() - start
+    start = time.perf_counter()
+    store.load_tasks()
+    load = time.perf_counter() - start
+    store.close()
+    return {"insert_s": insert, "update_one": percentiles(samples), "update_all_s": update_all, "load_all_s": load}
+
+def bench_logs(folder, sizes, executions=20, keep=3):
+    # One execution = open segment, stream output into it, close (and trim)
+    results = {}
+    for size in sizes:
+        root = os.path.join(folder, f"logs-{size}")
+        store = LogStore(root)
+        task = {"name": f"log-{size}", "log_executions": keep}
+        payload = (b"x" * 99 + b"\n") * (size // 100)
+        start = time.perf_counter()
+        for _ in range(executions):
+            entry, path = store.open_segment(task, "scheduled")
+            with open(path, "w", encoding="utf-8") as out:
+                stream_output(io.BufferedReader(io.BytesIO(payload)), out.write)
+            store.close_segment(task, entry, 0)
+        elapsed = time.perf_counter() - start
+        results[str(size)] = {"per_execution_s": elapsed / executions,
+                              "mb_per_s": size * executions / 2**20 / elapsed}
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def bench_launch(folder, runs, sleep, output_bytes):
+    # Bare Popen of the stub against the engine's full execution path
+    # (run history, log segment, streaming) for the same stub
+    stub = write_stub(folder, "stub.py", sleep, output_bytes)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(f'"{sys.executable}" "{stub}"', shell=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    results = {"popen": percentiles(samples)}
+    cwd = os.getcwd()
+    os.chdir(folder)  # the engine keeps logs/ relative to the working directory
+    try:
+        settings = dict(DEFAULT_SETTINGS, python_workers=1, log_level="WARNING")
+        engine = TaskEngine(settings, db_file=os.path.join(folder, "launch.db"),
+                            tasks_file=os.path.join(folder, "none.json"))
+        for mode, warm in (("engine", False), ("engine_warm", True)):
+            task = {"name": mode, "file_path": stub, "cron_expr": "0 0 1 1 *", "retention": 1,
+                    "log_executions": 3, "warm_python": warm}
+            engine.add_task(task)
+            engine._execute_task(task)  # warm-up (starts the warm worker)
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                engine._execute_task(task)
+                samples.append(time.perf_counter() - start)
+            results[mode] = percentiles(samples)
+        engine.stop()
+        engine.store.close()
+    finally:
+        os.chdir(cwd)
+    return results
+
+# --- comparison ---
+
+def flatten(tree, prefix=""):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(current, baseline, threshold):
+    # Higher is better only for throughput; everything else is a cost
+    old = flatten(baseline["results"])
+    regressions = 0
+    for name, value in sorted(flatten(current["results"]).items()):
+        if name not in old or not old[name] or name.endswith(".count"):
+            continue
+        ratio = value / old[name]
+        worse = ratio < 1 - threshold if name.endswith("mb_per_s") else ratio > 1 + threshold
+        regressions += worse
+        print(f"  {'REGRESSION' if worse else '':<10} {name:<55} {ratio:6.2f}x", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fleets", default="100,1000,10000,50000", help="comma separated fleet sizes")
+    parser.add_argument("--lag-seconds", type=float, default=2.0, help="real-time window for the lag test")
+    parser.add_argument("--log-sizes", default="1024,1048576,16777216", help="output bytes per execution")
+    parser.add_argument("--launch-runs", type=int, default=20)
+    parser.add_argument("--stub-sleep", type=float, default=0.0, help="seconds the launch stub sleeps")
+    parser.add_argument("--stub-output", type=int, default=10000, help="bytes the launch stub prints")
+    parser.add_argument("--out", help="write the JSON results here (default: print them)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+    fleets = [int(n) for n in args.fleets.split(",") if n]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    report = {
+        "meta": {"time": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "args": vars(args)},
+        "results": {"tick": {}, "lag": {}, "store": {}},
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        for n in fleets:
+            print(f"fleet of {n} tasks...", file=sys.stderr)
+            report["results"]["tick"][str(n)] = bench_tick(n)
+            report["results"]["lag"][str(n)] = bench_lag(n, args.lag_seconds)
+            report["results"]["store"][str(n)] = bench_store(n, folder)
+        print("log store...", file=sys.stderr)
+        report["results"]["logs"] = bench_logs(folder, [int(s) for s in args.log_sizes.split(",") if s])
+        print("process launch...", file=sys.stderr)
+        report["results"]["launch"] = bench_launch(folder, args.launch_runs, args.stub_sleep, args.stub_output)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {args.compare} ({baseline['meta'].get('commit') or 'unknown commit'}):", file=sys.stderr)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
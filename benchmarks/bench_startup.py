@@ -0,0 +1,126 @@
+"""Cold start of the engine with a large fleet, and a tasks.json reload.
+
+    python benchmarks/bench_startup.py [--tasks 10000] [--repeat 3] [--out results.json]
+
+Each repeat runs in a fresh process. It measures:
+- how long importing task_core takes;
+- how long TaskEngine() takes;
+- how long start() takes to return;
+- how long until every task is in the timer heap.
+Two databases are measured. "restart" has a stored next_run for every
+task, as after any earlier run. "imported" has none, as after a bulk
+import. Last comes a reload of a tasks.json holding the whole fleet: once
+with nothing changed, and once after one entry was edited. The median of
+the repeats is reported.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_db(folder, n, stored):
+    # tasks.db and tasks.json with the same n tasks, managed by the file
+    from bench_cron_cache import make_fleet
+    from cron_cache import cron_cache
+    from task_store import TaskStore
+    from task_file import SOURCE
+    entries = [{"name": f"task-{i}", "file_path": os.path.join(folder, f"task-{i}.py"), "cron_expr": expr}
+               for i, expr in make_fleet(n, min(200, max(5, n // 10)))]
+    with open(os.path.join(folder, "tasks.json"), "w") as f:
+        json.dump(entries, f)
+    tasks = [dict(entry, retention=1, log_executions=1, max_instances=1, status="Active", depends_on=[], source=SOURCE)
+             for entry in entries]
+    if stored:
+        next_runs = cron_cache.next_runs((i, task["cron_expr"]) for i, task in enumerate(tasks))
+        for i, task in enumerate(tasks):
+            task["next_run"] = next_runs[i][0].strftime("%Y-%m-%d %H:%M:%S")
+    store = TaskStore(os.path.join(folder, "tasks.db"))
+    store.apply_batch(tasks)
+    store.set_meta("migrated_json", os.path.join(folder, "tasks.json"))  # already in the database
+    store.close()
+
+def measure(folder, n):
+    # Runs in the child process, on a copy of the database; returns one result dict
+    start = time.perf_counter()
+    import task_core
+    imported = time.perf_counter()
+    os.chdir(folder)  # the engine keeps logs/ relative to the working directory
+    settings = dict(task_core.DEFAULT_SETTINGS, search_index=False, python_workers=0, log_level="WARNING")
+    engine = task_core.TaskEngine(settings, db_file=os.path.join(folder, "run.db"),
+                                  tasks_file=os.path.join(folder, "tasks.json"))
+    created = time.perf_counter()
+    engine.start()
+    started = time.perf_counter()
+    while len(engine.scheduler) < n:
+        time.sleep(0.001)
+    scheduled = time.perf_counter()
+    reload_start = time.perf_counter()
+    engine.reload_tasks_file()
+    reload_same = time.perf_counter() - reload_start
+    with open("tasks.json") as f:
+        entries = json.load(f)
+    entries[n // 2]["cron_expr"] = "59 23 * * *"
+    with open("tasks.json", "w") as f:
+        json.dump(entries, f)
+    reload_start = time.perf_counter()
+    engine.reload_tasks_file()
+    reload_edit = time.perf_counter() - reload_start
+    engine.stop()
+    return {
+        "import_s": imported - start,
+        "init_s": created - imported,
+        "start_s": started - created,
+        "all_scheduled_s": scheduled - imported,
+        "reload_unchanged_s": reload_same,
+        "reload_one_edit_s": reload_edit,
+    }
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="write the JSON results here (default: print them)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, args.tasks)))
+        return 0
+    report = {"tasks": args.tasks, "repeat": args.repeat, "results": {}}
+    for name, stored in (("restart", True), ("imported", False)):
+        print(f"{name}: {args.tasks} tasks...", file=sys.stderr)
+        runs = []
+        with tempfile.TemporaryDirectory() as folder:
+            make_db(folder, args.tasks, stored)
+            with open(os.path.join(folder, "tasks.json")) as f:
+                original = f.read()
+            for _ in range(args.repeat):
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(os.path.join(folder, "run.db" + suffix)):
+                        os.remove(os.path.join(folder, "run.db" + suffix))
+                with open(os.path.join(folder, "tasks.db"), "rb") as src, open(os.path.join(folder, "run.db"), "wb") as dst:
+                    dst.write(src.read())
+                with open(os.path.join(folder, "tasks.json"), "w") as f:
+                    f.write(original)
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", folder, "--tasks", str(args.tasks)],
+                                     capture_output=True, text=True, check=True).stdout
+                runs.append(json.loads(out.strip().splitlines()[-1]))
+        report["results"][name] = {key: median([run[key] for run in runs]) for key in runs[0]}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Compare per-launch latency of .py tasks: new python subprocess vs warm worker.
+
+    python benchmarks/bench_warm_python.py [--runs 50] [--imports json,decimal,email.mime.text]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from py_workers import WarmPool
+from task_core import stream_output
+
+def write_script(folder, imports):
+    path = os.path.join(folder, "bench_task.py")
+    with open(path, "w") as f:
+        for name in imports:
+            f.write(f"import {name}\n")
+        f.write("print('done')\n")
+    return path
+
+def subprocess_launch(path):
+    # The engine's regular path: shell + fresh interpreter, output streamed
+    proc = subprocess.Popen(f'"{sys.executable}" "{path}"', shell=True, cwd=os.path.dirname(path),
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    with proc:
+        stream_output(proc.stdout, lambda text: None)
+        return proc.wait()
+
+def warm_launch(pool, path):
+    with pool.run(path, os.path.dirname(path)) as proc:
+        stream_output(proc.stdout, lambda text: None)
+        return proc.wait()
+
+def measure(fn, runs, *args):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--imports", default="json,decimal,email.mime.text,http.client",
+                        help="comma separated modules the task script imports (and the workers preload)")
+    args = parser.parse_args()
+    imports = [name for name in args.imports.split(",") if name]
+    with tempfile.TemporaryDirectory() as folder:
+        path = write_script(folder, imports)
+        pool = WarmPool(size=1, preload=imports, max_runs=args.runs + 1)
+        pool.prestart()
+        warm_launch(pool, path)  # wait for the worker and fill its caches
+        results = {
+            "subprocess": measure(subprocess_launch, args.runs, path),
+            "warm worker": measure(warm_launch, args.runs, pool, path),
+        }
+        pool.close()
+    print(f"{args.runs} launches importing {', '.join(imports) or 'nothing'}")
+    baseline = results["subprocess"][len(results["subprocess"]) // 2]
+    for name, samples in results.items():
+        p50 = samples[len(samples) // 2]
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        print(f"  {name:<12} p50 {p50 * 1000:8.2f} ms  p95 {p95 * 1000:8.2f} ms  {baseline / p50:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""Local JSON control API ("api_port" in settings.json).
+
+    GET    /status                 engine status
+    GET    /tasks                  all tasks
+    POST   /tasks                  create a task
+    GET    /tasks/<id>             one task
+    PATCH  /tasks/<id>             change some of its fields (PUT is accepted too)
+    DELETE /tasks/<id>             delete it
+    POST   /tasks/<id>/run         trigger a manual run
+    GET    /tasks/<id>/runs        recent run history (?limit=100)
+    POST   /batch                  {"create": [...], "update": [{"id": 1, ...}], "delete": [ids], "run": [ids]}
+    GET    /events                 server-sent events: changed, removed, batch, finished, error, pipeline
+
+A batch is validated as a whole and applied with one store transaction and
+one schedule pass. The server listens on 127.0.0.1 only. Requests must
+carry a localhost Host header, and changes must be sent as
+application/json, which web pages cannot do cross-origin without a CORS
+preflight (never answered here). With "api_token" set, every request also
+needs "Authorization: Bearer <token>".
+"""
+import os
+import re
+import json
+import queue
+import hmac
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import limits
+import triggers
+import misfire
+from cron_cache import cron_cache
+
+KEEPALIVE_SECONDS = 15
+EVENT_BACKLOG = 1000  # events queued for a slow /events client before it is dropped
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+READ_ONLY_FIELDS = ("id", "next_run", "last_execution")
+POSITIVE_FIELDS = ("retention", "log_executions", "max_instances")
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def clean_task(fields, partial=False):
+    # Validated copy of task fields from a request; partial for updates.
+    # Fields this module does not know are kept (tasks carry optional
+    # per-task settings such as max_output_bytes).
+    if not isinstance(fields, dict):
+        raise ApiError(400, "A task must be a JSON object")
+    task = {k: v for k, v in fields.items() if k not in READ_ONLY_FIELDS}
+    for field in ("name", "file_path", "cron_expr"):
+        if field in task and not isinstance(task[field], str):
+            raise ApiError(400, f"{field} must be a string")
+    if not partial:
+        if not task.get("file_path"):
+            raise ApiError(400, "file_path is required")
+        task.setdefault("name", os.path.basename(task["file_path"]))
+        task.setdefault("cron_expr", "")
+        task.setdefault("status", "Active")
+        for field in POSITIVE_FIELDS:
+            task.setdefault(field, 1)
+        task.setdefault("depends_on", [])
+        if not task["cron_expr"].strip() and not task["depends_on"] and not task.get("watch"):
+            raise ApiError(400, "cron_expr is required unless the task has depends_on or watch")
+    if task.get("cron_expr", "").strip() and cron_cache.next_run(task["cron_expr"]) is None:
+        raise ApiError(400, f"Invalid cron expression: {task['cron_expr']}")
+    for field in POSITIVE_FIELDS + limits.LIMIT_FIELDS:
+        if field in task:
+            value = task[field]
+            if not isinstance(value, int) or isinstance(value, bool) or value < (1 if field in POSITIVE_FIELDS else 0):
+                raise ApiError(400, f"{field} must be a {'positive' if field in POSITIVE_FIELDS else 'non-negative'} integer")
+    if task.get("nice", 0) > 19:
+        raise ApiError(400, "nice must be 0-19")
+    if "io_priority" in task and task["io_priority"] not in limits.IO_PRIORITIES:
+        raise ApiError(400, f"io_priority must be one of {', '.join(limits.IO_PRIORITIES)}")
+    if "depends_on" in task:
+        if not isinstance(task["depends_on"], list) or not all(isinstance(p, int) for p in task["depends_on"]):
+            raise ApiError(400, "depends_on must be a list of task ids")
+    if "watch" in task:
+        if not isinstance(task["watch"], list) or not all(isinstance(p, str) and p for p in task["watch"]):
+            raise ApiError(400, "watch must be a list of paths")
+        for spec in task["watch"]:
+            try:
+                triggers.split_spec(spec)
+            except ValueError as e:
+                raise ApiError(400, str(e))
+    if "inputs" in task:
+        if not isinstance(task["inputs"], list) or not all(isinstance(p, str) and p for p in task["inputs"]):
+            raise ApiError(400, "inputs must be a list of paths or glob patterns")
+    if "skip_unchanged" in task and not isinstance(task["skip_unchanged"], bool):
+        raise ApiError(400, "skip_unchanged must be true or false")
+    # null misfire settings fall back to the engine-wide defaults
+    for field in ("watch_debounce", "misfire_grace", "jitter"):
+        if field in task and not (task[field] is None and field != "watch_debounce"):
+            value = task[field]
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                raise ApiError(400, f"{field} must be a non-negative number of seconds")
+    if task.get("misfire") is not None and task["misfire"] not in misfire.POLICIES:
+        raise ApiError(400, f"misfire must be one of {', '.join(misfire.POLICIES)}")
+    if task.get("catchup_max") is not None:
+        value = task["catchup_max"]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ApiError(400, "catchup_max must be a positive integer")
+    return task
+
+def _host_name(header):
+    # "localhost:8080" -> "localhost", "[::1]:8080" -> "[::1]"
+    if header.startswith("["):
+        return header.split("]")[0] + "]"
+    return header.rsplit(":", 1)[0]
+
+def _event(event, task, detail):
+    return {"event": event, "task_id": task["id"] if task else None,
+            "task": task.get("name") if task else None, "detail": detail}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # --- plumbing ---
+
+    def _send(self, status, body):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        if (self.headers.get("Content-Type") or "").split(";")[0].strip() != "application/json":
+            raise ApiError(415, "Changes must be sent as application/json")
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise ApiError(400, "Request body is not valid JSON")
+
+    def _check_access(self):
+        # A DNS-rebound page reaches 127.0.0.1 under its own host name
+        if _host_name(self.headers.get("Host") or "") not in LOCAL_HOSTS:
+            raise ApiError(403, "Only local requests are accepted")
+        token = self.server.token
+        if token:
+            sent = self.headers.get("Authorization") or ""
+            if not hmac.compare_digest(sent.encode(), f"Bearer {token}".encode()):
+                raise ApiError(401, "Missing or wrong API token")
+
+    def _task(self, task_id):
+        task = self.server.engine.get_task(int(task_id))
+        if task is None:
+            raise ApiError(404, f"No task {task_id}")
+        return task
+
+    def _copy(self, task):
+        # The task as of now; run threads keep changing the live dict
+        with self.server.engine.tasks_lock:
+            return dict(task)
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        try:
+            self._check_access()
+            for pattern, handlers in ROUTES:
+                match = re.fullmatch(pattern, url.path.rstrip("/") or "/")
+                if match:
+                    handler = handlers.get(method)
+                    if handler is None:
+                        raise ApiError(405, f"{method} is not supported on {url.path}")
+                    result = handler(self, *match.groups(), query=parse_qs(url.query))
+                    if result is not None:
+                        self._send(*result)
+                    return
+            raise ApiError(404, f"No such endpoint: {url.path}")
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except ValueError as e:
+            # Engine validation (dependencies)
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"API {method} {url.path} failed: {e}")
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PATCH")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        logging.debug(f"api: {format % args}")
+
+    # --- endpoints ---
+
+    def get_status(self, query):
+        return 200, self.server.engine.status()
+
+    def list_tasks(self, query):
+        return 200, self.server.engine.list_tasks()
+
+    def create_task(self, query):
+        task = clean_task(self._body())
+        self.server.engine.add_task(task)
+        return 201, self._copy(task)
+
+    def get_task(self, task_id, query):
+        return 200, self._copy(self._task(task_id))
+
+    def update_task(self, task_id, query):
+        fields = clean_task(self._body(), partial=True)
+        engine = self.server.engine
+        with engine.tasks_lock:
+            task = self._task(task_id)
+            engine.update_task(task, fields)
+            return 200, dict(task)
+
+    def delete_task(self, task_id, query):
+        engine = self.server.engine
+        with engine.tasks_lock:
+            engine.remove_task(self._task(task_id))
+        return 200, {"deleted": int(task_id)}
+
+    def run_task(self, task_id, query):
+        queued = self.server.engine.run_task(self._task(task_id))
+        return 202 if queued else 409, {"queued": bool(queued)}
+
+    def task_runs(self, task_id, query):
+        limit = int(query.get("limit", ["100"])[0])
+        return 200, self.server.engine.store.runs(self._task(task_id)["id"], limit)
+
+    def batch(self, query):
+        body = self._body()
+        if not isinstance(body, dict):
+            raise ApiError(400, "A batch must be a JSON object")
+        create = [clean_task(fields) for fields in body.get("create", [])]
+        engine = self.server.engine
+        with engine.tasks_lock:
+            update = []
+            for fields in body.get("update", []):
+                if not isinstance(fields, dict) or "id" not in fields:
+                    raise ApiError(400, "Each update needs the task id")
+                update.append((self._task(fields["id"]), clean_task(fields, partial=True)))
+            delete = [self._task(task_id) for task_id in body.get("delete", [])]
+            run = [self._task(task_id) for task_id in body.get("run", [])]
+            if len({task["id"] for task, _ in update}) != len(update) or len({t["id"] for t in delete}) != len(delete):
+                raise ApiError(400, "A task may appear only once in update and once in delete")
+            engine.apply_batch(create, update, delete)
+        triggered = {task["id"]: bool(engine.run_task(task)) for task in run if engine.has_task(task)}
+        return 200, {"created": [task["id"] for task in create], "updated": [task["id"] for task, _ in update],
+                     "deleted": [task["id"] for task in delete], "triggered": triggered}
+
+    def events(self, query):
+        # Server-sent events until the client goes away
+        engine = self.server.engine
+        events = queue.Queue(EVENT_BACKLOG)
+        def listener(event, task, detail):
+            try:
+                events.put_nowait(_event(event, task, detail))
+            except queue.Full:
+                pass  # the stream notices and ends below
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        engine.add_listener(listener)
+        seq = 0
+        try:
+            self.wfile.write(b": connected\n\n")
+            self.wfile.flush()
+            while not self.server.stopping.is_set():
+                if events.full():
+                    logging.info("Dropping an /events client that is not keeping up")
+                    break
+                try:
+                    item = events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                seq += 1
+                data = json.dumps(item, default=str)
+                self.wfile.write(f"id: {seq}\nevent: {item['event']}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            engine.remove_listener(listener)
+        return None
+
+ROUTES = [
+    (r"/status", {"GET": _Handler.get_status}),
+    (r"/tasks", {"GET": _Handler.list_tasks, "POST": _Handler.create_task}),
+    (r"/tasks/(\d+)", {"GET": _Handler.get_task, "PATCH": _Handler.update_task, "DELETE": _Handler.delete_task}),
+    (r"/tasks/(\d+)/run", {"POST": _Handler.run_task}),
+    (r"/tasks/(\d+)/runs", {"GET": _Handler.task_runs}),
+    (r"/batch", {"POST": _Handler.batch}),
+    (r"/events", {"GET": _Handler.events}),
+]
+
+def serve(engine, port, token=""):
+    # API on a daemon thread, 127.0.0.1 only; returns the server
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.engine = engine
+    server.token = token
+    server.stopping = threading.Event()
+    threading.Thread(target=server.serve_forever, name="control-api", daemon=True).start()
+    return server
+
+def shutdown(server):
+    server.stopping.set()
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,153 @@
+"""Lease-based coordination between runners sharing one tasks.db.
+
+Every instance computes the same due occurrences (task id + scheduled time),
+so a claims table keyed on (task_id, occurrence) lets exactly one of them
+run each: the first INSERT wins. To spread work, each occurrence has a
+preferred instance (rendezvous hash over the live instances); the others
+only try to claim it after a short grace period, which also covers a
+preferred instance that died before claiming.
+
+A claim is a lease: the owner renews it while the run is in progress and
+marks it done at the end. A lease that runs out (its owner crashed) is
+taken over by another instance, which runs the occurrence again.
+"""
+import os
+import time
+import uuid
+import zlib
+import socket
+import sqlite3
+import logging
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    owner TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL,
+    started REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    task_id INTEGER NOT NULL,
+    occurrence TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    claimed REAL NOT NULL,
+    lease_until REAL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (task_id, occurrence)
+);
+CREATE INDEX IF NOT EXISTS claims_by_lease ON claims(state, lease_until);
+"""
+PRUNE_AFTER = 86400  # seconds finished claims and dead instances are kept
+
+class Coordinator:
+    # on_takeover(task_id, occurrence) is called from the heartbeat thread
+    # when this instance picks up an occurrence whose owner stopped renewing
+    def __init__(self, path, lease=30, grace=2, on_takeover=None):
+        self.path = path
+        self.lease = float(lease)
+        self.grace = float(grace)
+        self.on_takeover = on_takeover
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+        self._stop = threading.Event()
+        self._heartbeat()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="coordination", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Leave the live set; leases still held expire and are taken over
+        self._stop.set()
+        with self._lock:
+            self._conn.execute("DELETE FROM instances WHERE owner = ?", (self.owner,))
+
+    def live_instances(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT owner FROM instances WHERE heartbeat >= ?",
+                                      (time.time() - self.lease,)).fetchall()
+        return [row[0] for row in rows]
+
+    def preferred(self, task_id, occurrence):
+        # Rendezvous hashing: stable while the live set is, and only the
+        # occurrences of an instance that leaves move elsewhere
+        live = self.live_instances() or [self.owner]
+        return max(live, key=lambda owner: zlib.crc32(f"{owner}|{task_id}|{occurrence}".encode()))
+
+    def is_preferred(self, task_id, occurrence):
+        return self.preferred(task_id, occurrence) == self.owner
+
+    def claim(self, task_id, occurrence):
+        # True if this instance now owns the occurrence
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO claims (task_id, occurrence, owner, claimed, lease_until, state)"
+                " VALUES (?, ?, ?, ?, ?, 'running')",
+                (task_id, occurrence, self.owner, now, now + self.lease))
+        return cur.rowcount == 1
+
+    def release(self, task_id, occurrence):
+        with self._lock:
+            self._conn.execute("UPDATE claims SET state = 'done', lease_until = NULL"
+                               " WHERE task_id = ? AND occurrence = ? AND owner = ?",
+                               (task_id, occurrence, self.owner))
+
+    def _heartbeat(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO instances (owner, heartbeat, started) VALUES (?, ?, ?)"
+                               " ON CONFLICT(owner) DO UPDATE SET heartbeat = excluded.heartbeat",
+                               (self.owner, now, now))
+            self._conn.execute("UPDATE claims SET lease_until = ? WHERE owner = ? AND state = 'running'",
+                               (now + self.lease, self.owner))
+
+    def _take_over_expired(self):
+        # Claims whose owner stopped renewing: the UPDATE is conditional, so
+        # only one instance wins each
+        now = time.time()
+        with self._lock:
+            expired = self._conn.execute("SELECT task_id, occurrence, owner FROM claims"
+                                         " WHERE state = 'running' AND lease_until < ?", (now,)).fetchall()
+        taken = []
+        for task_id, occurrence, owner in expired:
+            with self._lock:
+                cur = self._conn.execute("UPDATE claims SET owner = ?, claimed = ?, lease_until = ?"
+                                         " WHERE task_id = ? AND occurrence = ? AND owner = ? AND state = 'running'"
+                                         " AND lease_until < ?",
+                                         (self.owner, now, now + self.lease, task_id, occurrence, owner, now))
+            if cur.rowcount == 1:
+                logging.info(f"Took over task {task_id} occurrence {occurrence} from {owner}")
+                taken.append((task_id, occurrence))
+        return taken
+
+    def _prune(self):
+        cutoff = time.time() - PRUNE_AFTER
+        with self._lock:
+            self._conn.execute("DELETE FROM claims WHERE state = 'done' AND claimed < ?", (cutoff,))
+            self._conn.execute("DELETE FROM instances WHERE heartbeat < ?", (cutoff,))
+
+    def _run(self):
+        last_prune = 0
+        while not self._stop.wait(self.lease / 3):
+            try:
+                self._heartbeat()
+                for task_id, occurrence in self._take_over_expired():
+                    if self.on_takeover is not None:
+                        self.on_takeover(task_id, occurrence)
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except Exception as e:
+                logging.error(f"Coordination heartbeat failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            running = self._conn.execute("SELECT COUNT(*) FROM claims WHERE owner = ? AND state = 'running'",
+                                         (self.owner,)).fetchone()[0]
+        return {"owner": self.owner, "live_instances": len(self.live_instances()), "running_claims": running}
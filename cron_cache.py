@@ -0,0 +1,144 @@
+"""Compiled cron schedules, cached by expression string.
+
+croniter parses and expands its expression in the constructor, which is
+most of the cost of a next-run calculation. A CompiledSchedule keeps one
+croniter per expression and only moves its start time, and CronCache
+shares compiled schedules between every task using the same expression.
+
+Besides five-field cron, an expression may have a sixth field for seconds
+("* * * * * */10") or be a fixed interval ("@every 30s", "@every 1h30m").
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+EVERY_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+EPOCH = datetime(1970, 1, 1)
+
+class CompiledSchedule:
+    # A parsed cron expression. croniter instances are stateful, so calls
+    # are serialized by a lock to make one schedule safe to share.
+    #
+    # Five-field expressions only fire on whole minutes, so the next fire
+    # times after any base within the same minute are identical: the last
+    # answer is memoized per base minute.
+    def __init__(self, expr):
+        # croniter is imported on first use: at startup most tasks already
+        # have a stored next_run, so importing it would only slow the start
+        from croniter import croniter
+        self.expr = expr
+        self._itr = croniter(expr, datetime.now())
+        self._lock = threading.Lock()
+        self._minute_resolution = len(expr.split()) == 5
+        self._memo_base = None
+        self._memo = []
+
+    def next_after(self, base):
+        return self.next_times(base, 1)[0]
+
+    def next_times(self, base, k=1):
+        key = base.replace(second=0, microsecond=0) if self._minute_resolution else base
+        with self._lock:
+            if key != self._memo_base or len(self._memo) < k:
+                self._itr.set_current(key, force=True)
+                self._memo = [self._itr.get_next(datetime) for _ in range(k)]
+                self._memo_base = key
+            return self._memo[:k]
+
+class IntervalSchedule:
+    # "@every <n>s|m|h|d" (units may be combined: "@every 1h30m"). Fires at
+    # whole multiples of the interval counted from 1970-01-01 00:00 local
+    # time, so fire times never drift and every instance agrees on them.
+    def __init__(self, expr):
+        parts = expr.split()
+        spec = parts[1].lower() if len(parts) == 2 and parts[0].lower() == "@every" else ""
+        units = re.findall(r"(\d+)([smhd])", spec)
+        if not units or "".join(n + u for n, u in units) != spec:
+            raise ValueError("expected @every followed by an interval such as 30s, 5m or 1h30m")
+        self.expr = expr
+        self.step = timedelta(seconds=sum(int(n) * EVERY_UNITS[u] for n, u in units))
+        if not self.step:
+            raise ValueError("the interval must be at least one second")
+
+    def next_after(self, base):
+        return self.next_times(base, 1)[0]
+
+    def next_times(self, base, k=1):
+        n = (base - EPOCH) // self.step + 1
+        return [EPOCH + (n + i) * self.step for i in range(k)]
+
+class CronCache:
+    # LRU of compiled schedules. Invalid expressions are cached too (as the
+    # error) so a bad task is not re-parsed on every redraw.
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._schedules = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, expr):
+        # CompiledSchedule for expr; raises ValueError if it is not valid cron
+        expr = " ".join(str(expr).split())
+        with self._lock:
+            schedule = self._schedules.get(expr)
+            if schedule is not None:
+                self._schedules.move_to_end(expr)
+                self.hits += 1
+        if schedule is None:
+            try:
+                if expr.lower().startswith("@every"):
+                    schedule = IntervalSchedule(expr)
+                else:
+                    schedule = CompiledSchedule(expr)
+            except Exception as e:
+                schedule = ValueError(f"Invalid cron expression '{expr}': {e}")
+            with self._lock:
+                self.misses += 1
+                self._schedules[expr] = schedule
+                if len(self._schedules) > self.maxsize:
+                    self._schedules.popitem(last=False)
+        if isinstance(schedule, ValueError):
+            raise schedule
+        return schedule
+
+    def is_valid(self, expr):
+        try:
+            self.compile(expr)
+            return True
+        except ValueError:
+            return False
+
+    def next_run(self, expr, base=None):
+        # Next fire time after base as a datetime, or None if expr is invalid
+        try:
+            return self.compile(expr).next_after(base or datetime.now())
+        except ValueError:
+            return None
+
+    def next_runs(self, items, base=None, k=1):
+        # Batch form: items is an iterable of (key, expr) pairs. Returns
+        # {key: [next k fire times]} ([] for invalid expressions); each
+        # distinct expression is computed once however many keys share it.
+        base = base or datetime.now()
+        by_expr = {}
+        for key, expr in items:
+            by_expr.setdefault(expr, []).append(key)
+        result = {}
+        for expr, keys in by_expr.items():
+            try:
+                times = self.compile(expr).next_times(base, k)
+            except ValueError:
+                times = []
+            for key in keys:
+                result[key] = list(times)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._schedules), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+# Shared by the engine and its clients
+cron_cache = CronCache()
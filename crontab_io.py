@@ -0,0 +1,266 @@
+"""Import and export classic crontab files.
+
+    python task_runner.py import-crontab FILE [--system] [--skip-invalid] [--dry-run]
+    python task_runner.py export-crontab [FILE]
+
+parse() reads a whole file in one pass. Comments and blank lines are
+skipped, NAME=value lines set the environment of the entries below them,
+@daily-style macros are expanded, and each entry's command column becomes
+the task's "command": it runs through the shell in $HOME, as cron runs it.
+Every schedule is compiled once through the cron cache, which also gives
+the next_run values, and all problems are reported together with their
+line numbers. The tasks are then inserted with one store transaction.
+
+A "# name: ..." comment right above an entry names its task; export()
+writes one for every task, so an exported file imports back as the same
+tasks.
+"""
+import os
+import re
+import sys
+import shlex
+import argparse
+import time
+from datetime import datetime
+
+from cron_cache import cron_cache
+from task_core import LogStore, TIME_FORMAT, shell_command, task_cwd
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+# Settings of cron itself rather than environment for the commands
+CRON_SETTINGS = ("SHELL", "MAILTO", "MAILFROM", "CRON_TZ", "RANDOM_DELAY")
+ENV_LINE = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*)")
+NAME_COMMENT = re.compile(r"#\s*name:\s*(.+)")
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+def _command(text):
+    # cron turns an unescaped % into a newline and feeds the rest to stdin,
+    # which tasks do not have; \% is a literal %. Returns (command, error)
+    if "%" not in text:
+        return text, None
+    parts = re.split(r"(?<!\\)%", text)
+    if len(parts) > 1:
+        return None, "an unescaped % (standard input for the command) is not supported, write \\% for a literal %"
+    return text.replace("\\%", "%"), None
+
+def _task_name(command, taken):
+    # Name from the program the command runs, unique among log folder names
+    # (a plain split: shlex would cost more than the rest of the import)
+    words = command.split()
+    program = next((w for w in words if not ENV_LINE.fullmatch(w)), words[0] if words else "task")
+    base = os.path.basename(program.strip("'\"").rstrip("/")) or "task"
+    name, n = base, 1
+    while LogStore.safe_name({"name": name}) in taken:
+        n += 1
+        name = f"{base} ({n})"
+    taken.add(LogStore.safe_name({"name": name}))
+    return name
+
+def parse(text, system=False, taken_names=(), now=None):
+    # Returns (tasks, errors, notes); errors and notes are (line, message)
+    # pairs. system: /etc/crontab format, with a user column before the command.
+    # taken_names: names of existing tasks, so new names do not collide.
+    errors, notes, pending = [], [], []
+    env = {}
+    name = None
+    taken = {LogStore.safe_name({"name": n}) for n in taken_names}
+    users = set()
+    home = os.path.expanduser("~")
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            name = None
+            continue
+        if line.startswith("#"):
+            match = NAME_COMMENT.fullmatch(line)
+            if match:
+                name = match.group(1).strip()
+            continue
+        match = ENV_LINE.fullmatch(line)
+        if match:
+            key, value = match.group(1), _unquote(match.group(2).strip())
+            if key in CRON_SETTINGS:
+                notes.append((lineno, f"{key} is a cron setting and was not imported"))
+            else:
+                env[key] = value
+            continue
+        if line.startswith("@"):
+            fields = line.split(None, 2 if system else 1)
+            expr = MACROS.get(fields[0].lower())
+            if expr is None:
+                reason = "runs at boot, which has no schedule here" if fields[0].lower() == "@reboot" else "is not a known macro"
+                errors.append((lineno, f"{fields[0]} {reason}"))
+                name = None
+                continue
+            rest = fields[1:]
+        else:
+            fields = line.split(None, 6 if system else 5)
+            expr = " ".join(fields[:5])
+            rest = fields[5:]
+        if system:
+            if rest:
+                users.add(rest[0])
+            rest = rest[1:]
+        if not rest:
+            errors.append((lineno, "missing command"))
+            name = None
+            continue
+        command, problem = _command(rest[0])
+        if problem:
+            errors.append((lineno, problem))
+            name = None
+            continue
+        task = {
+            "name": name,
+            "file_path": command,
+            "command": command,
+            "cwd": env.get("HOME") or home,
+            "cron_expr": expr,
+            "retention": 1,
+            "status": "Active",
+            "log_executions": 1,
+            "max_instances": 1,
+            "depends_on": [],
+        }
+        if env:
+            task["env"] = dict(env)
+        pending.append((lineno, task))
+        name = None
+    # One validation pass; each distinct expression is compiled once
+    next_runs = cron_cache.next_runs(((i, task["cron_expr"]) for i, (_, task) in enumerate(pending)), now)
+    tasks = []
+    for i, (lineno, task) in enumerate(pending):
+        times = next_runs[i]
+        if not times:
+            try:
+                cron_cache.compile(task["cron_expr"])
+                reason = f"'{task['cron_expr']}' never fires"
+            except ValueError as e:
+                reason = str(e)
+            errors.append((lineno, reason))
+            continue
+        task["next_run"] = times[0].strftime(TIME_FORMAT)
+        tasks.append(task)
+    # Names are given once the valid entries are known, in file order
+    for task in tasks:
+        if task["name"] and LogStore.safe_name(task) not in taken:
+            taken.add(LogStore.safe_name(task))
+        else:
+            task["name"] = _task_name(task["command"], taken)
+    for user in sorted(users):
+        notes.append((0, f"entries for user {user} run as the runner's own user"))
+    errors.sort()
+    return tasks, errors, notes
+
+def _quote(value):
+    # cron strips one pair of matching quotes from an environment value
+    if value and value == value.strip() and value[0] not in "'\"":
+        return value
+    return f"'{value}'" if '"' in value else f'"{value}"'
+
+def _escape(command):
+    return command.replace("%", "\\%")
+
+def export(tasks):
+    # Crontab text for tasks. Environment lines are written where they
+    # change; a variable a later task does not have is set empty (crontab
+    # cannot unset one). Tasks that only run after others are commented out.
+    lines = [f"# Exported from Task Runner on {datetime.now().strftime(TIME_FORMAT)}"]
+    env = {}
+    home = os.path.expanduser("~")
+    for task in tasks:
+        name = task.get("name") or os.path.basename(task["file_path"])
+        expr = " ".join(task.get("cron_expr", "").split())
+        if not expr:
+            lines.append(f"# {name}: runs only after its upstream tasks or on file changes, not exported")
+            continue
+        if len(expr.split()) != 5 and expr.lower() not in MACROS:
+            lines.append(f"# {name}: '{expr}' has no crontab form, not exported")
+            continue
+        task_env = task.get("env") or {}
+        changed = [key for key in sorted(set(env) | set(task_env)) if env.get(key) != task_env.get(key)]
+        if changed:
+            lines.append("")
+            lines.extend(f"{key}={_quote(task_env.get(key, ''))}" for key in changed)
+        env = task_env
+        command = shell_command(task)
+        cwd = task_cwd(task)
+        if cwd != task_env.get("HOME", home):
+            command = f"cd {shlex.quote(cwd)} && {command}"
+        lines.append("")
+        lines.append(f"# name: {name}")
+        lines.append(f"{expr} {_escape(command)}")
+    return "\n".join(lines) + "\n"
+
+def read(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+def format_problems(problems, limit=None):
+    shown = problems if limit is None else problems[:limit]
+    text = "\n".join(f"line {line}: {message}" if line else message for line, message in shown)
+    if len(shown) < len(problems):
+        text += f"\n... and {len(problems) - len(shown)} more"
+    return text
+
+def main(argv=None, export_mode=False):
+    # import-crontab / export-crontab from the command line. Works on
+    # tasks.db directly; a running instance picks the tasks up on restart.
+    from task_store import TaskStore, DB_FILE
+    if export_mode:
+        parser = argparse.ArgumentParser(prog="task_runner.py export-crontab", description="Write all tasks as a crontab.")
+        parser.add_argument("file", nargs="?", help="output file (default: standard output)")
+        parser.add_argument("--db", default=DB_FILE)
+        args = parser.parse_args(argv)
+        store = TaskStore(args.db)
+        text = export(store.load_tasks())
+        store.close()
+        if args.file:
+            with open(args.file, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+        return 0
+    parser = argparse.ArgumentParser(prog="task_runner.py import-crontab", description="Create tasks from a crontab file.")
+    parser.add_argument("file", help="crontab file ('-' for standard input)")
+    parser.add_argument("--system", action="store_true", help="system crontab format (user column before the command)")
+    parser.add_argument("--skip-invalid", action="store_true", help="import the valid entries even if others have errors")
+    parser.add_argument("--dry-run", action="store_true", help="only check the file")
+    parser.add_argument("--db", default=DB_FILE)
+    args = parser.parse_args(argv)
+    text = sys.stdin.read() if args.file == "-" else read(args.file)
+    store = TaskStore(args.db)
+    try:
+        start = time.perf_counter()
+        existing = store.load_tasks()
+        tasks, errors, notes = parse(text, args.system, [t.get("name", "") for t in existing])
+        elapsed = time.perf_counter() - start
+        if notes:
+            print(format_problems(notes), file=sys.stderr)
+        if errors:
+            print(format_problems(errors), file=sys.stderr)
+            if not args.skip_invalid:
+                print(f"{len(errors)} errors, nothing imported", file=sys.stderr)
+                return 1
+        if not args.dry_run:
+            store.apply_batch(tasks)
+        print(f"{'Checked' if args.dry_run else 'Imported'} {len(tasks)} tasks in {elapsed * 1000:.1f} ms"
+              + (f", skipped {len(errors)} invalid entries" if errors else ""), file=sys.stderr)
+        return 0
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
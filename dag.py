@@ -0,0 +1,184 @@
+"""Task dependency graphs.
+
+A task lists the ids of its upstream tasks in `depends_on`. When a task that
+others depend on is triggered (by its cron expression or "Run Task"), a
+PipelineRun executes it and everything downstream of it: each node starts as
+soon as all of its parents in the run have succeeded, independent branches
+run side by side up to a concurrency limit, and a failed node marks its
+descendants as skipped. A node's parents outside the run (for example a
+second root) are not waited for.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from fingerprint import UNCHANGED
+
+UPSTREAM_FAILED = "upstream_failed"
+SUCCEEDED = ("ok", UNCHANGED)  # a skipped unchanged node counts as done
+
+def parents(task):
+    return [int(p) for p in task.get("depends_on") or []]
+
+def build_children(tasks):
+    # {task id: [tasks that depend on it]}
+    by_id = {task["id"]: task for task in tasks}
+    children = {}
+    for task in tasks:
+        for parent in parents(task):
+            if parent in by_id:
+                children.setdefault(parent, []).append(task)
+    return children
+
+def validate(tasks, task_id, depends_on):
+    # Raises ValueError if depends_on names a missing task or closes a cycle
+    by_id = {task["id"]: task for task in tasks}
+    for parent in depends_on:
+        if parent not in by_id:
+            raise ValueError(f"Unknown upstream task id {parent}")
+        if parent == task_id:
+            raise ValueError("A task cannot depend on itself")
+    if task_id is None:
+        return
+    # A cycle exists if task_id is reachable upstream from one of its new parents
+    stack = list(depends_on)
+    seen = set()
+    while stack:
+        current = stack.pop()
+        if current == task_id:
+            raise ValueError(f"Dependency cycle through {by_id[task_id].get('name')}")
+        if current in seen or current not in by_id:
+            continue
+        seen.add(current)
+        stack.extend(parents(by_id[current]))
+
+def downstream(root, children):
+    # root and every task reachable from it, in breadth-first order
+    order = [root]
+    seen = {root["id"]}
+    queue = deque([root])
+    while queue:
+        for child in children.get(queue.popleft()["id"], []):
+            if child["id"] not in seen:
+                seen.add(child["id"])
+                order.append(child)
+                queue.append(child)
+    return order
+
+class PipelineRun:
+    # One execution of the graph below `root`. Nodes go through the engine's
+    # ExecutionPool (so the global worker limit still applies); at most
+    # `limit` nodes of this run are queued or running at a time; on_done is
+    # called once the whole run is over.
+    def __init__(self, engine, root, children, manual=False, limit=4, on_done=None):
+        self.id = None
+        self.engine = engine
+        self.on_done = on_done
+        self.root = root
+        self.manual = manual
+        self.limit = max(1, int(limit))
+        self.nodes = {task["id"]: task for task in downstream(root, children)}
+        self.children = {tid: [c["id"] for c in children.get(tid, [])] for tid in self.nodes}
+        self.waiting = {tid: sum(1 for p in parents(task) if p in self.nodes) for tid, task in self.nodes.items()}
+        self.waiting[root["id"]] = 0
+        self.status = {}
+        self.times = {}  # task id -> (start, end) monotonic
+        self.ready = deque([root["id"]])
+        self.active = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.started = datetime.now()
+        self._t0 = time.monotonic()
+
+    def start(self):
+        self.id = self.engine._pipeline_started(self)
+        logging.info(f"[PIPELINE {self.id}] Starting from {self.root.get('name')} ({len(self.nodes)} tasks)")
+        self._pump()
+        return self
+
+    def _pump(self):
+        with self.lock:
+            batch = []
+            while self.ready and self.active < self.limit:
+                batch.append(self.ready.popleft())
+                self.active += 1
+        for tid in batch:
+            task = self.nodes[tid]
+            self.engine.pool.submit(tid, lambda wait, tid=tid: self._run_node(tid, wait),
+                                    task.get("max_instances", 1), unique=False)
+
+    def _run_node(self, tid, wait):
+        start = time.monotonic()
+        status = "error"
+        try:
+            status = self.engine._execute_task(self.nodes[tid], manual=self.manual, wait=wait)
+            if not self.manual and tid != self.root["id"]:
+                self.engine._pipeline_node_done(self.nodes[tid])
+        finally:
+            self._node_done(tid, status or "error", start, time.monotonic())
+
+    def _node_done(self, tid, status, start, end):
+        skipped = []
+        with self.lock:
+            self.active -= 1
+            self.status[tid] = status
+            self.times[tid] = (start, end)
+            if status in SUCCEEDED:
+                for child in self.children[tid]:
+                    self.waiting[child] -= 1
+                    if self.waiting[child] == 0 and child not in self.status:
+                        self.ready.append(child)
+            else:
+                # Everything below a failed node is skipped
+                queue = deque(self.children[tid])
+                while queue:
+                    child = queue.popleft()
+                    if child in self.status:
+                        continue
+                    self.status[child] = UPSTREAM_FAILED
+                    skipped.append(child)
+                    queue.extend(self.children[child])
+            finished = len(self.status) == len(self.nodes)
+        for child in skipped:
+            self.engine._record_skipped(self.nodes[child], f"upstream task {self.nodes[tid].get('name')} {status}")
+        if finished:
+            self._finish()
+        else:
+            self._pump()
+
+    def critical_path(self):
+        # Longest chain of executed nodes by duration: (total seconds, [tasks]).
+        # A parent always ends before its child starts, so visiting nodes by
+        # end time sees every parent first.
+        best = {}
+        for tid in sorted(self.times, key=lambda t: self.times[t][1]):
+            start, end = self.times[tid]
+            ran = [best[p] for p in parents(self.nodes[tid]) if p in best]
+            longest = max(ran, key=lambda item: item[0], default=(0.0, []))
+            best[tid] = (longest[0] + (end - start), longest[1] + [tid])
+        total, path = max(best.values(), key=lambda item: item[0], default=(0.0, []))
+        return total, [self.nodes[tid] for tid in path]
+
+    def _finish(self):
+        wall = time.monotonic() - self._t0
+        total, path = self.critical_path()
+        failed = [tid for tid, status in self.status.items() if status not in SUCCEEDED + (UPSTREAM_FAILED,)]
+        status = "ok" if not failed else "failed"
+        summary = {
+            "id": self.id,
+            "root": self.root["id"],
+            "started": self.started,
+            "ended": datetime.now(),
+            "status": status,
+            "wall": wall,
+            "critical_path": [task["id"] for task in path],
+            "critical_seconds": total,
+            "nodes": {tid: self.status[tid] for tid in self.nodes},
+        }
+        names = " -> ".join(task.get("name", "") for task in path)
+        logging.info(f"[PIPELINE {self.id}] {status} in {wall:.1f}s; critical path {total:.1f}s: {names}")
+        self.engine._pipeline_finished(self.root, summary)
+        if self.on_done is not None:
+            self.on_done()
+        self.done.set()
@@ -0,0 +1,100 @@
+"""Skip-if-unchanged runs ("skip_unchanged" and "inputs" in a task).
+
+A task's fingerprint covers what it runs (its script file, or its command
+line, plus its environment) and its input files. "inputs" lists paths,
+folders and glob patterns ("**" reaches into subfolders); relative ones are
+taken from the task's folder. Files whose size and modification time match
+the last fingerprint reuse their recorded hash, so only files that were
+touched are read again. A scheduled run is skipped when the fingerprint
+equals the one recorded after the task's last successful run; manual runs
+always run. Fingerprints live in the fingerprints table of tasks.db.
+"""
+import os
+import glob
+import json
+import hashlib
+import threading
+
+UNCHANGED = "unchanged"  # run status of a skipped run
+HASH_CHUNK = 1 << 20
+
+def input_files(task):
+    # Sorted absolute paths of the task's script and input files
+    files = set()
+    base = task.get("cwd") or os.path.dirname(os.path.abspath(task["file_path"]))
+    if not task.get("command"):
+        files.add(os.path.abspath(task["file_path"]))
+    for pattern in task.get("inputs") or []:
+        pattern = os.path.join(base, os.path.expanduser(pattern))
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**")
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path):
+                files.add(os.path.abspath(path))
+    return sorted(files)
+
+def hash_file(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+class Fingerprints:
+    # Last successful fingerprint per task, read through to the store once
+    # and then kept in memory. A fingerprint is (digest, files, hashed):
+    # files maps path -> [mtime_ns, size, content hash], hashed is how many
+    # files had to be read.
+    def __init__(self, store):
+        self.store = store
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def last(self, task_id):
+        with self._lock:
+            if task_id in self._last:
+                return self._last[task_id]
+        last = self.store.get_fingerprint(task_id)
+        with self._lock:
+            return self._last.setdefault(task_id, last)
+
+    def compute(self, task):
+        # Raises OSError if an input cannot be read
+        last = self.last(task["id"])
+        known = last[1] if last else {}
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([task.get("command") or "", task["file_path"], task.get("inputs") or [],
+                                  task.get("env") or {}], sort_keys=True).encode())
+        files = {}
+        hashed = 0
+        for path in input_files(task):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # removed since it was listed
+            entry = known.get(path)
+            if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                content = entry[2]
+            else:
+                content = hash_file(path)
+                hashed += 1
+            files[path] = [st.st_mtime_ns, st.st_size, content]
+            digest.update(os.fsencode(path) + b"\0" + content.encode() + b"\n")
+        return digest.hexdigest(), files, hashed
+
+    def unchanged(self, task, fingerprint):
+        last = self.last(task["id"])
+        return last is not None and last[0] == fingerprint[0]
+
+    def record(self, task, fingerprint):
+        digest, files, _ = fingerprint
+        with self._lock:
+            self._last[task["id"]] = (digest, files)
+        self.store.set_fingerprint(task["id"], digest, files)
+
+    def forget(self, task_id):
+        with self._lock:
+            self._last.pop(task_id, None)
@@ -0,0 +1,174 @@
+"""Per-task resource limits and process-tree termination.
+
+Task fields (0 or missing = no limit):
+    timeout         wall-clock seconds before the run is terminated
+    cpu_limit       CPU seconds (RLIMIT_CPU, the process gets SIGXCPU)
+    mem_limit_mb    address space in MB (RLIMIT_AS)
+    max_open_files  file descriptors (RLIMIT_NOFILE)
+    nice            0-19, lower scheduling priority
+    io_priority     "normal", "low" or "idle" (ionice)
+
+Every run starts in its own session (process group on Windows) so that a
+timeout can take down the shell, the script and anything it started. The
+rlimits and nice value are set on the child from the engine right after it
+is started (apply_limits); a preexec_fn is not safe in a process with
+threads.
+"""
+import os
+import sys
+import shlex
+import shutil
+import time
+import signal
+import logging
+import subprocess
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+KILL_GRACE = 5  # seconds between terminate and kill
+IO_PRIORITIES = ("normal", "low", "idle")
+LIMIT_FIELDS = ("timeout", "cpu_limit", "mem_limit_mb", "max_open_files", "nice")
+
+def task_limit(task, field):
+    # Integer limit from a task field; 0 when unset or not a number
+    try:
+        return max(0, int(task.get(field, 0) or 0))
+    except (TypeError, ValueError):
+        return 0
+
+_warned = False  # rlimits asked for where prlimit is missing (logged once)
+
+def apply_limits(task, pid):
+    # Sets the task's rlimits (Linux, with prlimit) and nice value on a
+    # process that was just started. Anything it starts from then on
+    # inherits them. A process that already exited is left alone
+    global _warned
+    if os.name == "nt" or resource is None:
+        return
+    cpu, mem_mb, files, nice = (task_limit(task, f) for f in ("cpu_limit", "mem_limit_mb", "max_open_files", "nice"))
+    try:
+        if nice:
+            current = os.getpriority(os.PRIO_PROCESS, pid)
+            os.setpriority(os.PRIO_PROCESS, pid, min(19, current + nice))
+        if not (cpu or mem_mb or files):
+            return
+        if not hasattr(resource, "prlimit"):
+            if not _warned:
+                _warned = True
+                logging.warning("CPU, memory and open file limits need Linux; they are not applied")
+            return
+        if cpu:
+            # Soft limit sends SIGXCPU; the hard limit a little later SIGKILL
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu, cpu + KILL_GRACE))
+        if mem_mb:
+            size = mem_mb * 2**20
+            resource.prlimit(pid, resource.RLIMIT_AS, (size, size))
+        if files:
+            hard = resource.prlimit(pid, resource.RLIMIT_NOFILE)[1]
+            count = files if hard == resource.RLIM_INFINITY else min(files, hard)
+            resource.prlimit(pid, resource.RLIMIT_NOFILE, (count, count))
+    except ProcessLookupError:
+        pass
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not apply the limits of pid {pid}: {e}")
+
+def io_prefix(task):
+    # IO priority has no Popen hook; on Linux the command goes through
+    # ionice when it is installed. Returns the argv prefix (maybe empty)
+    io = task.get("io_priority") or "normal"
+    if io == "normal" or not sys.platform.startswith("linux") or not shutil.which("ionice"):
+        return []
+    return ["ionice", "-c", "3"] if io == "idle" else ["ionice", "-c", "2", "-n", "7"]
+
+def wrap_command(task, cmd):
+    # Shell command form of io_prefix. A whole command line (a task's
+    # "command") gets its own shell under ionice.
+    prefix = io_prefix(task)
+    if prefix and task.get("command"):
+        return " ".join(prefix + ["/bin/sh", "-c", shlex.quote(cmd)])
+    return " ".join(prefix + [cmd]) if prefix else cmd
+
+def popen_kwargs(task):
+    # Extra subprocess.Popen arguments for the task's limits
+    if os.name == "nt":
+        flags = subprocess.CREATE_NEW_PROCESS_GROUP
+        nice = task_limit(task, "nice")
+        if nice >= 15 or task.get("io_priority") == "idle":
+            flags |= subprocess.IDLE_PRIORITY_CLASS
+        elif nice:
+            flags |= subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        return {"creationflags": flags}
+    # The rlimits and nice value follow with apply_limits
+    return {"start_new_session": True}
+
+def terminate_tree(proc, grace=KILL_GRACE):
+    # Ask the whole process tree to stop, then kill whatever is left
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/PID", str(proc.pid)], capture_output=True)
+        try:
+            proc.wait(grace)
+        except subprocess.TimeoutExpired:
+            subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)], capture_output=True)
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    # The leader may exit on SIGTERM while children linger, so poll the group
+    for _ in range(int(grace * 10)):
+        time.sleep(0.1)
+        try:
+            os.killpg(proc.pid, 0)
+        except ProcessLookupError:
+            return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+class Watchdog:
+    # Terminates a run that is still going after `timeout` seconds; `fired`
+    # tells the caller the exit was ours
+    def __init__(self, proc, timeout, kill=None):
+        self.proc = proc
+        self.timeout = timeout
+        self.fired = False
+        self._kill = kill or (lambda: terminate_tree(proc))
+        self._timer = None
+        if timeout:
+            self._timer = threading.Timer(timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self):
+        self.fired = True
+        logging.info(f"Run of pid {self.proc.pid} exceeded its {self.timeout}s timeout, terminating")
+        try:
+            self._kill()
+        except Exception as e:
+            logging.error(f"Could not terminate pid {self.proc.pid}: {e}")
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+def run_status(exit_code, timed_out=False):
+    # One word for the run history: ok, failed, timeout, cpu_limit, killed
+    if timed_out:
+        return "timeout"
+    if exit_code is None:
+        return "error"
+    if exit_code == 0:
+        return "ok"
+    if os.name != "nt":
+        # Killed by a signal: negative, or 128+N when reported by the shell
+        signum = -exit_code if exit_code < 0 else exit_code - 128 if exit_code > 128 else 0
+        if signum == signal.SIGXCPU:
+            return "cpu_limit"
+        if signum in (signal.SIGKILL, signal.SIGTERM):
+            return "killed"
+    return "failed"
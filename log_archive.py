@@ -0,0 +1,134 @@
+"""Compressed archive tier for execution logs ("log_archive" in settings.json).
+
+Segments that leave the hot window (beyond "Log Executions to Keep", or
+older than the task's retention) are handed to a background thread, which
+appends each one as its own gzip member to logs/<task>/archive/<YYYY-MM>.log.gz
+and records its offset and length in archive/index.jsonl. One execution can
+then be read back by decompressing just its member. Whole monthly archives
+are dropped after "log_archive_days".
+"""
+import os
+import json
+import gzip
+import zlib
+import queue
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+
+ARCHIVE_DIR = "archive"
+INDEX_FILE = "index.jsonl"
+COPY_CHUNK = 1 << 20
+
+def archive_dir(task_dir):
+    return os.path.join(task_dir, ARCHIVE_DIR)
+
+def entry_key(entry):
+    # Identifies one execution of a task. The start time is part of it since
+    # logs from before numbers were kept across sweeps can reuse a number.
+    return entry.get("start") or "", entry["seq"]
+
+def archive_entries(task_dir):
+    # Archived executions, oldest first. A torn last line (crash while
+    # appending) is skipped; a segment archived twice keeps its last copy.
+    by_key = {}
+    try:
+        with open(os.path.join(archive_dir(task_dir), INDEX_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                by_key[entry_key(entry)] = entry
+    except FileNotFoundError:
+        return []
+    return [by_key[key] for key in sorted(by_key)]
+
+def extract(task_dir, entry, out):
+    # Decompress one archived execution into the binary file object `out`
+    decompressor = zlib.decompressobj(wbits=31)  # a single gzip member
+    with open(os.path.join(archive_dir(task_dir), entry["archive"]), "rb") as f:
+        f.seek(entry["offset"])
+        left = entry["length"]
+        while left > 0:
+            data = f.read(min(COPY_CHUNK, left))
+            if not data:
+                raise OSError(f"Archive {entry['archive']} is truncated")
+            left -= len(data)
+            try:
+                out.write(decompressor.decompress(data))
+            except zlib.error as e:
+                raise OSError(f"Archive {entry['archive']} is corrupt: {e}") from e
+    out.write(decompressor.flush())
+
+class LogArchiver:
+    # Single background thread, so appends to an archive never interleave;
+    # the per-task locks only guard against expire() running in the sweep
+    def __init__(self, keep_days=365):
+        self.keep_days = int(keep_days or 0)
+        self._queue = queue.Queue()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        threading.Thread(target=self._run, name="log-archiver", daemon=True).start()
+
+    def _lock(self, task_dir):
+        with self._locks_lock:
+            return self._locks.setdefault(task_dir, threading.Lock())
+
+    def submit(self, store, task, entry):
+        # store.archived(task, entry) is called once the copy is in place
+        self._queue.put((store, task, entry))
+
+    def _run(self):
+        while True:
+            store, task, entry = self._queue.get()
+            try:
+                self.archive(store, task, entry)
+            except Exception as e:
+                logging.error(f"Could not archive log segment {entry.get('file')} of {task.get('name')}: {e}")
+
+    def archive(self, store, task, entry):
+        path = store.segment_path(task, entry)
+        task_dir = store.task_dir(task)
+        folder = archive_dir(task_dir)
+        name = f"{(entry.get('start') or '')[:7] or 'undated'}.log.gz"
+        with self._lock(task_dir):
+            if os.path.isfile(path):
+                os.makedirs(folder, exist_ok=True)
+                with open(os.path.join(folder, name), "ab") as out:
+                    offset = out.tell()
+                    with open(path, "rb") as src, gzip.GzipFile(filename="", mode="wb", fileobj=out, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, COPY_CHUNK)
+                    length = out.tell() - offset
+                record = {k: v for k, v in entry.items() if k not in ("file", "archiving")}
+                record.update(archive=name, offset=offset, length=length)
+                with open(os.path.join(folder, INDEX_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        store.archived(task, entry)
+
+    def expire(self, task_dir, now=None):
+        # Drop monthly archives that ended more than keep_days ago; returns
+        # how many executions went with them
+        if not self.keep_days:
+            return 0
+        folder = archive_dir(task_dir)
+        if not os.path.isdir(folder):
+            return 0
+        cutoff = ((now or datetime.now()) - timedelta(days=self.keep_days)).strftime("%Y-%m")
+        with self._lock(task_dir):
+            entries = archive_entries(task_dir)
+            expired = {e["archive"] for e in entries if e["archive"][:7] < cutoff}
+            if not expired:
+                return 0
+            kept = [e for e in entries if e["archive"] not in expired]
+            index_file = os.path.join(folder, INDEX_FILE)
+            with open(index_file + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(e) + "\n" for e in kept)
+            os.replace(index_file + ".tmp", index_file)
+            for name in expired:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except FileNotFoundError:
+                    pass
+            return len(entries) - len(kept)
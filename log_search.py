@@ -0,0 +1,212 @@
+"""Full-text index over execution output (SQLite FTS5, in search.db).
+
+Each finished execution's log segment is indexed by a background thread,
+keyed by task, start time and sequence number, with its exit status. The trigram
+tokenizer makes a query match any substring, case-insensitively, like
+grep -i. Output beyond "search_max_bytes" per execution is indexed as its
+first and last halves. Entries outlive the log segments themselves (and
+are kept for "search_days"), so the index doubles as an audit trail.
+
+Command line:
+    python task_runner.py search Timeout --days 7 [--task NAME] [--status failed]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+SEARCH_DB = 'search.db'
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+PRUNE_INTERVAL = 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER,
+    task TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT,
+    started TEXT,
+    ended TEXT,
+    exit_code INTEGER,
+    status TEXT,
+    bytes INTEGER,
+    UNIQUE (task, started, seq)
+);
+CREATE INDEX IF NOT EXISTS executions_by_start ON executions(started);
+"""
+# 1: executions are unique by (task, started, seq) instead of (task, seq)
+SCHEMA_VERSION = 1
+# rowid of an output row is the id of its executions row
+FTS_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS output USING fts5(body, tokenize='{}')"
+
+def connect(path=SEARCH_DB):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1 and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'executions'").fetchone():
+        # Numbers could be reused by a task, so (task, seq) dropped later
+        # executions; SQLite can only drop a constraint by copying the table
+        conn.executescript("BEGIN; DROP INDEX IF EXISTS executions_by_start;"
+                           " ALTER TABLE executions RENAME TO executions_old;" + SCHEMA +
+                           "INSERT INTO executions SELECT * FROM executions_old; DROP TABLE executions_old;"
+                           f" PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        try:
+            conn.execute(FTS_TABLE.format("trigram"))
+        except sqlite3.OperationalError:
+            # SQLite before 3.34: whole words instead of substrings
+            conn.execute(FTS_TABLE.format("unicode61"))
+    return conn
+
+def read_capped(path, max_bytes):
+    # Segment text; past max_bytes only the first and last halves
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not max_bytes or size <= max_bytes:
+            data = f.read()
+        else:
+            data = f.read(max_bytes // 2) + b"\n...\n"
+            f.seek(size - max_bytes // 2)
+            data += f.read()
+    return data.decode("utf-8", errors="replace")
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def search(conn, text="", task=None, since=None, status=None, limit=100):
+    # Most recent matching executions first, as dicts with a "snippet" of the
+    # matching output. text is an FTS5 query; if it does not parse it is
+    # searched for as a literal string. since is a datetime or TIME_FORMAT string.
+    where, args = [], []
+    if task:
+        where.append("e.task = ?")
+        args.append(task)
+    if since:
+        where.append("e.started >= ?")
+        args.append(since.strftime(TIME_FORMAT) if isinstance(since, datetime) else since)
+    if status:
+        where.append("e.status = ?")
+        args.append(status)
+    fields = "e.task_id, e.task, e.seq, e.kind, e.started, e.ended, e.exit_code, e.status"
+    if text:
+        query = (f"SELECT {fields}, snippet(output, 0, '[', ']', '...', 64) FROM output"
+                 f" JOIN executions e ON e.id = output.rowid WHERE output MATCH ?"
+                 + "".join(f" AND {w}" for w in where) + " ORDER BY e.started DESC, e.id DESC LIMIT ?")
+        try:
+            rows = conn.execute(query, [text] + args + [limit]).fetchall()
+        except sqlite3.OperationalError:
+            rows = conn.execute(query, [_phrase(text)] + args + [limit]).fetchall()
+    else:
+        query = (f"SELECT {fields}, '' FROM executions e" + (" WHERE " + " AND ".join(where) if where else "")
+                 + " ORDER BY e.started DESC, e.id DESC LIMIT ?")
+        rows = conn.execute(query, args + [limit]).fetchall()
+    keys = ("task_id", "task", "seq", "kind", "started", "ended", "exit_code", "status", "snippet")
+    return [dict(zip(keys, row)) for row in rows]
+
+class SearchIndexer:
+    # Owns the write connection; LogStore.close_segment() hands finished
+    # segments over through submit() and never waits for the indexing.
+    def __init__(self, path=SEARCH_DB, max_bytes=1 << 20, keep_days=90):
+        self.path = path
+        self.max_bytes = int(max_bytes or 0)
+        self.keep_days = int(keep_days or 0)
+        self._conn = connect(path)
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="search-indexer", daemon=True).start()
+
+    # index(), _backfill() and prune() run on the indexer thread, the
+    # connection's only user
+
+    def submit(self, store, task, entry):
+        self._queue.put((self.index, (store, task, dict(entry))))
+
+    def backfill(self, store, tasks):
+        # Also index the segments on disk that are not in the index yet
+        # (e.g. written before indexing was enabled)
+        self._queue.put((self._backfill, (store, list(tasks))))
+
+    def _backfill(self, store, tasks):
+        for task in tasks:
+            name = task.get("name", "")
+            known = set(self._conn.execute("SELECT started, seq FROM executions WHERE task = ?", (name,)))
+            for entry in store.executions(task):
+                if entry["end"] is not None and (entry["start"], entry["seq"]) not in known:
+                    self.index(store, task, entry)
+
+    def _run(self):
+        last_prune = 0
+        while True:
+            fn, args = self._queue.get()
+            try:
+                fn(*args)
+                if time.time() - last_prune > PRUNE_INTERVAL:
+                    self.prune()
+                    last_prune = time.time()
+            except Exception as e:
+                logging.error(f"Search indexing failed: {e}")
+
+    def index(self, store, task, entry):
+        path = store.segment_path(task, entry)
+        try:
+            body = read_capped(path, self.max_bytes)
+        except FileNotFoundError:
+            logging.debug(f"Segment {path} was gone before it could be indexed")
+            return
+        with self._conn:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO executions (task_id, task, seq, kind, started, ended, exit_code, status, bytes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task.get("id"), task.get("name", ""), entry["seq"], entry.get("kind"), entry.get("start"),
+                 entry.get("end"), entry.get("exit_code"), entry.get("status"), entry.get("bytes")))
+            if cur.rowcount == 1:
+                self._conn.execute("INSERT INTO output (rowid, body) VALUES (?, ?)", (cur.lastrowid, body))
+
+    def prune(self):
+        if not self.keep_days:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.keep_days)).strftime(TIME_FORMAT)
+        with self._conn:
+            self._conn.execute("DELETE FROM output WHERE rowid IN (SELECT id FROM executions WHERE started < ?)",
+                               (cutoff,))
+            self._conn.execute("DELETE FROM executions WHERE started < ?", (cutoff,))
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="task_runner.py search", description="Search the output of past executions.")
+    parser.add_argument("text", nargs="?", default="", help="text to find (FTS5 query syntax is accepted)")
+    parser.add_argument("--task", help="only this task (by name)")
+    parser.add_argument("--days", type=float, help="only executions started in the last N days")
+    parser.add_argument("--status", help="only runs with this status (ok, failed, timeout, killed, ...)")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--db", default=SEARCH_DB, help="index file (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per result")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"No search index at {args.db}", file=sys.stderr)
+        return 1
+    conn = connect(args.db)
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    start = time.perf_counter()
+    results = search(conn, args.text, args.task, since, args.status, args.limit)
+    elapsed = time.perf_counter() - start
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            snippet = " ".join((result["snippet"] or "").split())
+            print(f"{result['started']}  {result['task']}  #{result['seq']}  {result['status'] or '-'}"
+                  f" (exit {result['exit_code']})  {snippet}")
+    print(f"{len(results)} executions in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,546 @@
+"""Paged log viewer for task executions.
+
+A segment is memory-mapped and only the lines that fit in the window are
+decoded and handed to Tk, so the size of the log does not matter. A sparse
+line-offset index is built by a background thread; search runs in slices
+on the Tk loop; "Follow" keeps the view at the end of a running execution.
+"""
+import os
+import re
+import mmap
+import time
+import bisect
+import tempfile
+import threading
+import tkinter as tk
+import tkinter.font as tkfont
+from array import array
+from datetime import datetime, timedelta
+from tkinter import ttk, messagebox
+import log_search
+
+INDEX_CHUNK = 1 << 20  # bytes indexed per step
+SEARCH_CHUNK = 4 << 20  # bytes searched per Tk tick
+MAX_RENDER_BYTES = 1 << 20  # cap on what one screen may decode (huge lines)
+FOLLOW_MS = 500
+NEWLINE = re.compile(b"\n")
+
+class MappedLog:
+    # Read-only view of a segment file. remap() picks up growth of a file
+    # that is still being written.
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self.buf = b""
+        self.remap()
+
+    def remap(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == len(self.buf):
+            return False
+        old = self.buf
+        # Empty files cannot be mapped
+        self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if isinstance(old, mmap.mmap):
+            old.close()
+        return True
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.buf = b""
+        self._file.close()
+
+class ArchivedLog(MappedLog):
+    # An archived execution, decompressed into an anonymous temporary file
+    # (deleted on close) and mapped like a segment
+    def __init__(self, log_store, task, entry):
+        self.path = None
+        self._file = tempfile.TemporaryFile()
+        try:
+            log_store.open_archived(task, entry, self._file)
+            self._file.flush()
+        except Exception:
+            self._file.close()
+            raise
+        self.buf = b""
+        self.remap()
+
+class LineIndex:
+    # Byte offset of every STRIDE-th line start; the lines in between are
+    # found with a short forward scan. Safe to extend from one thread while
+    # another looks lines up.
+    STRIDE = 64
+
+    def __init__(self):
+        self.marks = array("Q", [0])
+        self.lines = 1
+        self.scanned = 0
+        self.lock = threading.Lock()
+
+    def extend(self, buf, end):
+        # Index buf[scanned:end]; returns False when there was nothing new
+        with self.lock:
+            pos = self.scanned
+            if pos >= end:
+                return False
+            stop = min(end, pos + INDEX_CHUNK)
+            starts = [m.end() for m in NEWLINE.finditer(buf, pos, stop)]
+            skip = (-self.lines) % self.STRIDE
+            self.marks.extend(starts[skip::self.STRIDE])
+            self.lines += len(starts)
+            self.scanned = stop
+            return True
+
+    def offset(self, buf, line):
+        # Byte offset where `line` starts (len(buf) past the last line)
+        with self.lock:
+            if line >= self.lines:
+                return self.scanned if self.scanned < len(buf) else len(buf)
+            pos = self.marks[line // self.STRIDE]
+        for _ in range(line % self.STRIDE):
+            pos = buf.find(b"\n", pos) + 1
+        return pos
+
+    def line_of(self, buf, offset):
+        # Line number containing byte `offset` (must already be indexed)
+        with self.lock:
+            mark = bisect.bisect_right(self.marks, offset) - 1
+            pos = self.marks[mark]
+        return mark * self.STRIDE + buf[pos:offset].count(b"\n")
+
+class LogViewer:
+    # seq opens that execution instead of the latest; search prefills the
+    # search box
+    def __init__(self, root, engine, task, seq=None, search=""):
+        self.engine = engine
+        self.task = task
+        self.log = None
+        self.index = None
+        self.entry = None
+        self.top = 0
+        self.rows = 30
+        self.search_pos = None
+        self.search_job = None
+        self.pending_end = False
+        self.rendered_scanned = 0
+        self.closed = False
+
+        self.win = tk.Toplevel(root)
+        self.win.title(f"Log: {task.get('name', '')}")
+        self.win.geometry("900x560")
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Executions on the left, the selected one on the right
+        paned = ttk.PanedWindow(self.win, orient="horizontal")
+        paned.pack(fill="both", expand=True)
+        left = ttk.Frame(paned)
+        self.runs = tk.Listbox(left, width=30, font=("Consolas", 9), exportselection=False)
+        self.runs.pack(fill="both", expand=True)
+        self.runs.bind("<<ListboxSelect>>", self.on_run_select)
+        paned.add(left, weight=0)
+
+        right = ttk.Frame(paned)
+        paned.add(right, weight=1)
+        bar = ttk.Frame(right)
+        bar.pack(fill="x")
+        ttk.Label(bar, text="Search (regex):").pack(side="left", padx=(5, 2))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(bar, textvariable=self.search_var, width=30)
+        search_entry.pack(side="left")
+        search_entry.bind("<Return>", lambda e: self.find_next())
+        self.search_var.trace_add("write", lambda *a: self.find_next(restart=True))
+        ttk.Button(bar, text="Next", command=self.find_next).pack(side="left", padx=2)
+        self.follow_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(bar, text="Follow", variable=self.follow_var, command=self.on_follow).pack(side="left", padx=8)
+        self.status = ttk.Label(bar, text="")
+        self.status.pack(side="right", padx=5)
+
+        frame = ttk.Frame(right)
+        frame.pack(fill="both", expand=True)
+        self.text = tk.Text(frame, wrap="none", font=("Consolas", 10))
+        self.yscroll = ttk.Scrollbar(frame, orient="vertical", command=self.on_yscroll)
+        xscroll = ttk.Scrollbar(frame, orient="horizontal", command=self.text.xview)
+        self.text.configure(xscrollcommand=xscroll.set)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.yscroll.grid(row=0, column=1, sticky="ns")
+        xscroll.grid(row=1, column=0, sticky="ew")
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+        self.text.tag_configure("match", background="#ffe066")
+        self.text.tag_configure("current", background="#ff9f43")
+        self.line_height = tkfont.Font(font=self.text["font"]).metrics("linespace")
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll(3))
+        for key, step in (("<Prior>", "-page"), ("<Next>", "page"), ("<Up>", -1), ("<Down>", 1)):
+            self.text.bind(key, lambda e, s=step: (self.scroll(s), "break")[1])
+        self.text.bind("<Control-Home>", lambda e: (self.goto(0), "break")[1])
+        self.text.bind("<Control-End>", lambda e: (self.goto_end(), "break")[1])
+
+        self.refresh_runs(select_last=seq is None)
+        if seq is not None:
+            self.select_seq(seq)
+        if search:
+            self.follow_var.set(False)
+            self.search_var.set(search)
+        self.win.after(FOLLOW_MS, self.tick)
+
+    # --- executions ---
+
+    def refresh_runs(self, select_last=False):
+        self.executions = self.engine.log_store.executions(self.task, archived=True)
+        current = self.entry["seq"] if self.entry else None
+        self.runs.delete(0, "end")
+        for entry in self.executions:
+            code = "running" if entry["end"] is None else f"exit {entry['exit_code']}"
+            self.runs.insert("end", f"{entry['start']}  {entry['kind'][:5]:<5} {code}")
+            if entry.get("archive"):
+                self.runs.itemconfig("end", foreground="gray40")
+        seqs = [e["seq"] for e in self.executions]
+        if select_last and seqs:
+            self.runs.selection_set(len(seqs) - 1)
+            self.open_execution(self.executions[-1])
+        elif current in seqs:
+            self.runs.selection_set(seqs.index(current))
+
+    def select_seq(self, seq):
+        for i, entry in enumerate(self.executions):
+            if entry["seq"] == seq:
+                self.runs.selection_clear(0, "end")
+                self.runs.selection_set(i)
+                self.runs.see(i)
+                self.open_execution(entry)
+                return True
+        self.status.config(text=f"Execution #{seq} is no longer kept")
+        return False
+
+    def on_run_select(self, event=None):
+        selection = self.runs.curselection()
+        if selection:
+            self.open_execution(self.executions[selection[0]])
+
+    def open_execution(self, entry):
+        # Jump straight to one execution: map its segment and start indexing
+        self.close_log()
+        self.entry = entry
+        try:
+            if entry.get("archive"):
+                self.log = ArchivedLog(self.engine.log_store, self.task, entry)
+            else:
+                self.log = MappedLog(self.engine.log_store.segment_path(self.task, entry))
+        except OSError as e:
+            self.log = None
+            self.status.config(text=f"Cannot open segment: {e}")
+            self.render()
+            return
+        self.index = LineIndex()
+        self.top = 0
+        self.search_pos = None
+        threading.Thread(target=self._build_index, args=(self.log, self.index), daemon=True).start()
+        if self.follow_var.get() and entry["end"] is None:
+            self.goto_end()
+        else:
+            self.render()
+
+    def _build_index(self, log, index):
+        # Background: index whatever is mapped right now; tick() picks up growth
+        buf = log.buf
+        try:
+            while not self.closed and log.buf is buf and index.extend(buf, len(buf)):
+                pass
+        except ValueError:
+            pass  # mapping closed under us (remapped or viewer closed)
+
+    def close_log(self):
+        if self.search_job:
+            self.win.after_cancel(self.search_job)
+            self.search_job = None
+        if self.log is not None:
+            log, self.log = self.log, None
+            # Let a running index pass finish with the old mapping first
+            with self.index.lock:
+                log.close()
+
+    def close(self):
+        self.closed = True
+        self.close_log()
+        self.win.destroy()
+
+    # --- paging ---
+
+    def on_resize(self, event):
+        rows = max(1, event.height // max(1, self.line_height))
+        if rows != self.rows:
+            self.rows = rows
+            self.render()
+
+    def scroll(self, step):
+        if step == "page":
+            step = self.rows - 1
+        elif step == "-page":
+            step = -(self.rows - 1)
+        self.follow_var.set(False)
+        self.pending_end = False
+        self.goto(self.top + step)
+
+    def on_yscroll(self, *args):
+        total = self.index.lines if self.index else 1
+        if args[0] == "moveto":
+            self.follow_var.set(False)
+            self.pending_end = False
+            self.goto(int(float(args[1]) * total))
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]) * (self.rows - 1 if args[2] == "pages" else 1))
+
+    def goto(self, line):
+        total = self.index.lines if self.index else 1
+        self.top = max(0, min(line, total - self.rows))
+        self.render()
+
+    def goto_end(self):
+        # Small remainders are indexed on the spot; otherwise wait for the
+        # background indexer and jump once it has caught up (see tick)
+        self.pending_end = False
+        if self.log is not None:
+            if len(self.log.buf) - self.index.scanned > 8 * INDEX_CHUNK:
+                self.pending_end = True
+            else:
+                while self.index.extend(self.log.buf, len(self.log.buf)):
+                    pass
+        self.goto(self.index.lines if self.index else 0)
+
+    def render(self, highlight=None):
+        self.text.config(state="normal")
+        self.text.delete("1.0", "end")
+        if self.log is None:
+            self.text.config(state="disabled")
+            return
+        buf = self.log.buf
+        start = self.index.offset(buf, self.top)
+        end = min(self.index.offset(buf, self.top + self.rows), start + MAX_RENDER_BYTES)
+        chunk = buf[start:end].decode("utf-8", errors="replace").replace("\r", "")
+        self.text.insert("1.0", chunk)
+        self.highlight(chunk, start, highlight)
+        self.text.config(state="disabled")
+        self.rendered_scanned = self.index.scanned
+        total = max(1, self.index.lines)
+        self.yscroll.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+        indexed = self.index.scanned * 100 // len(buf) if len(buf) else 100
+        state = "running" if self.entry and self.entry["end"] is None else ""
+        self.status.config(text=f"line {self.top + 1}/{total}  {len(buf):,} bytes"
+                                + (f"  indexing {indexed}%" if indexed < 100 else "")
+                                + (f"  {state}" if state else ""))
+
+    def highlight(self, chunk, start, current):
+        pattern = self.pattern()
+        if pattern is None:
+            return
+        for m in pattern.finditer(chunk.encode("utf-8", errors="replace")):
+            # Offsets are in bytes; convert to character positions for Tk
+            a = len(chunk.encode("utf-8", errors="replace")[:m.start()].decode("utf-8", errors="replace"))
+            b = a + len(m.group().decode("utf-8", errors="replace"))
+            tag = "current" if current is not None and start + m.start() == current else "match"
+            self.text.tag_add(tag, f"1.0 + {a} chars", f"1.0 + {b} chars")
+
+    # --- search ---
+
+    def pattern(self):
+        text = self.search_var.get()
+        if not text:
+            return None
+        try:
+            return re.compile(text.encode("utf-8"), re.MULTILINE)
+        except re.error:
+            return None
+
+    def find_next(self, restart=False):
+        # Incremental: searches SEARCH_CHUNK bytes per Tk tick from the
+        # current match (or the top of the screen) towards the end
+        if self.search_job:
+            self.win.after_cancel(self.search_job)
+            self.search_job = None
+        pattern = self.pattern()
+        if self.log is None or pattern is None:
+            if self.search_var.get() and pattern is None:
+                self.status.config(text="invalid regex")
+            self.render()
+            return
+        if restart or self.search_pos is None:
+            pos = self.index.offset(self.log.buf, self.top)
+        else:
+            pos = self.search_pos + 1
+        self._search_step(pattern, pos, pos)
+
+    def _search_step(self, pattern, pos, origin, wrapped=False):
+        self.search_job = None
+        if self.log is None:
+            return
+        buf = self.log.buf
+        size = len(buf)
+        stop = min(size, pos + SEARCH_CHUNK)
+        if stop < size:
+            # End the slice on a line boundary so lines are not split
+            nl = buf.find(b"\n", stop)
+            stop = size if nl < 0 else nl + 1
+        if wrapped:
+            stop = min(stop, origin)
+        m = pattern.search(buf, pos, stop)
+        if m:
+            self.search_pos = m.start()
+            while self.index.scanned <= m.start() and self.index.extend(buf, size):
+                pass
+            line = self.index.line_of(buf, m.start())
+            self.follow_var.set(False)
+            self.top = max(0, min(line - 3, self.index.lines - self.rows))
+            self.render(highlight=m.start())
+            return
+        if wrapped and stop >= origin:
+            self.search_pos = None
+            self.status.config(text="no matches")
+            return
+        if stop >= size:
+            if origin == 0:
+                self.status.config(text="no matches")
+                return
+            stop, wrapped = 0, True
+        self.status.config(text=f"searching... {stop * 100 // max(1, size)}%")
+        self.search_job = self.win.after(1, self._search_step, pattern, stop, origin, wrapped)
+
+    # --- follow ---
+
+    def remap(self):
+        # Pick up growth of the segment; the old mapping is only closed once
+        # no index pass is using it
+        with self.index.lock:
+            return self.log.remap()
+
+    def on_follow(self):
+        if self.follow_var.get():
+            self.goto_end()
+        else:
+            self.pending_end = False
+
+    def tick(self):
+        if self.closed:
+            return
+        try:
+            if self.entry is not None and self.entry["end"] is None:
+                self.refresh_runs()
+                still_running = any(e["seq"] == self.entry["seq"] and e["end"] is None for e in self.executions)
+                if not still_running:
+                    self.entry = next((e for e in self.executions if e["seq"] == self.entry["seq"]), self.entry)
+                if self.log is not None and self.remap():
+                    threading.Thread(target=self._build_index, args=(self.log, self.index), daemon=True).start()
+                if self.follow_var.get():
+                    self.goto_end()
+                else:
+                    self.render()
+            elif self.pending_end and self.log is not None and self.index.scanned >= len(self.log.buf):
+                self.goto_end()
+            elif self.index is not None and self.log is not None and self.index.scanned != self.rendered_scanned:
+                # Background indexing progressed: update scrollbar and status
+                self.render()
+        except Exception as e:
+            self.status.config(text=f"error: {e}")
+        self.win.after(FOLLOW_MS, self.tick)
+
+def show_log(root, engine, task, seq=None, search=""):
+    if not engine.log_store.executions(task, archived=True):
+        messagebox.showinfo("No Log", "No log file exists for this task yet.")
+        return None
+    return LogViewer(root, engine, task, seq, search)
+
+class SearchPanel:
+    # Searches the output index of all tasks (log_search); double-clicking a
+    # result opens that execution in a LogViewer with the text highlighted
+    PERIODS = (("Any time", None), ("Last 24 hours", 1), ("Last 7 days", 7), ("Last 30 days", 30))
+    STATUSES = ("", "ok", "failed", "timeout", "cpu_limit", "killed", "error", "upstream_failed")
+
+    def __init__(self, root, engine):
+        self.root = root
+        self.engine = engine
+        self.conn = log_search.connect(log_search.SEARCH_DB)
+        self.results = []
+        self.win = tk.Toplevel(root)
+        self.win.title("Search Logs")
+        self.win.geometry("900x500")
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+        bar = ttk.Frame(self.win, padding="5 5 5 5")
+        bar.pack(fill="x")
+        ttk.Label(bar, text="Text:").pack(side="left")
+        self.text_var = tk.StringVar()
+        entry = ttk.Entry(bar, textvariable=self.text_var, width=30)
+        entry.pack(side="left", padx=(2, 8))
+        entry.bind("<Return>", lambda e: self.search())
+        entry.focus_set()
+        ttk.Label(bar, text="Task:").pack(side="left")
+        self.task_var = tk.StringVar()
+        names = [""] + sorted(task.get("name", "") for task in engine.list_tasks())
+        ttk.Combobox(bar, textvariable=self.task_var, values=names, width=18).pack(side="left", padx=(2, 8))
+        self.period_var = tk.StringVar(value=self.PERIODS[0][0])
+        ttk.Combobox(bar, textvariable=self.period_var, values=[p[0] for p in self.PERIODS],
+                     state="readonly", width=13).pack(side="left", padx=(0, 8))
+        ttk.Label(bar, text="Status:").pack(side="left")
+        self.status_var = tk.StringVar()
+        ttk.Combobox(bar, textvariable=self.status_var, values=self.STATUSES, state="readonly",
+                     width=14).pack(side="left", padx=(2, 8))
+        ttk.Button(bar, text="Search", command=self.search).pack(side="left")
+
+        frame = ttk.Frame(self.win)
+        frame.pack(fill="both", expand=True, padx=5)
+        columns = ("Started", "Task", "Status", "Output")
+        self.tree = ttk.Treeview(frame, columns=columns, show="headings")
+        for column, width in zip(columns, (140, 140, 90, 480)):
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=width, stretch=column == "Output")
+        scroll = ttk.Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+        self.tree.bind("<Double-1>", self.open_result)
+        self.status = ttk.Label(self.win, text="Double-click a result to open it", padding="5 2 5 5")
+        self.status.pack(fill="x")
+
+    def search(self):
+        days = dict(self.PERIODS).get(self.period_var.get())
+        since = datetime.now() - timedelta(days=days) if days else None
+        start = time.perf_counter()
+        try:
+            self.results = log_search.search(self.conn, self.text_var.get().strip(), self.task_var.get() or None,
+                                             since, self.status_var.get() or None, limit=500)
+        except Exception as e:
+            self.status.config(text=f"Search failed: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        self.tree.delete(*self.tree.get_children())
+        for i, result in enumerate(self.results):
+            status = result["status"] or f"exit {result['exit_code']}"
+            snippet = " ".join((result["snippet"] or "").split())
+            self.tree.insert("", "end", iid=str(i), values=(result["started"], result["task"], status, snippet))
+        self.status.config(text=f"{len(self.results)} executions in {elapsed:.0f} ms"
+                                + (" (first 500)" if len(self.results) == 500 else ""))
+
+    def open_result(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        result = self.results[int(selection[0])]
+        task = self.engine.get_task(result["task_id"])
+        if task is None or task.get("name") != result["task"]:
+            task = next((t for t in self.engine.list_tasks() if t.get("name") == result["task"]), None)
+        if task is None:
+            self.status.config(text=f"Task {result['task']} no longer exists")
+            return
+        # The index matches substrings case-insensitively; so does the viewer's regex
+        text = self.text_var.get().strip()
+        show_log(self.root, self.engine, task, result["seq"], "(?i)" + re.escape(text) if text else "")
+
+    def close(self):
+        self.conn.close()
+        self.win.destroy()
+
+def show_search(root, engine):
+    return SearchPanel(root, engine)
@@ -0,0 +1,144 @@
+"""Per-task execution metrics in Prometheus text format.
+
+Every finished run is recorded with observe_run(); the aggregates can be
+scraped from a local HTTP endpoint (settings "metrics_port") and/or written
+to a file every few seconds (settings "metrics_file", e.g. for the
+node_exporter textfile collector).
+"""
+import os
+import bisect
+import logging
+import threading
+
+# Upper bounds of the histogram buckets (+Inf is implicit)
+SECONDS_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30, 60)
+MB_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+HISTOGRAMS = {
+    # metric name: (run record field, buckets, help)
+    "taskrunner_run_duration_seconds": ("wall", SECONDS_BUCKETS, "Wall time of task executions"),
+    "taskrunner_run_cpu_seconds": ("cpu", SECONDS_BUCKETS, "User plus system CPU time of task executions"),
+    "taskrunner_run_max_rss_megabytes": ("max_rss_mb", MB_BUCKETS, "Peak resident memory of task executions"),
+    "taskrunner_run_lag_seconds": ("lag", LAG_BUCKETS, "Delay from scheduled time to process start"),
+}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    # Aggregates keyed by task name. gauges is an optional callable returning
+    # (name, help, value) tuples for engine-wide state, read at render time.
+    def __init__(self, gauges=None):
+        self.gauges = gauges
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in HISTOGRAMS}
+        self._runs = {}  # (task, status) -> count
+        self._last_exit = {}
+
+    def observe_run(self, task_name, record):
+        # record: wall, cpu_user, cpu_sys, max_rss_mb, exit_code, status, lag
+        # (None where unknown, e.g. CPU/RSS on Windows or lag for manual runs)
+        if record.get("cpu_user") is not None:
+            record = dict(record, cpu=record["cpu_user"] + (record.get("cpu_sys") or 0))
+        status = record.get("status") or ("ok" if record.get("exit_code") == 0 else "failed")
+        with self._lock:
+            for name, (field, buckets, _) in HISTOGRAMS.items():
+                value = record.get(field)
+                if value is None:
+                    continue
+                per_task = self._histograms[name]
+                if task_name not in per_task:
+                    per_task[task_name] = Histogram(buckets)
+                per_task[task_name].observe(value)
+            key = (task_name, status)
+            self._runs[key] = self._runs.get(key, 0) + 1
+            if record.get("exit_code") is not None:
+                self._last_exit[task_name] = record["exit_code"]
+
+    def forget(self, task_name):
+        with self._lock:
+            for per_task in self._histograms.values():
+                per_task.pop(task_name, None)
+            self._runs = {k: v for k, v in self._runs.items() if k[0] != task_name}
+            self._last_exit.pop(task_name, None)
+
+    def render(self):
+        out = []
+        with self._lock:
+            for name, (_, _, help_text) in HISTOGRAMS.items():
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} histogram")
+                for task_name, histogram in sorted(self._histograms[name].items()):
+                    out.extend(histogram.lines(name, f'task="{_escape(task_name)}"'))
+            out.append("# HELP taskrunner_runs_total Finished task executions")
+            out.append("# TYPE taskrunner_runs_total counter")
+            for (task_name, status), count in sorted(self._runs.items()):
+                out.append(f'taskrunner_runs_total{{task="{_escape(task_name)}",status="{status}"}} {count}')
+            out.append("# HELP taskrunner_last_exit_code Exit code of the latest execution")
+            out.append("# TYPE taskrunner_last_exit_code gauge")
+            for task_name, code in sorted(self._last_exit.items()):
+                out.append(f'taskrunner_last_exit_code{{task="{_escape(task_name)}"}} {code}')
+        if self.gauges is not None:
+            for name, help_text, value in self.gauges():
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} gauge")
+                out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+    def write_file(self, path):
+        # Atomic, so a collector never reads a half-written file
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+def _handler_class():
+    # http.server is only imported when metrics are served
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = self.server.metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f"metrics: {format % args}")
+
+    return _Handler
+
+def serve(metrics, port, host="127.0.0.1"):
+    # Prometheus endpoint on a daemon thread; returns the server
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), _handler_class())
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,119 @@
+"""Late runs, start-time spread and the start rate limit.
+
+A scheduled run is late (a misfire) when it fires more than its grace
+period ("misfire_grace", default "misfire_grace_seconds") after its time,
+for example because the runner was stopped or the machine was asleep. The
+task's "misfire" policy (default "misfire_policy") decides what happens:
+
+    coalesce  run once for all the missed times (the default)
+    skip      do not run, wait for the next time that is still ahead
+    catchup   run once for each missed time within the grace period, at
+              most "catchup_max" runs, one after another
+
+"jitter" (default "jitter_seconds") delays every start of a task by a fixed
+offset of up to that many seconds. The offset is derived from the task id,
+so it is the same for every run and on every instance. Tasks that share a
+schedule then no longer all start in the same second. "max_starts_per_second"
+also limits how fast the engine as a whole starts scheduled runs. Runs over
+the limit wait in the timer heap, so they do not hold up other due tasks.
+"""
+import zlib
+import time
+import threading
+from collections import deque
+from datetime import timedelta
+
+from cron_cache import cron_cache
+
+POLICIES = ("coalesce", "skip", "catchup")
+MAX_COUNTED = 1000  # missed times counted for the log ("1000+" beyond)
+MAX_SCANNED = 100000  # due times looked at for catch-up runs
+
+def _setting(task, field, default):
+    # A task's own value, or the engine-wide default if it has none
+    value = task.get(field)
+    return default if value is None or value == "" else value
+
+def jitter_offset(task, default=0):
+    # Fixed start delay of the task in seconds, in millisecond steps
+    spread = float(_setting(task, "jitter", default) or 0)
+    if spread <= 0:
+        return 0.0
+    return zlib.crc32(str(task["id"]).encode()) % (int(spread * 1000) + 1) / 1000
+
+def policy(task, default="coalesce"):
+    value = _setting(task, "misfire", default)
+    return value if value in POLICIES else "coalesce"
+
+def grace(task, default=60):
+    return float(_setting(task, "misfire_grace", default))
+
+def catchup_max(task, default=10):
+    return max(1, int(_setting(task, "catchup_max", default)))
+
+def _due_times(expr, after, now, cap):
+    # Due times of expr after `after` up to now, at most cap of them
+    try:
+        schedule = cron_cache.compile(expr)
+    except ValueError:
+        return
+    base = after
+    count = 0
+    while count < cap:
+        batch = schedule.next_times(base, min(100, cap - count))
+        for when in batch:
+            if when > now:
+                return
+            count += 1
+            yield when
+        base = batch[-1]
+
+def count_missed(expr, due, now):
+    # How many times expr was due from `due` (included) up to now, as text
+    missed = 1 + sum(1 for _ in _due_times(expr, due, now, MAX_COUNTED))
+    return f"{MAX_COUNTED}+" if missed > MAX_COUNTED else str(missed)
+
+def catchup_times(expr, due, now, since, limit):
+    # The latest `limit` due times from `due` up to now that are not
+    # earlier than since, oldest first
+    times = deque([due] if due >= since else [], maxlen=limit)
+    after = max(due, since - timedelta(seconds=1))
+    times.extend(when for when in _due_times(expr, after, now, MAX_SCANNED) if when >= since)
+    return list(times)
+
+class StartLimiter:
+    # Token bucket over run starts: `burst` starts at once, then `rate` per
+    # second. reserve() books the next free slot and returns how many
+    # seconds away it is, so the caller can wait without blocking anything.
+    def __init__(self, rate, burst=1, samples=1000):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._delays = deque(maxlen=samples)
+        self.delayed = 0
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate)
+            self._delays.append(delay)
+            if delay:
+                self.delayed += 1
+            return delay
+
+    def stats(self):
+        with self._lock:
+            delays = sorted(self._delays)
+            stats = {"rate": self.rate, "burst": self.burst, "delayed": self.delayed}
+        if delays:
+            stats.update({
+                "delay_mean": sum(delays) / len(delays),
+                "delay_p95": delays[min(len(delays) - 1, int(0.95 * len(delays)))],
+                "delay_max": delays[-1],
+            })
+        return stats
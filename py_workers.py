@@ -0,0 +1,323 @@
+"""Warm interpreters for .py tasks.
+
+Each worker is a long-lived Python process that imports the configured
+preload modules once and then runs task scripts in-process with runpy, so a
+run pays neither shell spawn, interpreter startup nor the heavy imports.
+
+Protocol: the engine writes one JSON job per line to the worker's stdin.
+The worker points fds 1 and 2 at a fresh pipe for the duration of the job
+and relays what arrives as frames on its own stdout: a 1-byte type and a
+4-byte big-endian length, then the payload. "O" frames carry output, "X"
+ends the job with {"exit_code", "rss_mb", "peak_rss_mb", "cpu_user",
+"cpu_sys"}, "R" announces the worker is ready.
+"""
+import os
+import sys
+import json
+import struct
+import logging
+import threading
+import subprocess
+
+FRAME = struct.Struct(">cI")
+
+# --- worker side ---
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 1024)
+
+def _rss_mb():
+    # Current resident set size, or the peak where that is all we can get
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb() or 0.0
+
+def _send(out, kind, payload):
+    out.write(FRAME.pack(kind, len(payload)) + payload)
+    out.flush()
+
+def _relay(fd, out, lock):
+    # Copy the job's output pipe into "O" frames until every writer is gone
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            break
+        with lock:
+            _send(out, b"O", data)
+    os.close(fd)
+
+def _run_job(job):
+    import runpy
+    import traceback
+    path = job["path"]
+    saved = (os.getcwd(), list(sys.argv), list(sys.path))
+    # Modules the job imports are dropped after it, so the next job's own
+    # utils.py is not shadowed by this one's; preloaded modules stay
+    modules = set(sys.modules)
+    env = job.get("env") or {}
+    saved_env = {key: os.environ.get(key) for key in env}
+    try:
+        os.environ.update(env)
+        os.chdir(job.get("cwd") or os.path.dirname(path))
+        sys.argv = [path] + list(job.get("args", []))
+        sys.path.insert(0, os.path.dirname(path))
+        runpy.run_path(path, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    finally:
+        os.chdir(saved[0])
+        sys.argv, sys.path[:] = saved[1], saved[2]
+        for name in set(sys.modules) - modules:
+            del sys.modules[name]
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def serve(preload):
+    # Import errors show up on the worker's stderr, which is the engine's
+    for name in preload:
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"[TaskRunner] Could not preload {name}: {e}", file=sys.stderr)
+    # Jobs and frames use private copies of stdin/stdout; fds 0-2 belong to
+    # whatever job is running
+    jobs = os.fdopen(os.dup(0), "r")
+    out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    lock = threading.Lock()
+    _send(out, b"R", b"")
+    for line in jobs:
+        job = json.loads(line)
+        read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+        relay = threading.Thread(target=_relay, args=(read_fd, out, lock), daemon=True)
+        relay.start()
+        before = os.times()
+        exit_code = _run_job(job)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Dropping our references to the pipe lets the relay see EOF once any
+        # process the script started has exited too
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        relay.join()
+        # CPU of this job: the worker's own plus processes the script waited for
+        after = os.times()
+        result = {
+            "exit_code": exit_code,
+            "rss_mb": round(_rss_mb(), 1),
+            "peak_rss_mb": _peak_rss_mb(),
+            "cpu_user": after.user - before.user + after.children_user - before.children_user,
+            "cpu_sys": after.system - before.system + after.children_system - before.children_system,
+        }
+        with lock:
+            _send(out, b"X", json.dumps(result).encode())
+
+# --- engine side ---
+
+class WorkerError(Exception):
+    pass
+
+class Worker:
+    def __init__(self, preload=()):
+        self.runs = 0
+        self.rss_mb = 0.0
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), json.dumps(list(preload))],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        kind, _ = self.read_frame()
+        if kind != b"R":
+            self.kill()
+            raise WorkerError("Python worker failed to start")
+
+    def read_frame(self):
+        head = self.proc.stdout.read(FRAME.size)
+        if len(head) < FRAME.size:
+            raise WorkerError("Python worker exited unexpectedly")
+        kind, size = FRAME.unpack(head)
+        return kind, self.proc.stdout.read(size)
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+        for f in (self.proc.stdin, self.proc.stdout):
+            try:
+                f.close()
+            except OSError:
+                pass
+
+class WarmJob:
+    # Quacks like the subprocess.Popen the engine streams from: stdout.read1()
+    # returns output until the job ends, wait() returns the exit code
+    def __init__(self, pool, worker, path, cwd, env=None):
+        self.pool = pool
+        self.worker = worker
+        self.exit_code = None
+        self.result = {}
+        self.killed = False
+        self.pid = worker.proc.pid
+        self.stdout = self
+        worker.proc.stdin.write((json.dumps({"path": path, "cwd": cwd, "env": env or {}}) + "\n").encode())
+        worker.proc.stdin.flush()
+
+    def read1(self, n=-1):
+        if self.exit_code is not None:
+            return b""
+        try:
+            kind, payload = self.worker.read_frame()
+        except WorkerError:
+            if not self.killed:
+                raise
+            # Killed on purpose (timeout): end of output, like a subprocess
+            self.exit_code = -9
+            return b""
+        if kind == b"X":
+            self.result = json.loads(payload)
+            self.exit_code = self.result["exit_code"]
+            self.worker.rss_mb = self.result["rss_mb"]
+            return b""
+        return payload
+
+    read = read1
+
+    def wait(self, timeout=None):
+        while self.exit_code is None:
+            self.read1()
+        return self.exit_code
+
+    def usage(self):
+        # Same shape as task_core.wait_with_usage. The peak is the worker's
+        # over its lifetime, so an upper bound for this job
+        return {"cpu_user": self.result.get("cpu_user"), "cpu_sys": self.result.get("cpu_sys"),
+                "max_rss_mb": self.result.get("peak_rss_mb")}
+
+    def kill(self):
+        # Only the process: the thread streaming this job sees end of output
+        # and the pool cleans the worker up on release
+        self.killed = True
+        try:
+            self.worker.proc.kill()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # A worker whose job did not run to completion is in an unknown state
+        if self.exit_code is None or self.killed:
+            self.worker.kill()
+        self.pool.release(self.worker)
+
+class WarmPool:
+    # Idle warm workers. A job takes an idle worker (or starts one if all are
+    # busy); after the job the worker goes back to the pool unless it has
+    # done max_runs jobs or grown past max_rss_mb, in which case it is
+    # replaced in the background so the next run still finds a warm one.
+    def __init__(self, size=2, preload=(), max_runs=100, max_rss_mb=512):
+        self.size = max(0, int(size))
+        self.preload = list(preload)
+        self.max_runs = int(max_runs)
+        self.max_rss_mb = float(max_rss_mb)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._filling = False
+        self.started = 0
+        self.recycled = 0
+
+    def prestart(self):
+        # Top the pool up to `size` idle workers in the background
+        with self._lock:
+            if self._filling:
+                return
+            self._filling = True
+        threading.Thread(target=self._fill, daemon=True).start()
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.size:
+                        return
+                worker = self._spawn()
+                with self._lock:
+                    if len(self._idle) < self.size:
+                        self._idle.append(worker)
+                        continue
+                worker.kill()
+                return
+        except Exception as e:
+            logging.error(f"Could not start Python worker: {e}")
+        finally:
+            with self._lock:
+                self._filling = False
+
+    def _spawn(self):
+        worker = Worker(self.preload)
+        with self._lock:
+            self.started += 1
+        return worker
+
+    def run(self, path, cwd, env=None):
+        # env: variables set for this job only
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None or not worker.alive():
+            worker = self._spawn()
+        worker.runs += 1
+        return WarmJob(self, worker, path, cwd, env)
+
+    def release(self, worker):
+        worn = worker.runs >= self.max_runs or (self.max_rss_mb and worker.rss_mb > self.max_rss_mb)
+        if worn or not worker.alive():
+            worker.kill()
+            with self._lock:
+                self.recycled += 1
+            logging.info(f"Recycled Python worker after {worker.runs} runs ({worker.rss_mb} MB)")
+            self.prestart()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.kill()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "size": self.size,
+                    "started": self.started, "recycled": self.recycled}
+
+if __name__ == "__main__":
+    serve(json.loads(sys.argv[1]) if len(sys.argv) > 1 else [])
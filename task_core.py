@@ -0,0 +1,1706 @@
+"""Scheduling and execution engine for Task Runner.
+
+Nothing here imports tkinter: the window in task_runner.py is one client of
+TaskEngine, and `python task_core.py` (or `python task_runner.py --headless`)
+runs the engine on its own as a daemon, e.g. under systemd.
+"""
+import os
+import sys
+import time
+import threading
+import json
+import logging
+import subprocess
+import signal
+import re
+import heapq
+import itertools
+import io
+import codecs
+import tempfile
+from datetime import datetime, timedelta
+from collections import deque
+from cron_cache import cron_cache
+from task_store import TaskStore, DB_FILE, RUNTIME_FIELDS
+from py_workers import WarmPool
+import metrics
+import limits
+import dag
+import log_archive
+import log_search
+import triggers
+import task_file
+import misfire
+import adaptive
+from fingerprint import Fingerprints, UNCHANGED
+from coordination import Coordinator
+
+TASKS_FILE = 'tasks.json'  # imported into tasks.db on first start
+SETTINGS_FILE = 'settings.json'
+DEFAULT_SETTINGS = {
+    "max_workers": 4,  # global limit on concurrently running tasks
+    "engine": "threads",  # "asyncio" supervises all runs from one event loop (see async_engine.py)
+    "async_max_jobs": 1000,  # concurrent runs with the asyncio engine (instead of max_workers)
+    "max_output_bytes": 0,  # per-execution log cap, middle is truncated (0 = unlimited)
+    "shutdown_timeout": 30,  # seconds a stopping daemon waits for running tasks
+    "python_workers": 2,  # warm interpreters kept ready for tasks with warm_python set
+    "python_preload": [],  # modules each warm interpreter imports at startup
+    "python_worker_max_runs": 100,  # a warm interpreter is replaced after this many runs
+    "python_worker_max_rss_mb": 512,  # ...or once its memory grows past this (0 = no limit)
+    "log_level": "INFO",  # DEBUG also logs every scheduler wake-up and log segment
+    "metrics_port": 0,  # serve Prometheus metrics on 127.0.0.1:<port> (0 = off)
+    "metrics_file": "",  # also write them to this file every metrics_interval seconds
+    "metrics_interval": 15,
+    "api_port": 0,  # JSON control API on 127.0.0.1:<port> (0 = off), see control_api.py
+    "api_token": "",  # if set, API requests need "Authorization: Bearer <token>"
+    "log_archive": False,  # compress executions leaving the hot window instead of deleting them
+    "log_archive_days": 365,  # monthly archives older than this are deleted (0 = keep forever)
+    "search_index": True,  # full-text index of execution output in search.db
+    "search_max_bytes": 1048576,  # output indexed per execution (first and last halves beyond this)
+    "search_days": 90,  # executions older than this leave the index (0 = keep forever)
+    "pipeline_concurrency": 4,  # tasks of one dependency pipeline run at the same time
+    "coordination": False,  # share due runs with other instances using the same tasks.db
+    "lease_seconds": 30,  # a claimed run is taken over if its owner stops renewing this long
+    "claim_grace_seconds": 2,  # head start of the preferred instance for each due run
+    "watch_backend": "auto",  # "poll" scans watched folders instead of using inotify (e.g. network shares)
+    "watch_poll_seconds": 2,  # scan interval when polling, and retry interval for missing folders
+    "watch_debounce_seconds": 2,  # a watch run starts once no file has changed for this long
+    "misfire_policy": "coalesce",  # runs due more than misfire_grace_seconds ago: "coalesce", "skip" or "catchup" (see misfire.py)
+    "misfire_grace_seconds": 60,  # how late a run may start before its misfire policy applies
+    "catchup_max": 10,  # most missed runs a "catchup" task makes up for at once
+    "jitter_seconds": 0,  # spread each task's starts by a fixed offset of up to this many seconds
+    "max_starts_per_second": 0,  # engine-wide rate of scheduled starts (0 = no limit)
+    "start_burst": 10,  # starts allowed at once before max_starts_per_second applies
+    "reload_tasks_file": False,  # apply edits of tasks.json while running (see task_file.py)
+    "task_sync_seconds": 5,  # with coordination, how often to look for task changes made by other instances
+    "history_runs": 50,  # recent runs per task behind its duration, memory and CPU estimates (see adaptive.py)
+    "memory_budget_mb": 0,  # hold runs back while their predicted peak memory would exceed this (0 = no limit)
+    "cpu_budget": 0,  # ...or their predicted CPU use, in cores (0 = no limit)
+    "admission_max_delay": 300,  # seconds after which a held run may no longer be overtaken
+}
+LOG_DIR = 'logs'
+LOG_SWEEP_INTERVAL = 3600  # seconds between retention sweeps
+OUTPUT_CHUNK_SIZE = 64 * 1024
+LIVE_TAIL_BYTES = 256 * 1024
+WATCH_MAX_DELAY = 10  # a steady stream of changes still runs after this many debounce periods
+MAX_CHANGED_PATHS = 10000  # changed paths kept per pending watch run
+STARTUP_HORIZON = 300  # tasks due within this many seconds are scheduled before start() returns
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def parse_time(text):
+    # A TIME_FORMAT string as a datetime. fromisoformat is many times
+    # cheaper than strptime, which dominated startup with large fleets
+    if not isinstance(text, str) or len(text) != 19:
+        raise ValueError(f"not a time: {text!r}")
+    return datetime.fromisoformat(text)
+
+def load_settings():
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(SETTINGS_FILE, "r") as f:
+            settings.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[TaskRunner] Error reading {SETTINGS_FILE}, using defaults: {e}")
+    return settings
+
+def setup_logging(console=False, level=None):
+    handlers = [logging.FileHandler('task_runner.log')]
+    if console:
+        handlers.append(logging.StreamHandler())
+    if level is None:
+        level = load_settings().get("log_level", "INFO")
+    logging.basicConfig(
+        handlers=handlers,
+        level=getattr(logging, str(level).upper(), logging.INFO),
+        format='%(asctime)s - %(message)s'
+    )
+
+class TimerHeapScheduler:
+    # Min-heap of [fire_time, seq, key, item] entries keyed by a real datetime.
+    # The run() loop sleeps until the earliest fire time and is woken early by
+    # schedule()/unschedule(), so a tick costs O(log N) instead of O(N).
+    MAX_SLEEP = 60  # re-read the wall clock at least this often (sleep/resume, clock changes)
+    _REMOVED = object()
+
+    def __init__(self, on_due, lag_samples=1000):
+        self.on_due = on_due
+        self._heap = []
+        self._entries = {}
+        self._removed = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._lags = deque(maxlen=lag_samples)
+
+    def schedule(self, key, when, item=None):
+        # (Re)schedule key to fire at `when`; None just removes it
+        with self._cond:
+            self._discard(key)
+            if when is not None:
+                entry = [when, next(self._seq), key, item]
+                self._entries[key] = entry
+                heapq.heappush(self._heap, entry)
+            self._cond.notify()
+
+    def schedule_many(self, entries):
+        # Bulk schedule() of (key, when, item) entries with one heapify. A
+        # key that was scheduled in the meantime keeps its entry
+        with self._cond:
+            for key, when, item in entries:
+                if when is None or key in self._entries:
+                    continue
+                entry = [when, next(self._seq), key, item]
+                self._entries[key] = entry
+                self._heap.append(entry)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def unschedule(self, key):
+        self.schedule(key, None)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        # Lazy deletion: mark the entry and let run() drop it when it surfaces
+        entry[2] = self._REMOVED
+        entry[3] = None
+        self._removed += 1
+        if self._removed > 64 and self._removed > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[2] is not self._REMOVED]
+            heapq.heapify(self._heap)
+            self._removed = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._entries)
+
+    def next_fire_time(self):
+        with self._cond:
+            self._drop_removed()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_removed(self):
+        while self._heap and self._heap[0][2] is self._REMOVED:
+            heapq.heappop(self._heap)
+            self._removed -= 1
+
+    def run(self):
+        self._running = True
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        return
+                    self._drop_removed()
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, self.MAX_SLEEP))
+                when, _, key, item = heapq.heappop(self._heap)
+                del self._entries[key]
+            self._lags.append((datetime.now() - when).total_seconds())
+            try:
+                self.on_due(key, item, when)
+            except Exception as e:
+                logging.error(f"[SCHEDULER] Error dispatching {key}: {e}")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def lag_stats(self):
+        # Fire lag in seconds: actual wake-up time minus scheduled time
+        lags = sorted(self._lags)
+        if not lags:
+            return {"count": 0}
+        def pct(p):
+            return lags[min(len(lags) - 1, int(p * len(lags)))]
+        return {
+            "count": len(lags),
+            "last": self._lags[-1],
+            "mean": sum(lags) / len(lags),
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": lags[-1],
+        }
+
+class LiveTail:
+    # Recent output of one running execution, kept in a bounded ring. Followers
+    # call read(pos) with the position returned by their previous read.
+    def __init__(self, segment=None, max_chars=LIVE_TAIL_BYTES):
+        self.segment = segment  # log store seq of the execution being followed
+        self.max_chars = max_chars
+        self.closed = False
+        self._chunks = deque()
+        self._start = 0
+        self._end = 0
+        self._cond = threading.Condition()
+
+    def write(self, text):
+        if not text:
+            return
+        with self._cond:
+            self._chunks.append(text)
+            self._end += len(text)
+            while self._end - self._start - len(self._chunks[0]) >= self.max_chars:
+                self._start += len(self._chunks.popleft())
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def read(self, pos=0, timeout=None):
+        # Returns (text, new_pos, skipped); skipped is how many characters
+        # before the returned text fell out of the ring since pos
+        with self._cond:
+            if timeout and pos >= self._end and not self.closed:
+                self._cond.wait(timeout)
+            skipped = max(0, self._start - pos)
+            pos = max(pos, self._start)
+            text = "".join(self._chunks)[pos - self._start:]
+            return text, self._end, skipped
+
+class OutputCapture:
+    # Incremental half of stream_output: feed() raw chunks as they arrive and
+    # close() at EOF. Decodes UTF-8 and newlines incrementally; with max_bytes
+    # the first half is written straight through, the last half is held in a
+    # ring and everything between is dropped.
+    def __init__(self, write, tail=None, max_bytes=0):
+        self.write = write
+        self.tail = tail
+        self.decoder = self._new_decoder()
+        self.live = self._new_decoder() if max_bytes else self.decoder
+        self.head_left = max_bytes - max_bytes // 2 if max_bytes else None
+        self.tail_keep = max_bytes // 2
+        self.ring = deque()
+        self.ring_size = 0
+        self.total = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _new_decoder():
+        return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(errors="replace"), translate=True)
+
+    def feed(self, data):
+        self.total += len(data)
+        if self.head_left is None:
+            text = self.decoder.decode(data)
+            self.write(text)
+            if self.tail is not None:
+                self.tail.write(text)
+            return
+        if self.tail is not None:
+            self.tail.write(self.live.decode(data))
+        if self.head_left > 0:
+            head, data = data[:self.head_left], data[self.head_left:]
+            self.head_left -= len(head)
+            self.write(self.decoder.decode(head))
+            if not data:
+                return
+        self.ring.append(data)
+        self.ring_size += len(data)
+        while self.ring and self.ring_size - len(self.ring[0]) >= self.tail_keep:
+            self.dropped += len(self.ring[0])
+            self.ring_size -= len(self.ring.popleft())
+
+    def close(self):
+        # Returns (total_bytes, dropped_bytes)
+        self.write(self.decoder.decode(b"", True))
+        if self.ring:
+            rest = b"".join(self.ring)
+            if len(rest) > self.tail_keep:
+                self.dropped += len(rest) - self.tail_keep
+                rest = rest[len(rest) - self.tail_keep:]
+            if self.dropped:
+                self.write(f"\n[... {self.dropped} bytes truncated ...]\n")
+            self.write(self._new_decoder().decode(rest, True))
+        return self.total, self.dropped
+
+def stream_output(stream, write, tail=None, max_bytes=0, chunk_size=OUTPUT_CHUNK_SIZE):
+    # Copy a child's output to write() as it arrives (see OutputCapture).
+    # Memory stays bounded by chunk_size, or by max_bytes when a cap is set.
+    # Returns (total_bytes, dropped_bytes).
+    capture = OutputCapture(write, tail, max_bytes)
+    while True:
+        data = stream.read1(chunk_size)
+        if not data:
+            break
+        capture.feed(data)
+    return capture.close()
+
+def wait_with_usage(proc):
+    # Exit code plus {"cpu_user", "cpu_sys", "max_rss_mb"} of the finished
+    # child. wait4 reports the child together with the descendants it waited
+    # for (the shell and the script it ran); values are None where the
+    # platform has no wait4.
+    usage = getattr(proc, "usage", None)
+    if usage is not None:
+        # Warm worker job: measured inside the worker
+        return proc.wait(), usage()
+    if hasattr(os, "wait4") and proc.returncode is None:
+        try:
+            _, status, ru = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            return proc.wait(), {"cpu_user": None, "cpu_sys": None, "max_rss_mb": None}
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss_unit = 2**20 if sys.platform == "darwin" else 1024
+        return proc.returncode, {"cpu_user": ru.ru_utime, "cpu_sys": ru.ru_stime,
+                                 "max_rss_mb": ru.ru_maxrss / rss_unit}
+    return proc.wait(), {"cpu_user": None, "cpu_sys": None, "max_rss_mb": None}
+
+def shell_command(task):
+    # The command line a (non-warm) run hands to the shell. A task imported
+    # from a crontab carries its whole command line in "command".
+    if task.get("command"):
+        return task["command"]
+    ext = os.path.splitext(task['file_path'])[1].lower()
+    if ext in ['.bat', '.cmd']:
+        return f'cmd /c "{task["file_path"]}"'
+    elif ext == '.py':
+        return f'python "{task["file_path"]}"'
+    return f'"{task["file_path"]}"'
+
+def task_cwd(task):
+    # Runs happen in the task's own directory unless it names one ("cwd")
+    return task.get("cwd") or os.path.dirname(os.path.abspath(task['file_path']))
+
+def task_env(task, extra=None):
+    # Environment of a run: the runner's own plus the task's "env" entries
+    # and extra (None = inherit unchanged)
+    env = dict(task.get("env") or {}, **(extra or {}))
+    return dict(os.environ, **env) if env else None
+
+class LogStore:
+    # Execution logs, one segment file per execution under logs/<task>/, plus a
+    # small index.json holding each segment's file, kind, start/end time, exit
+    # code and size, and the number the next execution gets. Appending creates one file and trimming deletes the oldest
+    # ones (or hands them to the archiver); existing output is never re-read
+    # or rewritten.
+    def __init__(self, root=LOG_DIR, archiver=None, indexer=None):
+        self.root = root
+        self.archiver = archiver
+        self.indexer = indexer
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._next_seq = {}  # next execution number by task, never reused
+
+    @staticmethod
+    def safe_name(task):
+        # Sanitize name for filename and convert to lowercase
+        return re.sub(r'[^\w\-_]', '_', task.get('name', 'task')).lower()
+
+    def task_dir(self, task):
+        return os.path.join(self.root, self.safe_name(task))
+
+    def segment_path(self, task, entry):
+        return os.path.join(self.task_dir(task), entry["file"])
+
+    def _index(self, task):
+        # Cached index for the task, loaded (or migrated) on first use
+        name = self.safe_name(task)
+        entries = self._indexes.get(name)
+        if entries is not None:
+            return entries
+        index_file = os.path.join(self.root, name, "index.json")
+        next_seq = None
+        try:
+            with open(index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A bare list was written before the counter was kept
+            if isinstance(data, dict):
+                entries, next_seq = data["entries"], data["next_seq"]
+            else:
+                entries = data
+        except FileNotFoundError:
+            entries = self._migrate_legacy(name)
+        except Exception as e:
+            print(f"[TaskRunner] Error reading log index {index_file}: {e}")
+            entries = []
+        if next_seq is None:
+            # Continue after every execution still on disk, archived ones too
+            archived = log_archive.archive_entries(os.path.join(self.root, name))
+            next_seq = max([e["seq"] for e in entries + archived], default=0) + 1
+        self._indexes[name] = entries
+        self._next_seq[name] = next_seq
+        # Segments whose archiving was interrupted by a restart
+        for entry in entries:
+            if entry.get("archiving"):
+                if self.archiver is not None:
+                    self.archiver.submit(self, task, entry)
+                else:
+                    del entry["archiving"]
+        return entries
+
+    def _migrate_legacy(self, name):
+        # Adopt an old single-file <name>.log as the task's first segment
+        legacy = f"{name}.log"
+        if not os.path.isfile(legacy):
+            return []
+        os.makedirs(os.path.join(self.root, name), exist_ok=True)
+        stamp = datetime.fromtimestamp(os.path.getmtime(legacy)).strftime(TIME_FORMAT)
+        entry = {"seq": 0, "file": "legacy.log", "kind": "legacy", "start": stamp, "end": stamp,
+                 "exit_code": None, "bytes": os.path.getsize(legacy)}
+        os.replace(legacy, os.path.join(self.root, name, entry["file"]))
+        self._write_index(name, [entry])
+        return [entry]
+
+    def _write_index(self, name, entries):
+        index_file = os.path.join(self.root, name, "index.json")
+        tmp = index_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"next_seq": self._next_seq.get(name, 1), "entries": entries}, f)
+        os.replace(tmp, index_file)
+
+    def open_segment(self, task, kind):
+        # Register a new running execution; returns (entry, path to write to)
+        with self._lock:
+            entries = self._index(task)
+            # Numbers only ever go up, even once trimming or the retention
+            # sweep has removed every earlier execution
+            name = self.safe_name(task)
+            seq = self._next_seq[name]
+            self._next_seq[name] = seq + 1
+            entry = {"seq": seq, "file": f"{seq:08d}.log", "kind": kind,
+                     "start": datetime.now().strftime(TIME_FORMAT),
+                     "end": None, "exit_code": None, "bytes": 0}
+            os.makedirs(self.task_dir(task), exist_ok=True)
+            entries.append(entry)
+            self._write_index(name, entries)
+            return entry, self.segment_path(task, entry)
+
+    def close_segment(self, task, entry, exit_code, status=None):
+        with self._lock:
+            entry["end"] = datetime.now().strftime(TIME_FORMAT)
+            entry["exit_code"] = exit_code
+            if status:
+                entry["status"] = status
+            try:
+                entry["bytes"] = os.path.getsize(self.segment_path(task, entry))
+            except OSError:
+                pass
+            if self.indexer is not None:
+                self.indexer.submit(self, task, entry)
+            self._trim(task, int(task.get('log_executions', 1)))
+            self._write_index(self.safe_name(task), self._index(task))
+
+    def _trim(self, task, keep):
+        # Drop the oldest finished segments beyond the last `keep` executions
+        entries = [e for e in self._index(task) if not e.get("archiving")]
+        excess = len(entries) - max(1, keep)
+        self._expire(task, [e for e in entries[:max(0, excess)] if e["end"] is not None])
+
+    def _expire(self, task, expired):
+        # Segments leaving the hot window: archived in the background when an
+        # archiver is attached (they stay listed until then), else deleted
+        if self.archiver is None:
+            self._remove(task, expired)
+            return
+        for entry in expired:
+            entry["archiving"] = True
+            self.archiver.submit(self, task, entry)
+
+    def archived(self, task, entry):
+        # Called by the archiver once the segment's compressed copy is stored
+        with self._lock:
+            entries = self._index(task)
+            if any(e is entry for e in entries):
+                self._remove(task, [entry])
+                self._write_index(self.safe_name(task), entries)
+
+    def _remove(self, task, expired):
+        entries = self._index(task)
+        for entry in expired:
+            try:
+                os.remove(self.segment_path(task, entry))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[TaskRunner] Error removing log segment {entry['file']}: {e}")
+                continue
+            entries.remove(entry)
+
+    def sweep(self, tasks, now=None):
+        # Enforce each task's `retention` (days) on finished segments
+        now = now or datetime.now()
+        removed = 0
+        for task in list(tasks):
+            cutoff = (now - timedelta(days=int(task.get("retention", 1)))).strftime(TIME_FORMAT)
+            with self._lock:
+                if not os.path.isdir(self.task_dir(task)) and not os.path.isfile(f"{self.safe_name(task)}.log"):
+                    continue
+                expired = [e for e in self._index(task)
+                           if e["end"] is not None and e["start"] < cutoff and not e.get("archiving")]
+                if expired:
+                    self._expire(task, expired)
+                    self._write_index(self.safe_name(task), self._index(task))
+                    removed += len(expired)
+            if self.archiver is not None:
+                self.archiver.expire(self.task_dir(task), now)
+        return removed
+
+    def executions(self, task, archived=False):
+        # Executions in the hot window; with archived=True preceded by the
+        # archived ones (entries with an "archive" key, see open_archived)
+        with self._lock:
+            hot = [dict(e) for e in self._index(task)]
+        if not archived:
+            return hot
+        keys = {log_archive.entry_key(e) for e in hot}
+        return [e for e in log_archive.archive_entries(self.task_dir(task)) if log_archive.entry_key(e) not in keys] + hot
+
+    def open_archived(self, task, entry, out):
+        # Decompress one archived execution into the binary file `out`
+        log_archive.extract(self.task_dir(task), entry, out)
+
+class ExecutionPool:
+    # Bounded worker pool. At most max_workers jobs run at once and at most
+    # max_instances runs of the same task key overlap. Due runs wait in a FIFO
+    # queue instead of being dropped; a job whose task is at its instance limit
+    # is passed over until one of its runs finishes, and so is a job the
+    # admission controller (adaptive.Admission) does not let in yet.
+    def __init__(self, max_workers=4, wait_samples=1000, admission=None):
+        self.max_workers = max(1, int(max_workers))
+        self.admission = admission
+        self._queue = deque()  # (key, fn, max_instances, enqueued_at)
+        self._running = {}
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=wait_samples)
+        if admission is not None:
+            # Budget freed by another pool sharing it (the async supervisor)
+            admission.add_listener(self._admission_released)
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"task-worker-{i}", daemon=True).start()
+
+    def submit(self, key, fn, max_instances=1, unique=True):
+        # Queue fn(wait_seconds) to run; a task already waiting in the queue is
+        # not queued a second time (returns False) unless unique is False
+        with self._cond:
+            if unique and any(job[0] == key for job in self._queue):
+                return False
+            self._queue.append((key, fn, max(1, int(max_instances)), time.monotonic()))
+            self._cond.notify_all()
+            return True
+
+    def is_queued(self, key):
+        with self._cond:
+            return any(job[0] == key for job in self._queue)
+
+    def running_count(self, key):
+        with self._cond:
+            return self._running.get(key, 0)
+
+    def _next_job(self):
+        now = time.monotonic()
+        for i, job in enumerate(self._queue):
+            if self._running.get(job[0], 0) >= job[2]:
+                continue
+            if self.admission is not None:
+                admitted = self.admission.acquire(job[0], job[3], now - job[3])
+                if admitted is None:
+                    return None  # held too long: nothing behind it may start first
+                if not admitted:
+                    continue
+            del self._queue[i]
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                key, fn = job[0], job[1]
+                self._running[key] = self._running.get(key, 0) + 1
+            wait = time.monotonic() - job[3]
+            self._waits.append(wait)
+            try:
+                fn(wait)
+            except Exception as e:
+                logging.error(f"[POOL] Job {key} failed: {e}")
+            finally:
+                if self.admission is not None:
+                    self.admission.release(key)
+                with self._cond:
+                    self._running[key] -= 1
+                    if not self._running[key]:
+                        del self._running[key]
+                    # A finished run may unblock a queued run of the same task
+                    self._cond.notify_all()
+
+    def _admission_released(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        # Wait until nothing is queued or running; False on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queue)
+            running = sum(self._running.values())
+        waits = sorted(self._waits)
+        stats = {"queued": queued, "running": running, "max_workers": self.max_workers}
+        if waits:
+            stats.update({
+                "wait_mean": sum(waits) / len(waits),
+                "wait_p95": waits[min(len(waits) - 1, int(0.95 * len(waits)))],
+                "wait_max": waits[-1],
+            })
+        return stats
+
+class ExecutionRecord:
+    # The bookkeeping around one execution, shared by both engines: the
+    # skip-if-unchanged check, run history, the log segment with its header,
+    # live tail and trailer, metrics, estimates and listener events. The
+    # engines only start the process and move its output. Every method may
+    # wait on SQLite or the disk, so the asyncio engine calls them through
+    # asyncio.to_thread.
+    def __init__(self, engine, task, manual=False, wait=0.0, fire_lag=0.0):
+        self.engine = engine
+        self.task = task
+        self.manual = manual
+        self.mode = "MANUAL" if manual else "SCHEDULED"
+        self.kind = self.mode.lower()
+        self.wait = wait
+        # Scheduled time to process start; not meaningful for manual runs
+        self.lag = None if manual else fire_lag + wait
+        self.max_bytes = int(task.get("max_output_bytes", engine.settings.get("max_output_bytes", 0)) or 0)
+        self.fingerprint = None
+        self.changes = None
+        self.run_id = None
+        self.started = None
+        self.exit_code = None
+        self.usage = {}
+        self.status = None
+        self.entry = None
+        self.tail = None
+        self._out = None
+
+    def unchanged(self):
+        # True, and recorded as such, if this scheduled run of a
+        # skip_unchanged task can be skipped
+        task = self.task
+        self.fingerprint = self.engine._fingerprint(task) if task.get("skip_unchanged") else None
+        if self.fingerprint and not self.manual and self.engine.fingerprints.unchanged(task, self.fingerprint):
+            self.engine._record_unchanged(task, self.fingerprint, self.lag)
+            self.status = UNCHANGED
+            return True
+        return False
+
+    def prepare(self):
+        # Before the process starts: (working directory, extra environment)
+        task = self.task
+        if self.manual:
+            # Set last_execution to 'running...' and update UI
+            task['last_execution'] = 'running...'
+            self.engine._notify("changed", task)
+        self.changes = self.engine._take_changes(task) if task.get("watch") else None
+        return task_cwd(task), {"TASK_RUNNER_CHANGED_FILE": self.changes[0]} if self.changes else None
+
+    def start(self, command):
+        # The process is about to start: the run history entry
+        logging.info(f"[{self.mode}] Would run: {command} (waited {self.wait:.2f}s in queue)")
+        self.started = datetime.now()
+        self.run_id = self.engine.store.start_run(self.task, self.kind, self.started.strftime(TIME_FORMAT))
+
+    def open_log(self):
+        # The execution's own log segment, so overlapping runs of the same
+        # task never interleave and trimming never rewrites old output.
+        # Writes the header; returns write() for the output
+        task = self.task
+        self.entry, path = self.engine.log_store.open_segment(task, self.kind)
+        logging.debug(f"Writing log to: {os.path.abspath(path)}")
+        self.tail = LiveTail(self.entry["seq"])
+        self.engine.live_tails[task["id"]] = self.tail
+        self._out = open(path, 'w', encoding='utf-8', errors='replace')
+        marker = "MANUAL EXECUTION" if self.manual else "EXECUTION"
+        changes = self.changes
+        header = (
+            f"==== {marker} {self.started.strftime(TIME_FORMAT)} ====" + "\n"
+            f"Task: {task.get('name', '')}\n"
+            f"File: {task.get('file_path', '')}\n"
+            + (f"Changed: {changes[1]} files (listed in $TASK_RUNNER_CHANGED_FILE)\n" if changes else "") + "\n"
+        )
+        self._out.write(header)
+        self.tail.write(header)
+        return self._out.write
+
+    def end_log(self, exit_code, status, timeout=None, total=0, dropped=0):
+        # The process exited: record why in the log itself if it was stopped
+        self.exit_code = exit_code
+        self.status = status
+        self._out.write("\n")
+        if status not in ("ok", "failed"):
+            reason = f"timeout after {timeout}s" if status == "timeout" else status.replace("_", " ")
+            trailer = f"==== KILLED ({reason}, exit code {exit_code}) ====\n"
+            self._out.write(trailer)
+            self.tail.write(trailer)
+        if dropped:
+            logging.info(f"Truncated {dropped} of {total} output bytes for {self.task.get('name')}")
+
+    def close_log(self):
+        # Always called once open_log() was, even if the run failed
+        task = self.task
+        try:
+            if self._out is not None:
+                self._out.close()
+        finally:
+            if self.tail is not None:
+                self.tail.close()
+                if self.engine.live_tails.get(task["id"]) is self.tail:
+                    del self.engine.live_tails[task["id"]]
+            if self.entry is not None:
+                self.engine.log_store.close_segment(task, self.entry, self.exit_code, self.status)
+
+    def completed(self, usage=None):
+        if usage is not None:
+            self.usage = usage
+        task = self.task
+        logging.info(f"[{self.mode}] Task completed: {task['file_path']} (exit code {self.exit_code}, {self.status})")
+        if self.manual:
+            # Update last_execution to completion time and update UI
+            task['last_execution'] = datetime.now().strftime(TIME_FORMAT)
+        self.engine._notify("finished", task, self.exit_code)
+
+    def failed(self, error):
+        task = self.task
+        logging.error(f"[{self.mode}] Error running task {task['file_path']}: {str(error)}")
+        if self.manual:
+            task['last_execution'] = f'Error: {error}'
+        self.engine._notify("error", task, {"manual": self.manual, "error": str(error)})
+
+    def finish(self):
+        # Append-only run history, metrics and estimates; returns the status
+        engine, task = self.engine, self.task
+        try:
+            if self.run_id is not None:
+                ended = datetime.now()
+                wall = (ended - self.started).total_seconds()
+                self.status = self.status or limits.run_status(self.exit_code)
+                engine.store.finish_run(self.run_id, ended.strftime(TIME_FORMAT), self.exit_code, wall,
+                                        self.usage, self.lag, self.status)
+                engine.metrics.observe_run(task.get("name", ""), dict(self.usage, wall=wall, exit_code=self.exit_code,
+                                                                      lag=self.lag, status=self.status))
+                engine.history.observe(task["id"], self.status, wall, self.usage)
+                if self.fingerprint and self.status == "ok":
+                    engine.fingerprints.record(task, self.fingerprint)
+            if self.manual:
+                engine.store.update_runtime(task)
+        finally:
+            if self.changes:
+                try:
+                    os.remove(self.changes[0])
+                except OSError:
+                    pass
+        return self.status
+
+class TaskEngine:
+    # Owns the task list, the timer heap, the worker pool and the log store.
+    # Clients (the GUI, the daemon, the control API) drive it through
+    # add_task/update_task/remove_task/apply_batch/run_task and get told about
+    # changes through listeners, which are called as listener(event, task,
+    # detail) from engine threads.
+    def __init__(self, settings=None, db_file=DB_FILE, tasks_file=TASKS_FILE):
+        self.settings = settings if settings is not None else load_settings()
+        self.store = TaskStore(db_file)
+        # Tasks imported from the file stay managed by it, should
+        # reload_tasks_file be turned on now or later
+        migrated = self.store.migrate_json(tasks_file, task_file.SOURCE)
+        if migrated:
+            logging.info(f"Imported {migrated} tasks from {tasks_file} into {db_file}")
+        # Read before the tasks, so a change saved in between is loaded again
+        self._tasks_version = self.store.tasks_version()
+        self.tasks = self.store.load_tasks()
+        # The same tasks by id, for lookups and membership tests that do not
+        # scan the list. Kept in step with self.tasks under tasks_lock
+        self._tasks_by_id = {task["id"]: task for task in self.tasks}
+        # Held while the task list, the dependency map or the stored tasks
+        # change (from the window, the API and tasks.json reloads alike), and
+        # by readers that need a consistent copy. Re-entrant: a reload
+        # applies its batch with it held
+        self.tasks_lock = threading.RLock()
+        self.listeners = []
+        # Per-task duration, memory and CPU estimates, and the admission
+        # controller that keeps due runs within the host budgets
+        self.history = adaptive.RunHistory(self.settings.get("history_runs", 50))
+        self.admission = adaptive.Admission(self.history, self.settings.get("memory_budget_mb", 0),
+                                            self.settings.get("cpu_budget", 0),
+                                            self.settings.get("admission_max_delay", 300))
+        # Bounded pool for task runs
+        self.pool = ExecutionPool(self.settings.get("max_workers", 4), admission=self.admission)
+        self.supervisor = None
+        if self.settings.get("engine") == "asyncio":
+            # Imported here: async_engine builds on this module
+            from async_engine import AsyncSupervisor
+            self.supervisor = AsyncSupervisor(self, self.settings.get("async_max_jobs", 1000), admission=self.admission)
+        archiver = None
+        if self.settings.get("log_archive"):
+            archiver = log_archive.LogArchiver(self.settings.get("log_archive_days", 365))
+        indexer = None
+        if self.settings.get("search_index", True):
+            indexer = log_search.SearchIndexer(log_search.SEARCH_DB, self.settings.get("search_max_bytes", 1 << 20),
+                                               self.settings.get("search_days", 90))
+        self.log_store = LogStore(archiver=archiver, indexer=indexer)
+        # Live output of running executions, by task
+        self.live_tails = {}
+        # Warm interpreters for .py tasks that opt in
+        self.warm_pool = WarmPool(self.settings.get("python_workers", 2),
+                                  self.settings.get("python_preload", []),
+                                  self.settings.get("python_worker_max_runs", 100),
+                                  self.settings.get("python_worker_max_rss_mb", 512))
+        # Per-task run aggregates, exported by start() if configured
+        self.metrics = metrics.Metrics(gauges=self._gauges)
+        self.metrics_server = None
+        self.api_server = None
+        # Dependency graph: parent id -> dependent tasks, and running pipelines by root id
+        self.children = dag.build_children(self.tasks)
+        self.pipelines = {}
+        self.pipelines_lock = threading.Lock()
+        # Claims on due runs when several instances share the database
+        self.coordinator = None
+        if self.settings.get("coordination"):
+            self.coordinator = Coordinator(db_file, self.settings.get("lease_seconds", 30),
+                                           self.settings.get("claim_grace_seconds", 2), self._on_takeover)
+        # File-change triggers: changed paths wait here until a run takes them
+        self.watcher = triggers.Watcher(self._on_file_change, self.settings.get("watch_backend", "auto"),
+                                        self.settings.get("watch_poll_seconds", 2))
+        self.pending_changes = {}
+        self.changes_lock = threading.Lock()
+        # Script and input fingerprints of skip_unchanged tasks
+        self.fingerprints = Fingerprints(self.store)
+        # Late runs by how they were handled, and the engine-wide start rate
+        self.misfires = {"coalesced": 0, "skipped": 0, "caught_up": 0, "catchup_runs": 0}
+        self.start_limiter = None
+        rate = float(self.settings.get("max_starts_per_second", 0) or 0)
+        if rate > 0:
+            self.start_limiter = misfire.StartLimiter(rate, self.settings.get("start_burst", 10))
+        self._held = itertools.count()
+        # Timer heap keyed on each task's next_run. Only tasks due within
+        # STARTUP_HORIZON go in now (TIME_FORMAT strings sort by time); the
+        # rest, and tasks whose next_run is missing, wait for start()
+        self.scheduler = TimerHeapScheduler(self._on_task_due)
+        soon = (datetime.now() + timedelta(seconds=STARTUP_HORIZON)).strftime(TIME_FORMAT)
+        self._deferred = []
+        for task in self.tasks:
+            next_run = task.get("next_run")
+            if next_run and next_run != "-" and next_run <= soon:
+                self._reschedule(task)
+            else:
+                self._deferred.append(task)
+            self.watcher.set_task(task)
+        # tasks.json, watched for edits if reload_tasks_file is set
+        self.tasks_file = os.path.abspath(tasks_file)
+        self._tasks_file_watch = None
+        self._tasks_file_seen = None
+        if self.settings.get("reload_tasks_file"):
+            self._tasks_file_watch = {"id": ("tasks_file",), "name": tasks_file, "watch": [self.tasks_file]}
+            self.watcher.set_task(self._tasks_file_watch)
+        self.scheduler_thread = None
+
+    def start(self):
+        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
+        self.scheduler_thread.start()
+        threading.Thread(target=self._schedule_deferred, name="deferred-schedule", daemon=True).start()
+        threading.Thread(target=self._sweep_logs, daemon=True).start()
+        if self.log_store.indexer is not None:
+            self.log_store.indexer.backfill(self.log_store, self.tasks)
+        if any(task.get("warm_python") for task in self.tasks):
+            self.warm_pool.prestart()
+        port = int(self.settings.get("metrics_port", 0) or 0)
+        if port:
+            try:
+                self.metrics_server = metrics.serve(self.metrics, port)
+                logging.info(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+            except OSError as e:
+                logging.error(f"Could not serve metrics on port {port}: {e}")
+        if self.settings.get("metrics_file"):
+            threading.Thread(target=self._write_metrics, daemon=True).start()
+        port = int(self.settings.get("api_port", 0) or 0)
+        if port:
+            # Imported here: most setups never serve the API
+            import control_api
+            try:
+                self.api_server = control_api.serve(self, port, self.settings.get("api_token", ""))
+                logging.info(f"Control API on http://127.0.0.1:{port}/")
+            except OSError as e:
+                logging.error(f"Could not serve the control API on port {port}: {e}")
+        if self.coordinator is not None:
+            self.coordinator.start()
+            logging.info(f"Coordinating with other instances as {self.coordinator.owner}")
+            self._schedule_sync()
+        self.watcher.start()
+
+    def stop(self, timeout=0):
+        # Stop firing new runs and wait up to `timeout` seconds for running ones
+        self.scheduler.stop()
+        self.watcher.stop()
+        if self.api_server is not None:
+            import control_api
+            control_api.shutdown(self.api_server)
+        deadline = time.monotonic() + (timeout or 0)
+        idle = self.pool.wait_idle(timeout)
+        if self.supervisor is not None:
+            if not self.supervisor.wait_idle(max(0, deadline - time.monotonic())):
+                # Event-loop runs can be terminated and recorded as killed
+                idle = False
+                self.supervisor.cancel()
+                self.supervisor.wait_idle(limits.KILL_GRACE + 1)
+            self.supervisor.close()
+        if self.coordinator is not None:
+            self.coordinator.stop()
+        self.warm_pool.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if self.settings.get("metrics_file"):
+            self.metrics.write_file(self.settings["metrics_file"])
+        return idle
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, event, task=None, detail=None):
+        for listener in list(self.listeners):
+            try:
+                listener(event, task, detail)
+            except Exception as e:
+                logging.error(f"Listener failed on {event}: {e}")
+
+    @staticmethod
+    def compute_next_run(cron_expr, base=None):
+        # Next fire time as a "%Y-%m-%d %H:%M:%S" string, or "-" if invalid
+        when = cron_cache.next_run(cron_expr, base)
+        return when.strftime(TIME_FORMAT) if when else "-"
+
+    def get_task(self, task_id):
+        with self.tasks_lock:
+            return self._tasks_by_id.get(task_id)
+
+    def has_task(self, task):
+        # Whether the task is still one of self.tasks (not removed meanwhile)
+        return self._tasks_by_id.get(task["id"]) is task
+
+    def list_tasks(self):
+        # Copies of every task, taken together (safe to serialize while
+        # other threads change tasks)
+        with self.tasks_lock:
+            return [dict(task) for task in self.tasks]
+
+    def add_task(self, task):
+        # Raises ValueError for dependencies on unknown tasks
+        with self.tasks_lock:
+            dag.validate(self.tasks, None, dag.parents(task))
+            self.store.insert_task(task)
+            self.tasks.append(task)
+            self._tasks_by_id[task["id"]] = task
+            self.children = dag.build_children(self.tasks)
+            self.schedule_task(task)
+        if task.get("warm_python"):
+            self.warm_pool.prestart()
+
+    def update_task(self, task, fields):
+        # Update in place so queued/running runs keep referring to the task
+        # (last_execution and other fields are preserved). Raises ValueError
+        # if the new dependencies are unknown or would form a cycle
+        with self.tasks_lock:
+            if "depends_on" in fields:
+                dag.validate(self.tasks, task["id"], dag.parents(fields))
+            task.update(fields)
+            self.children = dag.build_children(self.tasks)
+            self.schedule_task(task)
+        if task.get("warm_python"):
+            self.warm_pool.prestart()
+
+    def remove_task(self, task):
+        with self.tasks_lock:
+            if not self.has_task(task):
+                return  # already removed by another thread
+            self._drop(task)
+            self._prune()
+            self.store.delete_task(task)
+            # Dependents no longer wait for the removed task
+            for child in self.children.pop(task["id"], []):
+                child["depends_on"] = [p for p in dag.parents(child) if p != task["id"]]
+                self.store.update_task(child)
+                self._notify("changed", child)
+            self.children = dag.build_children(self.tasks)
+            self._notify("removed", task)
+
+    def apply_batch(self, create=(), update=(), delete=()):
+        # Many changes with one store transaction, one next-run pass and one
+        # dependency rebuild. create: task dicts; update: (task, fields)
+        # pairs; delete: tasks. Everything is checked before anything is
+        # applied; raises ValueError (nothing changed) on a bad dependency.
+        with self.tasks_lock:
+            self._apply_batch(create, update, delete)
+        if any(task.get("warm_python") for task in list(create) + [task for task, _ in update]):
+            self.warm_pool.prestart()
+
+    def _apply_batch(self, create, update, delete):
+        for task in list(delete) + [task for task, _ in update]:
+            if not self.has_task(task):
+                raise ValueError(f"Task {task['id']} does not exist")
+        deleted = {task["id"] for task in delete}
+        planned = {task["id"]: dict(task) for task in self.tasks if task["id"] not in deleted}
+        for task, fields in update:
+            if task["id"] in deleted:
+                raise ValueError(f"Task {task['id']} is both updated and deleted")
+            planned[task["id"]].update(fields)
+        # Only tasks with dependencies need checking (keeps large imports linear)
+        known = list(planned.values())
+        for task, fields in update:
+            if "depends_on" in fields:
+                dag.validate(known, task["id"], dag.parents(fields))
+        for task in create:
+            if dag.parents(task):
+                dag.validate(known, None, dag.parents(task))
+        # Dependents of deleted tasks stop waiting for them
+        dependents = []
+        for task in self.tasks:
+            if task["id"] not in deleted and deleted.intersection(dag.parents(planned[task["id"]])):
+                dependents.append(task)
+        for task, fields in update:
+            task.update(fields)
+        for task in dependents:
+            task["depends_on"] = [p for p in dag.parents(task) if p not in deleted]
+        scheduled = list(create) + [task for task, _ in update]
+        next_runs = cron_cache.next_runs((i, task["cron_expr"]) for i, task in enumerate(scheduled))
+        for i, task in enumerate(scheduled):
+            times = next_runs[i]
+            task["next_run"] = times[0].strftime(TIME_FORMAT) if times else "-"
+        changed = {task["id"]: task for task, _ in update}
+        changed.update((task["id"], task) for task in dependents)
+        self.store.apply_batch(create, list(changed.values()), delete)
+        for task in delete:
+            self._drop(task)
+        self._prune()
+        self._add(create)
+        self.children = dag.build_children(self.tasks)
+        for task in scheduled:
+            self._reschedule(task)
+            self.watcher.set_task(task)
+        # One event for the whole batch, so listeners refresh once
+        self._notify("batch", None, {"created": [t["id"] for t in create], "updated": list(changed),
+                                     "deleted": [t["id"] for t in delete]})
+
+    def schedule_task(self, task):
+        # Calculate and store the next_run time from the compiled schedule
+        with self.tasks_lock:
+            if not self.has_task(task):
+                return  # removed meanwhile
+            task["next_run"] = self.compute_next_run(task["cron_expr"])
+            self._reschedule(task)
+            self.watcher.set_task(task)
+            self.store.update_task(task)
+        self._notify("changed", task)
+
+    def _drop(self, task):
+        # Forget a task that is going away (the caller updates the store)
+        self.scheduler.unschedule(task["id"])
+        self._unwatch(task)
+        self.fingerprints.forget(task["id"])
+        self.history.forget(task["id"])
+        del self._tasks_by_id[task["id"]]
+        self.metrics.forget(task.get("name", ""))
+
+    def _prune(self):
+        # Take dropped tasks out of the list, in one pass however many there
+        # are. In place: the window shares the list
+        self.tasks[:] = [task for task in self.tasks if self.has_task(task)]
+
+    def _add(self, tasks):
+        self.tasks.extend(tasks)
+        self._tasks_by_id.update((task["id"], task) for task in tasks)
+
+    def _schedule_sync(self):
+        self.scheduler.schedule(("sync",), datetime.now() + timedelta(seconds=float(self.settings.get("task_sync_seconds", 5))))
+
+    def sync_tasks(self):
+        # Load the task changes other instances saved to the shared database
+        # since the last look (True if there were any). Changed tasks are
+        # rescheduled from their new definition; next_run and last_execution
+        # stay this instance's own
+        if self.store.tasks_version() == self._tasks_version:
+            return False
+        with self.tasks_lock:
+            version = self.store.tasks_version()
+            stored = {task["id"]: task for task in self.store.load_tasks()}
+            local = dict(self._tasks_by_id)
+            create = [task for task_id, task in stored.items() if task_id not in local]
+            delete = [task for task_id, task in local.items() if task_id not in stored]
+            update = []
+            for task_id, task in local.items():
+                new = stored.get(task_id)
+                if new is None:
+                    continue
+                definition = {k: v for k, v in new.items() if k not in RUNTIME_FIELDS}
+                if definition != {k: v for k, v in task.items() if k not in RUNTIME_FIELDS}:
+                    # In place, so queued and running runs see the new settings
+                    runtime = {k: task[k] for k in RUNTIME_FIELDS if k in task}
+                    task.clear()
+                    task.update(definition, **runtime)
+                    update.append(task)
+            for task in delete:
+                self._drop(task)
+            self._prune()
+            scheduled = create + update
+            next_runs = cron_cache.next_runs((i, task["cron_expr"]) for i, task in enumerate(scheduled))
+            for i, task in enumerate(scheduled):
+                times = next_runs[i]
+                task["next_run"] = times[0].strftime(TIME_FORMAT) if times else "-"
+            self._add(create)
+            self.children = dag.build_children(self.tasks)
+            for task in scheduled:
+                self._reschedule(task)
+                self.watcher.set_task(task)
+            self._tasks_version = version
+        if create or update or delete:
+            logging.info(f"Loaded task changes from other instances: {len(create)} added, "
+                         f"{len(update)} changed, {len(delete)} removed")
+            self._notify("batch", None, {"created": [t["id"] for t in create], "updated": [t["id"] for t in update],
+                                         "deleted": [t["id"] for t in delete]})
+        return True
+
+    def _unwatch(self, task):
+        self.watcher.remove_task(task["id"])
+        self.scheduler.unschedule(("watch", task["id"]))
+        with self.changes_lock:
+            self.pending_changes.pop(task["id"], None)
+
+    def _on_file_change(self, task, path):
+        # Watcher thread: note the path and push the task's watch run back
+        # until changes stop for watch_debounce seconds (or WATCH_MAX_DELAY
+        # debounce periods have passed since the first change)
+        now = datetime.now()
+        if task is self._tasks_file_watch:
+            self.scheduler.schedule(("reload",), now + timedelta(seconds=float(self.settings.get("watch_debounce_seconds", 2))))
+            return
+        with self.changes_lock:
+            pending = self.pending_changes.setdefault(task["id"], {"paths": {}, "first": now, "dropped": 0})
+            if path in pending["paths"] or len(pending["paths"]) < MAX_CHANGED_PATHS:
+                pending["paths"][path] = None
+            else:
+                pending["dropped"] += 1
+            first = pending["first"]
+        debounce = timedelta(seconds=float(task.get("watch_debounce", self.settings.get("watch_debounce_seconds", 2))))
+        self.scheduler.schedule(("watch", task["id"]), min(now + debounce, first + WATCH_MAX_DELAY * debounce), task)
+
+    def _take_changes(self, task):
+        # Changed paths collected for task, written one per line to a temporary
+        # file for the run that starts now: (path of that file, count), or None
+        with self.changes_lock:
+            pending = self.pending_changes.pop(task["id"], None)
+        if not pending:
+            return None
+        fd, path = tempfile.mkstemp(prefix="task_runner_changed_", suffix=".txt")
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.writelines(p + "\n" for p in pending["paths"])
+        if pending["dropped"]:
+            logging.warning(f"{pending['dropped']} more changed files for {task.get('name')} were not listed")
+        return path, len(pending["paths"]) + pending["dropped"]
+
+    def _reschedule(self, task):
+        # Push the task's next_run, plus its jitter, into the timer heap (or
+        # drop it if it has none)
+        try:
+            when = parse_time(task.get("next_run")) + timedelta(seconds=self._jitter(task))
+        except (TypeError, ValueError):
+            when = None
+        self.scheduler.schedule(task["id"], when, task)
+
+    def _schedule_deferred(self):
+        # Second half of startup, off the caller's thread: next_run for the
+        # tasks that have none, then every task not due soon into the timer
+        # heap with one heapify. Then the run history behind the estimates
+        # and the tasks file, if it is reloaded
+        deferred, self._deferred = self._deferred, []
+        started = time.perf_counter()
+        missing = [task for task in deferred if task.get("next_run") in (None, "-", "")]
+        next_runs = cron_cache.next_runs((task["id"], task["cron_expr"]) for task in missing)
+        for task in missing:
+            if task.get("next_run") in (None, "-", ""):  # not rescheduled meanwhile
+                times = next_runs[task["id"]]
+                task["next_run"] = times[0].strftime(TIME_FORMAT) if times else "-"
+        with self.tasks_lock:
+            live = set(self._tasks_by_id)
+        entries = []
+        for task in deferred:
+            if task["id"] in live:
+                try:
+                    entries.append((task["id"], parse_time(task["next_run"]) + timedelta(seconds=self._jitter(task)), task))
+                except ValueError:
+                    pass
+        self.scheduler.schedule_many(entries)
+        self.store.update_tasks(missing)
+        if deferred:
+            logging.debug(f"Scheduled {len(entries)} more tasks in {time.perf_counter() - started:.3f}s")
+        if missing:
+            self._notify("batch", None, {"created": [], "updated": [task["id"] for task in missing], "deleted": []})
+        try:
+            self.history.load(self.store)
+        except Exception as e:
+            logging.error(f"Could not load the run history: {e}")
+        if self._tasks_file_watch is not None:
+            self.reload_tasks_file()
+
+    def reload_tasks_file(self):
+        # Apply edits of the tasks file (see task_file.py). Nothing is read
+        # while its modification time and size are those last applied.
+        # Called from the startup thread and the scheduler thread, so the
+        # whole read-diff-apply holds the task lock
+        with self.tasks_lock:
+            self._reload_tasks_file()
+
+    def _reload_tasks_file(self):
+        try:
+            st = os.stat(self.tasks_file)
+        except OSError:
+            return
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self._tasks_file_seen:
+            return
+        try:
+            create, update, delete = task_file.diff(self.tasks, task_file.read(self.tasks_file))
+            if create or update or delete:
+                self.apply_batch(create, update, delete)
+        except (OSError, ValueError) as e:
+            logging.error(f"Not reloading {self.tasks_file}: {e}")
+            return
+        self._tasks_file_seen = signature
+        if create or update or delete:
+            logging.info(f"Reloaded {self.tasks_file}: {len(create)} added, {len(update)} changed, {len(delete)} removed")
+
+    def _jitter(self, task):
+        return misfire.jitter_offset(task, self.settings.get("jitter_seconds", 0))
+
+    def run_scheduler(self):
+        # Blocks in the timer heap until the earliest next_run is due
+        self.scheduler.run()
+
+    def _on_task_due(self, key, task, scheduled):
+        now = datetime.now()
+        lag = (now - scheduled).total_seconds()
+        if isinstance(key, tuple):
+            if key[0] == "watch":
+                self._on_watch_due(task, now, lag)
+            elif key[0] == "reload":
+                self.reload_tasks_file()
+            elif key[0] == "sync":
+                try:
+                    self.sync_tasks()
+                except Exception as e:
+                    logging.error(f"Could not load task changes from the database: {e}")
+                self._schedule_sync()
+            elif key[0] == "start":
+                # A run held back by the start rate limit
+                task, fire_lag, occurrence, unique = task
+                if self.has_task(task):
+                    self._run_scheduled_task(task, fire_lag + lag, occurrence, unique, held=True)
+                elif occurrence is not None:
+                    self.coordinator.release(task["id"], occurrence)
+            else:
+                # Deferred claim of a run another instance was preferred for
+                self._claim_and_run(task, key[2], lag)
+            return
+        # The heap holds the due time plus the task's jitter
+        offset = self._jitter(task)
+        due = scheduled - timedelta(seconds=offset)
+        logging.debug(f"Due: {task.get('name')} scheduled={due.strftime(TIME_FORMAT)} offset={offset:.3f}s lag={lag:.3f}s")
+        runs = self._due_runs(task, due, now, lag, offset)
+        unique = misfire.policy(task, self.settings.get("misfire_policy")) != "catchup"
+        for when in runs:
+            # Run the task (once per missed time when catching up)
+            run_lag = (now - when).total_seconds() - offset
+            if self.coordinator is None:
+                self._run_scheduled_task(task, run_lag, unique=unique)
+            else:
+                occurrence = when.strftime(TIME_FORMAT)
+                if self.coordinator.is_preferred(task["id"], occurrence):
+                    self._claim_and_run(task, occurrence, run_lag)
+                else:
+                    self.scheduler.schedule(("claim", task["id"], occurrence),
+                                            now + timedelta(seconds=self.coordinator.grace), task)
+        # Update last_execution
+        task["last_execution"] = now.strftime(TIME_FORMAT) if runs else f"Skipped: {lag:.0f}s late"
+        # Calculate next_run, from the time without jitter so none is missed
+        task["next_run"] = self.compute_next_run(task["cron_expr"], now - timedelta(seconds=offset))
+        self._reschedule(task)
+        self.store.update_runtime(task)
+        self._notify("changed", task)
+
+    def _due_runs(self, task, due, now, lag, offset):
+        # Due times to run for a fire `lag` seconds late (see misfire.py).
+        # The schedule is read on the clock without the task's jitter, so a
+        # jitter longer than the interval does not make times due early
+        grace = misfire.grace(task, self.settings.get("misfire_grace_seconds", 60))
+        policy = misfire.policy(task, self.settings.get("misfire_policy"))
+        name = task.get("name")
+        now = now - timedelta(seconds=offset)
+        if policy == "catchup":
+            # Every missed time within the grace period, late or not
+            since = now - timedelta(seconds=grace)
+            runs = misfire.catchup_times(task["cron_expr"], due, now, since,
+                                         misfire.catchup_max(task, self.settings.get("catchup_max", 10)))
+            if lag > grace or len(runs) > 1:
+                missed = misfire.count_missed(task["cron_expr"], due, now)
+                self.misfires["caught_up"] += 1
+                self.misfires["catchup_runs"] += len(runs)
+                logging.warning(f"[MISFIRE] {name} is {lag:.0f}s late, catching up {len(runs)} of {missed} missed runs")
+            return runs
+        if lag <= grace:
+            return [due]
+        missed = misfire.count_missed(task["cron_expr"], due, now)
+        if policy == "skip":
+            self.misfires["skipped"] += 1
+            logging.warning(f"[MISFIRE] {name} is {lag:.0f}s late, skipping {missed} missed runs")
+            return []
+        self.misfires["coalesced"] += 1
+        logging.warning(f"[MISFIRE] {name} is {lag:.0f}s late, running once for {missed} missed runs")
+        return [due]
+
+    def _on_watch_due(self, task, now, lag):
+        # Watched files settled. Runs on every instance that saw the change,
+        # so there is no claim; the run itself takes the paths (a run that
+        # started meanwhile may already have)
+        with self.changes_lock:
+            pending = self.pending_changes.get(task["id"])
+            count = len(pending["paths"]) + pending["dropped"] if pending else 0
+        if not self.has_task(task) or not count:
+            return
+        logging.info(f"{count} watched files changed for {task.get('name')}, starting a run")
+        self._run_scheduled_task(task, lag)
+        task["last_execution"] = now.strftime(TIME_FORMAT)
+        self.store.update_runtime(task)
+        self._notify("changed", task)
+
+    def _claim_and_run(self, task, occurrence, fire_lag):
+        # Runs the occurrence only if no other instance has claimed it
+        if not self.has_task(task):
+            return
+        if self.coordinator.claim(task["id"], occurrence):
+            unique = misfire.policy(task, self.settings.get("misfire_policy")) != "catchup"
+            self._run_scheduled_task(task, fire_lag, occurrence, unique)
+        else:
+            logging.debug(f"Due: {task.get('name')} {occurrence} claimed by another instance")
+
+    def _on_takeover(self, task_id, occurrence):
+        # The instance that claimed this run stopped renewing its lease
+        task = self.get_task(task_id)
+        if task is None:
+            self.coordinator.release(task_id, occurrence)
+            return
+        lag = (datetime.now() - parse_time(occurrence)).total_seconds()
+        logging.info(f"Re-running {task.get('name')} {occurrence} abandoned by another instance")
+        self._run_scheduled_task(task, lag, occurrence)
+
+    def _run_scheduled_task(self, task, fire_lag=0.0, occurrence=None, unique=True, held=False):
+        # fire_lag: how late the scheduler woke up; queue wait is added later.
+        # occurrence: the claimed due time, released once the run is over.
+        # unique: not queued again while a run of the task is still queued
+        # (catch-up runs are). held: already waited for the start rate limit
+        if self.start_limiter is not None and not held:
+            delay = self.start_limiter.reserve()
+            if delay > 0:
+                self.scheduler.schedule(("start", task["id"], next(self._held)),
+                                        datetime.now() + timedelta(seconds=delay),
+                                        (task, fire_lag + delay, occurrence, unique))
+                return
+        done = None
+        if occurrence is not None:
+            # status: only the asyncio engine passes one
+            done = lambda status=None: self.coordinator.release(task["id"], occurrence)
+        if self.children.get(task["id"]):
+            if not self._start_pipeline(task, on_done=done) and done:
+                done()
+            return
+        def job(wait):
+            try:
+                self._execute_task(task, wait=wait, fire_lag=fire_lag)
+            finally:
+                if done:
+                    done()
+        if self._runs_async(task):
+            submitted = self.supervisor.submit(task["id"], task, fire_lag=fire_lag, on_done=done, unique=unique)
+        else:
+            submitted = self.pool.submit(task["id"], job, task.get("max_instances", 1), unique)
+        if not submitted:
+            logging.debug(f"[SCHEDULED] Already queued: {task.get('name')}")
+            if done:
+                done()
+
+    def run_task(self, task):
+        # Queue a manual run; False if a run of this task is already queued.
+        # A task others depend on starts its whole pipeline.
+        if self.children.get(task["id"]):
+            return self._start_pipeline(task, manual=True)
+        if self._runs_async(task):
+            return self.supervisor.submit(task["id"], task, manual=True)
+        return self.pool.submit(task["id"], lambda wait: self._execute_task(task, manual=True, wait=wait), task.get("max_instances", 1))
+
+    def _start_pipeline(self, root, manual=False, on_done=None):
+        # Runs root and everything downstream of it; False if a pipeline
+        # from this root is still running. on_done is called when it ends
+        with self.pipelines_lock:
+            if root["id"] in self.pipelines:
+                logging.info(f"Pipeline from {root.get('name')} is still running, not starting another")
+                return False
+            limit = root.get("pipeline_concurrency") or self.settings.get("pipeline_concurrency", 4)
+            run = dag.PipelineRun(self, root, self.children, manual, limit, on_done)
+            self.pipelines[root["id"]] = run
+        run.start()
+        return True
+
+    def _pipeline_started(self, run):
+        return self.store.start_pipeline(run.root["id"], run.started.strftime(TIME_FORMAT))
+
+    def _pipeline_finished(self, root, summary):
+        with self.pipelines_lock:
+            self.pipelines.pop(root["id"], None)
+        summary = dict(summary, started=summary["started"].strftime(TIME_FORMAT),
+                       ended=summary["ended"].strftime(TIME_FORMAT))
+        self.store.finish_pipeline(summary)
+        self._notify("pipeline", root, summary)
+
+    def _pipeline_node_done(self, task):
+        # Downstream nodes have no due time of their own to record
+        task["last_execution"] = datetime.now().strftime(TIME_FORMAT)
+        self.store.update_runtime(task)
+        self._notify("changed", task)
+
+    def _record_skipped(self, task, reason):
+        # A pipeline node that did not run because an upstream task failed
+        now = datetime.now().strftime(TIME_FORMAT)
+        logging.info(f"Skipping {task.get('name')}: {reason}")
+        run_id = self.store.start_run(task, "pipeline", now)
+        self.store.finish_run(run_id, now, None, 0.0, status=dag.UPSTREAM_FAILED)
+        self.metrics.observe_run(task.get("name", ""), {"status": dag.UPSTREAM_FAILED})
+        task["last_execution"] = f"Skipped: {reason}"
+        self.store.update_runtime(task)
+        self._notify("changed", task)
+
+    @staticmethod
+    def _runs_warm(task):
+        return bool(task.get("warm_python") and not task.get("command")
+                    and task["file_path"].lower().endswith(".py"))
+
+    def _fingerprint(self, task):
+        # Fingerprint of a skip_unchanged task before it runs; None (run
+        # anyway) if its files cannot be read
+        try:
+            return self.fingerprints.compute(task)
+        except OSError as e:
+            logging.warning(f"Could not fingerprint {task.get('name')}, running it anyway: {e}")
+            return None
+
+    def _record_unchanged(self, task, fingerprint, lag):
+        # A scheduled run skipped because nothing it depends on changed
+        now = datetime.now().strftime(TIME_FORMAT)
+        logging.info(f"[SCHEDULED] Skipping {task.get('name')}: script and inputs unchanged since its last successful run")
+        if fingerprint[2]:
+            # Files were touched without changing: remember their new times
+            self.fingerprints.record(task, fingerprint)
+        run_id = self.store.start_run(task, "scheduled", now)
+        self.store.finish_run(run_id, now, None, 0.0, lag=lag, status=UNCHANGED)
+        self.metrics.observe_run(task.get("name", ""), {"status": UNCHANGED, "lag": lag})
+        self._notify("changed", task)
+
+    def _runs_async(self, task):
+        # Warm Python runs need a pool thread to talk to their interpreter
+        return self.supervisor is not None and not self._runs_warm(task)
+
+    def running_count(self, task):
+        running = self.pool.running_count(task["id"])
+        if self.supervisor is not None:
+            running += self.supervisor.running_count(task["id"])
+        return running
+
+    def is_running(self, task):
+        return self.running_count(task) > 0
+
+    def _execute_task(self, task, manual=False, wait=0.0, fire_lag=0.0):
+        # Runs the task to completion; returns its status (see limits.run_status)
+        run = ExecutionRecord(self, task, manual, wait, fire_lag)
+        if run.unchanged():
+            return UNCHANGED
+        try:
+            # Run in the task's own directory; the process-wide cwd is never
+            # changed since other tasks run concurrently
+            task_dir, extra_env = run.prepare()
+            warm = self._runs_warm(task)
+            if warm:
+                cmd = f'[warm python] "{task["file_path"]}"'
+            else:
+                cmd = limits.wrap_command(task, shell_command(task))
+            run.start(cmd)
+            if warm:
+                # Runs inside an already started interpreter; same stdout/wait interface
+                # (only the timeout applies: the interpreter is shared)
+                proc = self.warm_pool.run(os.path.abspath(task['file_path']), task_dir,
+                                          dict(task.get("env") or {}, **(extra_env or {})))
+                watchdog = limits.Watchdog(proc, limits.task_limit(task, "timeout"), kill=proc.kill)
+            else:
+                # Own session/process group, rlimits and priority per task
+                proc = subprocess.Popen(cmd, shell=True, cwd=task_dir, env=task_env(task, extra_env), stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, **limits.popen_kwargs(task))
+                limits.apply_limits(task, proc.pid)
+                watchdog = limits.Watchdog(proc, limits.task_limit(task, "timeout"))
+            try:
+                with proc:
+                    usage = self._stream_to_log(run, proc, watchdog)
+            finally:
+                watchdog.cancel()
+            run.completed(usage)
+        except Exception as e:
+            run.failed(e)
+        finally:
+            run.finish()
+        return run.status
+
+    def _stream_to_log(self, run, proc, watchdog=None):
+        # Output into the run's log segment as it arrives; returns the usage
+        write = run.open_log()
+        try:
+            total, dropped = stream_output(proc.stdout, write, run.tail, run.max_bytes)
+            exit_code, usage = wait_with_usage(proc)
+            status = limits.run_status(exit_code, watchdog is not None and watchdog.fired)
+            run.end_log(exit_code, status, watchdog.timeout if watchdog is not None else None, total, dropped)
+        finally:
+            run.close_log()
+        return usage
+
+    def _sweep_logs(self):
+        # Background enforcement of each task's log retention (days)
+        while True:
+            try:
+                removed = self.log_store.sweep(self.tasks)
+                if removed:
+                    logging.info(f"Retention sweep removed {removed} log segments")
+            except Exception as e:
+                logging.error(f"Retention sweep failed: {e}")
+            time.sleep(LOG_SWEEP_INTERVAL)
+
+    def _write_metrics(self):
+        # Periodic metrics file for collectors that read files
+        path = self.settings["metrics_file"]
+        while True:
+            try:
+                self.metrics.write_file(path)
+            except OSError as e:
+                logging.error(f"Could not write metrics to {path}: {e}")
+            time.sleep(max(1, float(self.settings.get("metrics_interval", 15))))
+
+    def _gauges(self):
+        # Engine-wide values for the metrics export
+        lag = self.fire_stats()
+        pool = self.pool.stats()
+        if self.supervisor is not None:
+            supervised = self.supervisor.stats()
+            pool = dict(pool, queued=pool["queued"] + supervised["queued"],
+                        running=pool["running"] + supervised["running"])
+        values = [
+            ("taskrunner_tasks", "Configured tasks", len(self.tasks)),
+            ("taskrunner_scheduled", "Tasks waiting in the timer heap", len(self.scheduler)),
+            ("taskrunner_queue_length", "Due runs waiting for a worker", pool["queued"]),
+            ("taskrunner_running", "Runs in progress", pool["running"]),
+        ]
+        for key in ("p50", "p95", "p99", "max"):
+            if key in lag:
+                values.append((f"taskrunner_fire_lag_{key}_seconds",
+                               f"Scheduler wake-up lag ({key} of recent fires)", f"{lag[key]:.6f}"))
+        for key, count in lag["misfires"].items():
+            values.append((f"taskrunner_misfires_{key}", f"Late runs handled by their misfire policy ({key})", count))
+        held = lag["start_limit"]
+        if held is not None:
+            values.append(("taskrunner_starts_delayed", "Runs held back by the start rate limit", held["delayed"]))
+            if "delay_max" in held:
+                values.append(("taskrunner_start_delay_max_seconds", "Longest recent wait for the start rate limit",
+                               f"{held['delay_max']:.6f}"))
+        budget = self.admission.stats()
+        values.append(("taskrunner_reserved_memory_mb", "Predicted peak memory of the runs in progress",
+                       f"{budget['reserved_memory_mb']:.1f}"))
+        values.append(("taskrunner_reserved_cores", "Predicted CPU use of the runs in progress",
+                       f"{budget['reserved_cores']:.3f}"))
+        values.append(("taskrunner_admission_delayed", "Runs held back by the memory or CPU budget", budget["delayed"]))
+        return values
+
+    def estimate(self, task):
+        # The task's run history summary (see adaptive.RunHistory.stats),
+        # plus "expected_end": when its current run, or else its next
+        # scheduled run, should finish. None without history
+        stats = self.history.stats(task["id"])
+        if stats is None:
+            return None
+        end = self.admission.predicted_end(task["id"])
+        if end is None:
+            try:
+                end = parse_time(task.get("next_run")) + timedelta(seconds=stats["p50"])
+            except ValueError:
+                pass
+        return dict(stats, expected_end=end)
+
+    def fire_stats(self):
+        # Scheduler wake-up lag, late runs by misfire policy and waits for
+        # the start rate limit
+        return dict(self.scheduler.lag_stats(), misfires=dict(self.misfires),
+                    start_limit=self.start_limiter.stats() if self.start_limiter is not None else None)
+
+    def status(self):
+        next_fire = self.scheduler.next_fire_time()
+        return {
+            "tasks": len(self.tasks),
+            "scheduled": len(self.scheduler),
+            "next_fire": next_fire.strftime(TIME_FORMAT) if next_fire else "-",
+            "fire_lag": self.fire_stats(),
+            "pool": self.pool.stats(),
+            "cron_cache": cron_cache.stats(),
+            "python_workers": self.warm_pool.stats(),
+            "async": self.supervisor.stats() if self.supervisor is not None else None,
+            "coordination": self.coordinator.stats() if self.coordinator is not None else None,
+            "watch": self.watcher.stats(),
+            "admission": self.admission.stats(),
+        }
+
+def main(argv=None):
+    # Headless daemon: no tkinter, runs until SIGTERM/SIGINT
+    setup_logging(console=True)
+    engine = TaskEngine()
+    stopping = threading.Event()
+    def on_signal(signum, frame):
+        logging.info(f"Received signal {signum}, shutting down")
+        stopping.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    engine.start()
+    logging.info(f"Task Runner started headless with {len(engine.tasks)} tasks")
+    while not stopping.wait(1):
+        pass
+    if not engine.stop(engine.settings.get("shutdown_timeout", 30)):
+        logging.info("Shutdown timeout reached with tasks still running")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Tasks declared in tasks.json, applied while the runner is up.
+
+With "reload_tasks_file" set, tasks.json is read once the engine has
+started and again whenever it changes. The file is watched like a task's
+"watch" folder: with inotify on Linux, otherwise by scanning the folder.
+Entries are matched by name to the tasks the file created earlier (their
+"source" is SOURCE, which includes those imported into the database on
+first start), and diff() works out the smallest change:
+- a new name creates a task;
+- an entry whose fields differ updates only that task, so only that task
+  is rescheduled;
+- a task the file created earlier is deleted once its entry is gone.
+Fields an entry does not mention are left as they are. Tasks added in the
+window or through the API are never changed or deleted; an entry with the
+name of one of them is an error. Entries take the same fields as the
+control API (depends_on holds task ids). If any entry is invalid, the
+whole file is rejected and nothing changes.
+"""
+import os
+import json
+
+SOURCE = "tasks.json"  # "source" of the tasks the file manages
+
+def read(path):
+    # The file's entries; raises OSError or ValueError
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("expected a list of tasks")
+    return entries
+
+def diff(tasks, entries):
+    # (create, update, delete) for TaskEngine.apply_batch. Raises
+    # ValueError for an invalid entry or a name used by two entries
+    from control_api import clean_task, ApiError, READ_ONLY_FIELDS  # the same checks as the API
+    by_name, others = {}, set()
+    for task in tasks:
+        if task.get("source") == SOURCE:
+            by_name.setdefault(task.get("name"), task)
+        else:
+            others.add(task.get("name"))
+    seen = set()
+    create, update = [], []
+    for i, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"entry {i}: a task must be a JSON object")
+        name = entry.get("name") or os.path.basename(str(entry.get("file_path", "")))
+        if name in seen:
+            raise ValueError(f"entry {i}: more than one task named '{name}'")
+        seen.add(name)
+        task = by_name.get(name)
+        if task is None and name in others:
+            raise ValueError(f"entry {i}: '{name}' is the name of a task added in the window or through the API")
+        if task is not None and all(
+                task.get(key) == value for key, value in entry.items() if key not in READ_ONLY_FIELDS):
+            continue  # unchanged, and valid when it was applied
+        try:
+            fields = clean_task(dict(entry, name=name), partial=task is not None)
+        except ApiError as e:
+            raise ValueError(f"entry {i} ({name}): {e}")
+        fields["source"] = SOURCE
+        if task is None:
+            create.append(fields)
+            continue
+        changed = {key: value for key, value in fields.items() if task.get(key) != value}
+        if changed:
+            update.append((task, changed))
+    delete = [task for task in tasks if task.get("source") == SOURCE and task.get("name") not in seen]
+    return create, update, delete
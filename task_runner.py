@@ -1,22 +1,32 @@
 import os
 import sys
+
+if __name__ == "__main__" and "--headless" in sys.argv:
+    # Daemon mode: run the engine alone, without importing Tk at all
+    import task_core
+    sys.exit(task_core.main())
+if __name__ == "__main__" and sys.argv[1:2] == ["search"]:
+    # Search the output index from the command line (see log_search.py)
+    import log_search
+    sys.exit(log_search.main(sys.argv[2:]))
+if __name__ == "__main__" and sys.argv[1:2] in (["import-crontab"], ["export-crontab"]):
+    # Crontab files in and out of tasks.db (see crontab_io.py)
+    import crontab_io
+    sys.exit(crontab_io.main(sys.argv[2:], export_mode=sys.argv[1] == "export-crontab"))
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import schedule
-import time
-import threading
-import json
-from datetime import datetime, timedelta
-import logging
-import webbrowser
-import subprocess
-import shutil
-import getpass
-from croniter import croniter
-import re
-import glob
+import queue
+from task_core import TaskEngine, setup_logging, TIME_FORMAT
+from limits import LIMIT_FIELDS, IO_PRIORITIES
+from triggers import split_spec
+from misfire import POLICIES as MISFIRE_POLICIES
+from adaptive import format_duration
+import log_viewer
 
 STARTUP_MARKER = '.task_runner_first_run'
+UI_POLL_MS = 250  # how often the Tk loop drains engine events
+PAGE_SIZE = 200  # task rows shown per page
 
 class ToolTip:
     def __init__(self, widget, text):
@@ -45,29 +55,22 @@ class ToolTip:
             tw.destroy()
 
 class TaskRunner:
-    def __init__(self):
+    def __init__(self, engine=None):
         self.root = tk.Tk()
         self.root.title("Task Runner")
-        self.root.geometry("700x500")
+        self.root.geometry("1080x800")
         self.set_theme()
         self.setup_logging()
-        self.tasks = self.load_tasks()
-        # Add a lock to prevent overlapping runs
-        self.job_running_lock = threading.Lock()
-        # Recalculate next_run for all tasks if missing or invalid
-        for task in self.tasks:
-            if not task.get('next_run') or task.get('next_run') in (None, '-', ''):
-                try:
-                    base = datetime.now()
-                    itr = croniter(task["cron_expr"], base)
-                    task["next_run"] = itr.get_next(datetime).strftime("%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    task["next_run"] = "-"
-        self.save_tasks()
+        # Scheduling and execution live in the engine; the window is a client
+        self.engine = engine or TaskEngine()
+        self.tasks = self.engine.tasks
+        # Engine threads only post to this queue; the Tk loop drains it
+        self.ui_events = queue.Queue()
+        self.engine.add_listener(self.on_engine_event)
         self.create_gui()
         self.update_task_list()
-        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        self.root.after(UI_POLL_MS, self.drain_ui_events)
+        self.engine.start()
         # Minimize if --minimized is passed
         if '--minimized' in sys.argv:
             self.root.iconify()
@@ -85,11 +88,29 @@ class TaskRunner:
         style.configure("Treeview", font=("Segoe UI", 10), rowheight=28)
 
     def setup_logging(self):
-        logging.basicConfig(
-            filename='task_runner.log',
-            level=logging.INFO,
-            format='%(asctime)s - %(message)s'
-        )
+        setup_logging()
+
+    def on_engine_event(self, event, task, detail):
+        # Called from engine threads: Tk must not be touched here
+        self.ui_events.put((event, task, detail))
+
+    def drain_ui_events(self):
+        # Runs on the Tk loop. A burst of events becomes one list refresh
+        dirty = False
+        errors = []
+        try:
+            while True:
+                event, task, detail = self.ui_events.get_nowait()
+                dirty = True
+                if event == "error" and detail.get("manual"):
+                    errors.append(detail["error"])
+        except queue.Empty:
+            pass
+        if dirty:
+            self.update_task_list()
+        for error in errors:
+            messagebox.showerror("Error", f"Could not run task: {error}")
+        self.root.after(UI_POLL_MS, self.drain_ui_events)
 
     def create_gui(self):
         # Task Configuration Frame
@@ -118,7 +139,8 @@ class TaskRunner:
         self.cron_var = tk.StringVar(value="* * * * *")
         cron_entry = ttk.Entry(file_frame, textvariable=self.cron_var, width=15)
         cron_entry.grid(row=2, column=1, sticky="w", padx=5, pady=5)
-        ToolTip(cron_entry, "Enter a cron expression (min hour day month weekday)")
+        ToolTip(cron_entry, "Enter a cron expression (min hour day month weekday), optionally with a sixth "
+                            "field for seconds, or an interval such as @every 30s")
         # Place crontab.guru link to the right of the input
         url_label = tk.Label(file_frame, text="crontab.guru", fg="blue", cursor="hand2", font=("Segoe UI", 11, "underline"))
         url_label.grid(row=2, column=2, sticky="w", padx=(8, 0))
@@ -140,15 +162,89 @@ class TaskRunner:
         executions_entry.grid(row=4, column=3, sticky="w", padx=5, pady=5)
         ToolTip(executions_entry, "How many executions to keep in the log for this task.")
 
+        ttk.Label(file_frame, text="Max Parallel Runs:", font=("Segoe UI", 11, "bold")).grid(row=5, column=0, sticky="w", pady=5, padx=5)
+        self.max_instances = tk.StringVar(value="1")
+        instances_entry = ttk.Entry(file_frame, textvariable=self.max_instances, width=10)
+        instances_entry.grid(row=5, column=1, sticky="w", padx=(5, 20), pady=5)
+        ToolTip(instances_entry, "How many runs of this task may overlap (1 = never overlap).")
+
+        self.warm_python = tk.BooleanVar(value=False)
+        warm_check = ttk.Checkbutton(file_frame, text="Run in warm Python worker", variable=self.warm_python)
+        warm_check.grid(row=5, column=2, columnspan=2, sticky="w", padx=5, pady=5)
+        ToolTip(warm_check, "For .py files: run inside an already started interpreter instead of a new python process.")
+
+        # Resource limits (0 = no limit)
+        self.limit_vars = {}
+        limit_fields = [
+            ("timeout", "Timeout (s):", "Stop the run (and everything it started) after this many seconds."),
+            ("cpu_limit", "CPU Limit (s):", "Maximum CPU seconds per run (Linux)."),
+            ("mem_limit_mb", "Memory Limit (MB):", "Maximum address space per run (Linux)."),
+            ("max_open_files", "Max Open Files:", "Maximum open file descriptors per run (Linux)."),
+            ("nice", "Nice (0-19):", "Lower CPU priority of the run; higher is nicer."),
+        ]
+        for i, (field, label, tip) in enumerate(limit_fields):
+            row, column = 6 + i // 2, (i % 2) * 2
+            ttk.Label(file_frame, text=label, font=("Segoe UI", 11, "bold")).grid(row=row, column=column, sticky="w", pady=5, padx=5)
+            self.limit_vars[field] = tk.StringVar(value="0")
+            limit_entry = ttk.Entry(file_frame, textvariable=self.limit_vars[field], width=10)
+            limit_entry.grid(row=row, column=column + 1, sticky="w", padx=(5, 20), pady=5)
+            ToolTip(limit_entry, tip + " 0 = no limit.")
+        ttk.Label(file_frame, text="IO Priority:", font=("Segoe UI", 11, "bold")).grid(row=8, column=2, sticky="w", pady=5, padx=5)
+        self.io_priority = tk.StringVar(value="normal")
+        io_combo = ttk.Combobox(file_frame, textvariable=self.io_priority, values=IO_PRIORITIES, state="readonly", width=8)
+        io_combo.grid(row=8, column=3, sticky="w", padx=5, pady=5)
+        ToolTip(io_combo, "Disk priority of the run (Linux, uses ionice).")
+
+        ttk.Label(file_frame, text="Depends On:", font=("Segoe UI", 11, "bold")).grid(row=9, column=0, sticky="w", pady=5, padx=5)
+        self.depends_var = tk.StringVar()
+        depends_entry = ttk.Entry(file_frame, textvariable=self.depends_var, width=50)
+        depends_entry.grid(row=9, column=1, columnspan=3, sticky="ew", padx=5, pady=5)
+        ToolTip(depends_entry, "Comma separated names of tasks that must succeed first. "
+                               "The task then runs after them; its cron expression may be left empty.")
+
+        ttk.Label(file_frame, text="Watch:", font=("Segoe UI", 11, "bold")).grid(row=10, column=0, sticky="w", pady=5, padx=5)
+        self.watch_var = tk.StringVar()
+        watch_entry = ttk.Entry(file_frame, textvariable=self.watch_var, width=50)
+        watch_entry.grid(row=10, column=1, columnspan=3, sticky="ew", padx=5, pady=5)
+        ToolTip(watch_entry, "Semicolon separated folders or patterns (e.g. C:\\inbox\\*.csv) to watch. "
+                             "A run starts once new or changed files settle, and gets their paths "
+                             "in the file named by TASK_RUNNER_CHANGED_FILE. The cron expression may be left empty.")
+
+        ttk.Label(file_frame, text="Inputs:", font=("Segoe UI", 11, "bold")).grid(row=11, column=0, sticky="w", pady=5, padx=5)
+        self.inputs_var = tk.StringVar()
+        inputs_entry = ttk.Entry(file_frame, textvariable=self.inputs_var, width=35)
+        inputs_entry.grid(row=11, column=1, columnspan=2, sticky="ew", padx=5, pady=5)
+        ToolTip(inputs_entry, "Semicolon separated files, folders or glob patterns (** for subfolders) the task reads, "
+                              "relative to its folder.")
+        self.skip_unchanged = tk.BooleanVar(value=False)
+        skip_check = ttk.Checkbutton(file_frame, text="Skip if unchanged", variable=self.skip_unchanged)
+        skip_check.grid(row=11, column=3, sticky="w", padx=5, pady=5)
+        ToolTip(skip_check, "Skip scheduled runs while the script and its inputs are the same as at the last "
+                            "successful run. Run Task always runs.")
+
+        ttk.Label(file_frame, text="If Late:", font=("Segoe UI", 11, "bold")).grid(row=12, column=0, sticky="w", pady=5, padx=5)
+        self.misfire_var = tk.StringVar(value="default")
+        misfire_combo = ttk.Combobox(file_frame, textvariable=self.misfire_var, values=("default",) + MISFIRE_POLICIES,
+                                     state="readonly", width=10)
+        misfire_combo.grid(row=12, column=1, sticky="w", padx=(5, 20), pady=5)
+        ToolTip(misfire_combo, "What to do about runs missed while the runner was stopped or busy: coalesce runs once, "
+                               "skip waits for the next time, catchup runs each recent missed time.")
+        ttk.Label(file_frame, text="Jitter (s):", font=("Segoe UI", 11, "bold")).grid(row=12, column=2, sticky="w", pady=5, padx=5)
+        self.jitter_var = tk.StringVar()
+        jitter_entry = ttk.Entry(file_frame, textvariable=self.jitter_var, width=10)
+        jitter_entry.grid(row=12, column=3, sticky="w", padx=5, pady=5)
+        ToolTip(jitter_entry, "Start every run up to this many seconds late, by the same amount each time, "
+                              "so tasks on the same schedule do not all start at once. Empty = setting default.")
+
         # Add progress bar
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(file_frame, variable=self.progress_var, maximum=100)
-        self.progress_bar.grid(row=7, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
+        self.progress_bar.grid(row=13, column=0, columnspan=3, sticky="ew", padx=5, pady=5)
         self.progress_bar.grid_remove()  # Hide initially
 
         # Save Task Button
         button_frame_top = ttk.Frame(file_frame)
-        button_frame_top.grid(row=8, column=0, columnspan=3, pady=12, sticky="w")
+        button_frame_top.grid(row=14, column=0, columnspan=3, pady=12, sticky="w")
         self.add_update_button = ttk.Button(button_frame_top, text="Save Task", command=self.add_or_update_task)
         self.add_update_button.pack(side="left", padx=(0, 8))
         ToolTip(self.add_update_button, "Save the configured task.")
@@ -174,27 +270,60 @@ class TaskRunner:
         list_frame.pack(fill="both", expand=True, padx=15, pady=5)
 
         # Task List with alternate row colors
-        self.task_tree = ttk.Treeview(list_frame, columns=("Name", "Schedule", "Last Execution", "Next Execution", "Status"), show="headings")
+        self.task_tree = ttk.Treeview(list_frame, columns=("Name", "Schedule", "Last Execution", "Next Execution", "Status",
+                                                               "Typical", "Peak Mem", "CPU", "Expected End"), show="headings")
         self.task_tree.heading("Name", text="Name")
         self.task_tree.heading("Schedule", text="Schedule")
         self.task_tree.heading("Last Execution", text="Last Execution")
         self.task_tree.heading("Next Execution", text="Next Execution")
         self.task_tree.heading("Status", text="Status")
+        self.task_tree.heading("Typical", text="Typical")
+        self.task_tree.heading("Peak Mem", text="Peak Mem")
+        self.task_tree.heading("CPU", text="CPU")
+        self.task_tree.heading("Expected End", text="Expected End")
         self.task_tree.column("Name", width=140)
         self.task_tree.column("Schedule", width=100)
         self.task_tree.column("Last Execution", width=120)
         self.task_tree.column("Next Execution", width=120)
         self.task_tree.column("Status", width=80)
-        self.task_tree.pack(fill="both", expand=True, pady=(0, 10))
+        # Estimates from recent runs (see adaptive.py)
+        self.task_tree.column("Typical", width=100)
+        self.task_tree.column("Peak Mem", width=80)
+        self.task_tree.column("CPU", width=60)
+        self.task_tree.column("Expected End", width=120)
+        self.task_tree.pack(fill="both", expand=True, pady=(0, 5))
         self.task_tree.tag_configure('oddrow', background='#f0f4ff')
         self.task_tree.tag_configure('evenrow', background='#ffffff')
         self.task_tree.bind("<<TreeviewSelect>>", self.on_tree_select)
 
-        self.selected_task_index = None
+        # Only one page of tasks is materialized in the tree at a time
+        page_frame = ttk.Frame(list_frame)
+        page_frame.pack(fill="x")
+        self.prev_page_btn = ttk.Button(page_frame, text="< Prev", command=lambda: self.change_page(-1))
+        self.prev_page_btn.pack(side="left")
+        self.page_label = ttk.Label(page_frame, text="")
+        self.page_label.pack(side="left", padx=10)
+        self.next_page_btn = ttk.Button(page_frame, text="Next >", command=lambda: self.change_page(1))
+        self.next_page_btn.pack(side="left")
+        search_btn = ttk.Button(page_frame, text="Search Logs", command=self.show_search)
+        search_btn.pack(side="right")
+        ToolTip(search_btn, "Search the output of past executions of all tasks.")
+        export_btn = ttk.Button(page_frame, text="Export Crontab", command=self.export_crontab)
+        export_btn.pack(side="right", padx=(0, 5))
+        ToolTip(export_btn, "Save all scheduled tasks as a crontab file.")
+        import_btn = ttk.Button(page_frame, text="Import Crontab", command=self.import_crontab)
+        import_btn.pack(side="right", padx=(0, 5))
+        ToolTip(import_btn, "Create tasks from the entries of a crontab file.\nEach entry's command runs through the shell in your home folder.")
+        self.page = 0
+        self.visible_rows = []
+        self.row_cache = {}
+
+        self.selected_task = None
 
         self.update_task_list()
 
     def open_crontab_guru(self):
+        import webbrowser
         webbrowser.open_new("https://crontab.guru/")
 
     def browse_file(self):
@@ -213,9 +342,25 @@ class TaskRunner:
         retention = self.log_retention.get()
         name = self.name_var.get().strip()
         log_executions = self.log_executions.get().strip()
-        if not file_path or not cron_expr:
+        max_instances = self.max_instances.get().strip()
+        depends_names = [n.strip() for n in self.depends_var.get().split(",") if n.strip()]
+        watch = [p.strip() for p in self.watch_var.get().split(";") if p.strip()]
+        if not file_path or not (cron_expr.strip() or depends_names or watch):
             messagebox.showerror("Error", "Please fill in all fields")
             return
+        depends_on = []
+        for dep_name in depends_names:
+            matches = [t for t in self.engine.list_tasks() if t.get("name") == dep_name]
+            if len(matches) != 1:
+                messagebox.showerror("Error", f"Depends On: {'no' if not matches else 'more than one'} task named '{dep_name}'")
+                return
+            depends_on.append(matches[0]["id"])
+        for spec in watch:
+            try:
+                split_spec(spec)
+            except ValueError as e:
+                messagebox.showerror("Error", f"Watch: {e}")
+                return
         try:
             retention = int(retention)
             if retention < 1:
@@ -223,8 +368,26 @@ class TaskRunner:
             log_executions = int(log_executions)
             if log_executions < 1:
                 raise ValueError
+            max_instances = int(max_instances)
+            if max_instances < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Log retention, executions and parallel runs must be positive numbers")
+            return
+        try:
+            task_limits = {field: int(self.limit_vars[field].get().strip() or 0) for field in LIMIT_FIELDS}
+            if any(value < 0 for value in task_limits.values()) or task_limits["nice"] > 19:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Limits must be whole numbers (0 = no limit) and nice must be 0-19")
+            return
+        jitter = self.jitter_var.get().strip()
+        try:
+            jitter = float(jitter) if jitter else None
+            if jitter is not None and jitter < 0:
+                raise ValueError
         except ValueError:
-            messagebox.showerror("Error", "Log retention and executions must be positive numbers")
+            messagebox.showerror("Error", "Jitter must be a number of seconds (empty = default)")
             return
         if not name:
             name = os.path.basename(file_path)
@@ -234,35 +397,41 @@ class TaskRunner:
             "cron_expr": cron_expr,
             "retention": retention,
             "status": "Active",
-            "log_executions": log_executions
+            "log_executions": log_executions,
+            "max_instances": max_instances,
+            "warm_python": self.warm_python.get(),
+            "io_priority": self.io_priority.get(),
+            "depends_on": depends_on,
+            "watch": watch,
+            "inputs": [p.strip() for p in self.inputs_var.get().split(";") if p.strip()],
+            "skip_unchanged": self.skip_unchanged.get(),
+            "misfire": None if self.misfire_var.get() == "default" else self.misfire_var.get(),
+            "jitter": jitter,
+            **task_limits
         }
-        # Calculate next_run for new/updated task
-        try:
-            base = datetime.now()
-            itr = croniter(cron_expr, base)
-            task["next_run"] = itr.get_next(datetime).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            task["next_run"] = "-"
-        if self.selected_task_index is not None:
+        if self.selected_task is not None and self.selected_task.get("command"):
+            # Imported crontab entry: the File field holds its command line
+            task["command"] = file_path
+        # The engine calculates next_run, reschedules and saves
+        if self.selected_task is not None:
             # Update existing task
-            old_task = self.tasks[self.selected_task_index]
-            # Preserve last_execution if present
-            if "last_execution" in old_task:
-                task["last_execution"] = old_task["last_execution"]
-            self.tasks[self.selected_task_index] = task
-            self.selected_task_index = None
+            try:
+                self.engine.update_task(self.selected_task, task)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            self.selected_task = None
             self.add_update_button.config(text="Save Task")
-            self.save_tasks()
-            self.update_task_list()
             self.root.after(100, lambda: messagebox.showinfo("Task Saved", "Task updated successfully."))
             self.root.after(150, self.clear_form)
             return
         else:
             # Add new task
-            self.tasks.append(task)
-            self.schedule_task(task)
-        self.save_tasks()
-        self.update_task_list()
+            try:
+                self.engine.add_task(task)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
         self.clear_form()
 
     def clear_form(self):
@@ -272,7 +441,18 @@ class TaskRunner:
         self.cron_var.set("* * * * *")
         self.log_retention.set("1")
         self.log_executions.set("1")
-        self.selected_task_index = None
+        self.max_instances.set("1")
+        self.warm_python.set(False)
+        for var in self.limit_vars.values():
+            var.set("0")
+        self.io_priority.set("normal")
+        self.depends_var.set("")
+        self.watch_var.set("")
+        self.inputs_var.set("")
+        self.skip_unchanged.set(False)
+        self.misfire_var.set("default")
+        self.jitter_var.set("")
+        self.selected_task = None
         self.add_update_button.config(text="Save Task")
         self.task_tree.selection_remove(self.task_tree.selection())
         # Hide action buttons
@@ -286,172 +466,94 @@ class TaskRunner:
         if not selected:
             messagebox.showwarning("Warning", "Please select a task to delete")
             return
-        index = self.task_tree.index(selected[0])
-        del self.tasks[index]
-        self.save_tasks()
-        self.update_task_list()
+        task = self.engine.get_task(int(selected[0]))
+        if task is not None:
+            self.engine.remove_task(task)
         self.clear_form()
 
     def update_task_list(self):
-        for item in self.task_tree.get_children():
-            self.task_tree.delete(item)
-        for idx, task in enumerate(self.tasks):
+        # Main thread only. Rows use the task id as item id and are diffed
+        # against what is already shown, so only changed rows are touched
+        with self.engine.tasks_lock:
+            count = len(self.tasks)
+            pages = max(1, (count + PAGE_SIZE - 1) // PAGE_SIZE)
+            self.page = min(self.page, pages - 1)
+            visible = self.tasks[self.page * PAGE_SIZE:(self.page + 1) * PAGE_SIZE]
+        iids = [str(task["id"]) for task in visible]
+        if iids != self.visible_rows:
+            keep = set(iids)
+            for iid in self.visible_rows:
+                if iid not in keep:
+                    self.task_tree.delete(iid)
+                    self.row_cache.pop(iid, None)
+        for idx, (iid, task) in enumerate(zip(iids, visible)):
             tag = 'evenrow' if idx % 2 == 0 else 'oddrow'
-            last_exec = task.get("last_execution", "-")
-            next_exec = task.get("next_run", self.get_next_execution(task))
-            self.task_tree.insert("", "end", values=(
+            row = ((
                 task.get("name", os.path.basename(task["file_path"])),
-                task["cron_expr"],
-                last_exec,
-                next_exec,
+                task["cron_expr"] or ("after upstream" if task.get("depends_on") else
+                                      "on file change" if task.get("watch") else ""),
+                task.get("last_execution", "-"),
+                task.get("next_run") or self.get_next_execution(task),
                 task["status"]
-            ), tags=(tag,))
+            ) + self.estimate_columns(task), tag)
+            if iid not in self.row_cache:
+                self.task_tree.insert("", idx, iid=iid, values=row[0], tags=(tag,))
+            elif self.row_cache[iid] != row:
+                self.task_tree.item(iid, values=row[0], tags=(tag,))
+            self.row_cache[iid] = row
+        if iids != self.visible_rows:
+            for idx, iid in enumerate(iids):
+                if self.task_tree.index(iid) != idx:
+                    self.task_tree.move(iid, "", idx)
+            self.visible_rows = iids
+        self.page_label.config(text=f"Page {self.page + 1}/{pages} ({count} tasks)")
+        self.prev_page_btn.state(["!disabled"] if self.page > 0 else ["disabled"])
+        self.next_page_btn.state(["!disabled"] if self.page < pages - 1 else ["disabled"])
+
+    def estimate_columns(self, task):
+        # Typical duration (median / p95), peak memory, CPU cores and when
+        # the current or next run should end, from the task's recent runs
+        stats = self.engine.estimate(task)
+        if stats is None:
+            return ("-", "-", "-", "-")
+        return (
+            f"{format_duration(stats['p50'])} / {format_duration(stats['p95'])}",
+            f"{stats['rss_mb']:.0f} MB" if stats["rss_mb"] is not None else "-",
+            f"{stats['cores']:.2f}" if stats["cores"] is not None else "-",
+            stats["expected_end"].strftime(TIME_FORMAT) if stats["expected_end"] else "-",
+        )
 
-    def schedule_task(self, task):
-        # Calculate and store the next_run time using croniter
-        try:
-            base = datetime.now()
-            itr = croniter(task["cron_expr"], base)
-            task["next_run"] = itr.get_next(datetime).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            task["next_run"] = "-"
-        self.save_tasks()
+    def change_page(self, step):
+        self.page = max(0, self.page + step)
         self.update_task_list()
 
-    def run_scheduler(self):
-        while True:
-            # Skip if a job is running
-            if self.job_running_lock.locked():
-                time.sleep(1)
-                continue
-            now = datetime.now()
-            updated = False
-            for task in self.tasks:
-                # Only run if next_run is set and due
-                next_run_str = task.get("next_run")
-                print(f"[TaskRunner] Checking task: {task.get('name')} next_run={next_run_str} now={now.strftime('%Y-%m-%d %H:%M:%S')}")
-                if not next_run_str or next_run_str == "-":
-                    continue
-                try:
-                    next_run = datetime.strptime(next_run_str, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    continue
-                if now >= next_run:
-                    # Run the task
-                    self._run_scheduled_task(task)
-                    # Update last_execution
-                    task["last_execution"] = now.strftime("%Y-%m-%d %H:%M:%S")
-                    # Calculate next_run
-                    try:
-                        itr = croniter(task["cron_expr"], now)
-                        task["next_run"] = itr.get_next(datetime).strftime("%Y-%m-%d %H:%M:%S")
-                    except Exception:
-                        task["next_run"] = "-"
-                    updated = True
-            if updated:
-                self.save_tasks()
-                self.update_task_list()
-            time.sleep(30)
-
-    def _run_scheduled_task(self, task):
-        def task_thread():
-            if not self.job_running_lock.acquire(blocking=False):
-                print(f"[TaskRunner] [SCHEDULED] Skipping: Another job is running.")
-                return
-            try:
-                # Store original working directory
-                original_dir = os.getcwd()
-                # Get the directory of the task file
-                task_dir = os.path.dirname(os.path.abspath(task['file_path']))
-                # Change to that directory
-                os.chdir(task_dir)
-                
-                ext = os.path.splitext(task['file_path'])[1].lower()
-                if ext in ['.bat', '.cmd']:
-                    cmd = f'cmd /c "{task["file_path"]}"'
-                elif ext == '.py':
-                    cmd = f'python "{task["file_path"]}"'
-                else:
-                    cmd = f'"{task["file_path"]}"'
-                print(f"[TaskRunner] [SCHEDULED] Would run: {cmd}")
-                logging.info(f"[SCHEDULED] Would run: {cmd}")
-                # Run and capture output
-                start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace')
-                output, _ = proc.communicate()
-                # Restore original working directory before writing log
-                os.chdir(original_dir)
-                # Log block with task name and file path
-                log_block = (
-                    f"==== EXECUTION {start_time} ====" + "\n"
-                    f"Task: {task.get('name', '')}\n"
-                    f"File: {task.get('file_path', '')}\n\n"
-                    + output + "\n"
-                )
-                self._append_and_trim_log(task, log_block)
-                logging.info(f"[SCHEDULED] Task completed: {task['file_path']}")
-                print(f"[TaskRunner] [SCHEDULED] Completed: {task['file_path']}")
-            except Exception as e:
-                try:
-                    os.chdir(original_dir)
-                except:
-                    pass
-                logging.error(f"[SCHEDULED] Error running task {task['file_path']}: {str(e)}")
-                print(f"[TaskRunner] [SCHEDULED] Error: {e}")
-            finally:
-                self.job_running_lock.release()
-        threading.Thread(target=task_thread, daemon=True).start()
-
-    def _append_and_trim_log(self, task, log_block):
-        # Sanitize name for filename and convert to lowercase
-        safe_name = re.sub(r'[^\w\-_]', '_', task.get('name', 'task')).lower()
-        log_file = f"{safe_name}.log"
-        abs_log_file = os.path.abspath(log_file)
-        print(f"[TaskRunner] Writing log to: {log_file} (absolute: {abs_log_file})")
-        # Append new block
-        with open(log_file, 'a', encoding='utf-8', errors='replace') as f:
-            f.write(log_block)
-        # Trim to last N executions
-        try:
-            with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-            blocks = content.split('==== EXECUTION ')
-            if blocks[0].strip() == '':
-                blocks = blocks[1:]
-            else:
-                blocks[0] = '==== EXECUTION ' + blocks[0]
-            n = int(task.get('log_executions', 1))
-            trimmed = ['==== EXECUTION ' + b for b in blocks[-n:]]
-            with open(log_file, 'w', encoding='utf-8', errors='replace') as f:
-                f.write(''.join(trimmed))
-        except Exception as e:
-            print(f"[TaskRunner] Error trimming log file: {e}")
-
-    def load_tasks(self):
-        try:
-            with open("tasks.json", "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return []
-
-    def save_tasks(self):
-        with open("tasks.json", "w") as f:
-            json.dump(self.tasks, f)
-
     def on_tree_select(self, event):
         if getattr(self, 'clearing_form', False):
             return
         selected = self.task_tree.selection()
         if not selected:
             return
-        index = self.task_tree.index(selected[0])
-        task = self.tasks[index]
+        task = self.engine.get_task(int(selected[0]))
+        if task is None:
+            return
         self.name_var.set(task.get("name", os.path.basename(task["file_path"])))
         self.file_path.set(task["file_path"])
         self.cron_var.set(task["cron_expr"])
         self.log_retention.set(str(task["retention"]))
         self.log_executions.set(str(task.get("log_executions", 1)))
-        self.selected_task_index = index
+        self.max_instances.set(str(task.get("max_instances", 1)))
+        self.warm_python.set(bool(task.get("warm_python", False)))
+        for field, var in self.limit_vars.items():
+            var.set(str(task.get(field, 0)))
+        self.io_priority.set(task.get("io_priority", "normal"))
+        names = {t["id"]: t.get("name", "") for t in self.engine.list_tasks()}
+        self.depends_var.set(", ".join(names[p] for p in task.get("depends_on") or [] if p in names))
+        self.watch_var.set("; ".join(task.get("watch") or []))
+        self.inputs_var.set("; ".join(task.get("inputs") or []))
+        self.skip_unchanged.set(bool(task.get("skip_unchanged", False)))
+        self.misfire_var.set(task.get("misfire") or "default")
+        self.jitter_var.set("" if task.get("jitter") is None else f"{task['jitter']:g}")
+        self.selected_task = task
         self.add_update_button.config(text="Save Task")
         # Show action buttons
         self.run_btn.pack(side="left", padx=(0, 8))
@@ -460,138 +562,72 @@ class TaskRunner:
 
     def get_next_execution(self, task):
         # Calculate next execution time based on cron expression
-        try:
-            from croniter import croniter
-        except ImportError:
-            return "(croniter req.)"
-        base = datetime.now()
-        try:
-            itr = croniter(task["cron_expr"], base)
-            return itr.get_next(datetime).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return "-"
+        return self.engine.compute_next_run(task["cron_expr"])
 
     def show_log(self):
-        if self.selected_task_index is None:
+        task = self.selected_task
+        if task is None:
             messagebox.showwarning("No Task Selected", "Please select a task to view its log.")
             return
-        task = self.tasks[self.selected_task_index]
-        # Find all log files that could match this task (by name or previous names)
-        safe_name = re.sub(r'[^\w\-_]', '_', task.get('name', 'task')).lower()
-        log_pattern = f"{safe_name}*.log"
-        log_files = glob.glob(log_pattern)
-        if not log_files:
-            # Try to find any log file that contains the script filename
-            script_base = os.path.splitext(os.path.basename(task['file_path']))[0]
-            log_files = glob.glob(f"*{script_base}*.log")
-        if not log_files:
-            messagebox.showinfo("No Log", "No log file exists for this task yet.")
-            return
-        # If multiple logs, let user pick
-        log_file = log_files[0]
-        if len(log_files) > 1:
-            import tkinter.simpledialog
-            log_file = tkinter.simpledialog.askstring(
-                "Multiple Logs Found",
-                "Multiple log files found. Enter the number to view:\n" +
-                "\n".join(f"{i+1}: {os.path.basename(f)}" for i, f in enumerate(log_files)),
-                initialvalue="1"
-            )
-            try:
-                log_file = log_files[int(log_file)-1]
-            except Exception:
-                messagebox.showerror("Error", "Invalid selection.")
-                return
-        # Show log content in a popup window
         try:
-            with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-            log_win = tk.Toplevel(self.root)
-            log_win.title(f"Log: {os.path.basename(log_file)}")
-            log_win.geometry("700x500")
-
-            # Create a frame for proper layout
-            frame = ttk.Frame(log_win)
-            frame.pack(fill="both", expand=True)
-
-            text = tk.Text(frame, wrap="none", font=("Consolas", 10))
-            yscroll = ttk.Scrollbar(frame, orient="vertical", command=text.yview)
-            xscroll = ttk.Scrollbar(frame, orient="horizontal", command=text.xview)
-
-            text.configure(yscrollcommand=yscroll.set, xscrollcommand=xscroll.set)
-            text.grid(row=0, column=0, sticky="nsew")
-            yscroll.grid(row=0, column=1, sticky="ns")
-            xscroll.grid(row=1, column=0, sticky="ew")
-
-            frame.rowconfigure(0, weight=1)
-            frame.columnconfigure(0, weight=1)
-
-            text.insert("1.0", content)
-            text.config(state="disabled")
+            log_viewer.show_log(self.root, self.engine, task)
         except Exception as e:
             messagebox.showerror("Error", f"Could not open log file: {e}")
 
+    def show_search(self):
+        try:
+            log_viewer.show_search(self.root, self.engine)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open the search index: {e}")
+
+    def import_crontab(self):
+        path = filedialog.askopenfilename(title="Import crontab", filetypes=[("All files", "*.*")])
+        if not path:
+            return
+        import crontab_io
+        try:
+            text = crontab_io.read(path)
+            tasks, errors, notes = crontab_io.parse(text, taken_names=[t.get("name", "") for t in self.engine.list_tasks()])
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read {path}: {e}")
+            return
+        if errors:
+            if not tasks:
+                messagebox.showerror("Import Crontab", f"No valid entries:\n\n{crontab_io.format_problems(errors, 20)}")
+                return
+            if not messagebox.askyesno("Import Crontab", f"{len(errors)} entries have errors:\n\n"
+                                       f"{crontab_io.format_problems(errors, 20)}\n\nImport the {len(tasks)} valid entries?"):
+                return
+        try:
+            self.engine.apply_batch(create=tasks)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        message = f"Imported {len(tasks)} tasks."
+        if notes:
+            message += "\n\n" + crontab_io.format_problems(notes, 10)
+        messagebox.showinfo("Import Crontab", message)
+
+    def export_crontab(self):
+        path = filedialog.asksaveasfilename(title="Export crontab", initialfile="crontab.txt")
+        if not path:
+            return
+        import crontab_io
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(crontab_io.export(self.engine.list_tasks()))
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write {path}: {e}")
+
     def run_selected_task(self):
-        if self.selected_task_index is None:
+        task = self.selected_task
+        if task is None:
             messagebox.showwarning("No Task Selected", "Please select a task to run.")
             return
-        # Prevent manual run if a job is running
-        if self.job_running_lock.locked():
-            messagebox.showwarning("Job Running", "A task is already running. Please wait until it finishes.")
-            return
-        task = self.tasks[self.selected_task_index]
-        def run_task_with_progress():
-            self.job_running_lock.acquire()
-            try:
-                # Set last_execution to 'running...' and update UI
-                task['last_execution'] = 'running...'
-                self.update_task_list()
-                # Print a log message similar to scheduled run
-                now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                next_run_str = task.get('next_run', '-')
-                print(f"[TaskRunner] [MANUAL] Checking task: {task.get('name')} next_run={next_run_str} now={now_str}")
-                # Store original working directory
-                original_dir = os.getcwd()
-                # Get the directory of the task file
-                task_dir = os.path.dirname(os.path.abspath(task['file_path']))
-                # Change to that directory
-                os.chdir(task_dir)
-                ext = os.path.splitext(task['file_path'])[1].lower()
-                if ext in ['.bat', '.cmd']:
-                    cmd = f"cmd /c \"{task['file_path']}\""
-                elif ext == '.py':
-                    cmd = f"python \"{task['file_path']}\""
-                else:
-                    cmd = f"\"{task['file_path']}\""
-                # Run and capture output
-                start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace')
-                output, _ = proc.communicate()
-                # Restore original working directory before writing log
-                os.chdir(original_dir)
-                # Log block with task name and file path
-                log_block = (
-                    f"==== MANUAL EXECUTION {start_time} ====" + "\n"
-                    f"Task: {task.get('name', '')}\n"
-                    f"File: {task.get('file_path', '')}\n\n"
-                    + output + "\n"
-                )
-                self._append_and_trim_log(task, log_block)
-                # Update last_execution to completion time and update UI
-                task['last_execution'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.update_task_list()
-            except Exception as e:
-                try:
-                    os.chdir(original_dir)
-                except:
-                    pass
-                task['last_execution'] = f'Error: {e}'
-                self.update_task_list()
-                messagebox.showerror("Error", f"Could not run task: {e}")
-            finally:
-                self.job_running_lock.release()
-                self.save_tasks()
-        threading.Thread(target=run_task_with_progress, daemon=True).start()
+        if not self.engine.run_task(task):
+            messagebox.showwarning("Job Queued", "A run of this task is already queued.")
+        elif self.engine.running_count(task) >= task.get("max_instances", 1):
+            messagebox.showinfo("Job Queued", "This task is already running. The run will start once it finishes.")
 
     def run(self):
         self.root.mainloop()
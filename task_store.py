@@ -0,0 +1,274 @@
+"""SQLite storage for task definitions and run history.
+
+Replaces whole-file rewrites of tasks.json: every change is a single-row
+transaction against tasks.db (WAL mode), and each execution is appended to
+the runs table. tasks.json is imported once on first start.
+"""
+import os
+import json
+import sqlite3
+import threading
+
+DB_FILE = 'tasks.db'
+RUNTIME_FIELDS = ("next_run", "last_execution")  # task fields the engine keeps up to date itself
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    started TEXT NOT NULL,
+    ended TEXT,
+    exit_code INTEGER,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS runs_by_task ON runs(task_id, started);
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    root_id INTEGER NOT NULL,
+    started TEXT NOT NULL,
+    ended TEXT,
+    status TEXT,
+    wall REAL,
+    critical_seconds REAL,
+    critical_path TEXT,
+    nodes TEXT
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    task_id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL,
+    files TEXT NOT NULL,
+    recorded TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added to runs after its first version; older databases get them
+# with ALTER TABLE when opened
+RUN_COLUMNS = {
+    "cpu_user": "REAL",
+    "cpu_sys": "REAL",
+    "max_rss_mb": "REAL",
+    "lag": "REAL",
+    "status": "TEXT",  # ok, failed, timeout, cpu_limit, killed, error
+}
+RUN_FIELDS = ("id", "task_id", "kind", "started", "ended", "exit_code", "duration") + tuple(RUN_COLUMNS)
+
+class TaskStore:
+    # One connection shared by the engine threads, serialized by a lock.
+    # Task rows keep the task dict (minus its id) as JSON so fields added to
+    # tasks later need no schema change.
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+            for column, kind in RUN_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _encode(task):
+        return json.dumps({k: v for k, v in task.items() if k != "id"})
+
+    def load_tasks(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM tasks ORDER BY id").fetchall()
+        tasks = []
+        for task_id, data in rows:
+            task = json.loads(data)
+            task["id"] = task_id
+            tasks.append(task)
+        return tasks
+
+    def insert_task(self, task):
+        with self._lock, self._conn:
+            cur = self._conn.execute("INSERT INTO tasks (name, data) VALUES (?, ?)",
+                                     (task.get("name", ""), self._encode(task)))
+            task["id"] = cur.lastrowid
+            self._bump_version()
+        return task["id"]
+
+    def update_task(self, task):
+        # A change to the task's settings
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE tasks SET name = ?, data = ? WHERE id = ?",
+                               (task.get("name", ""), self._encode(task), task["id"]))
+            self._bump_version()
+
+    @staticmethod
+    def _runtime_update(task):
+        # Only RUNTIME_FIELDS are written, so a stale copy of the task (say
+        # in another instance) never undoes a change to its settings
+        fields = [field for field in RUNTIME_FIELDS if field in task]
+        paths = "".join(f", '$.{field}', ?" for field in fields)
+        return f"UPDATE tasks SET data = json_set(data{paths}) WHERE id = ?", [task[f] for f in fields] + [task["id"]]
+
+    def update_runtime(self, task):
+        # The task's next_run and last_execution
+        query, args = self._runtime_update(task)
+        with self._lock, self._conn:
+            self._conn.execute(query, args)
+
+    def update_tasks(self, tasks):
+        # update_runtime() for several tasks in one transaction
+        with self._lock, self._conn:
+            for task in tasks:
+                self._conn.execute(*self._runtime_update(task))
+
+    def apply_batch(self, inserts=(), updates=(), deletes=()):
+        # Many task changes in one transaction; assigns ids to inserted tasks
+        with self._lock, self._conn:
+            for task in inserts:
+                cur = self._conn.execute("INSERT INTO tasks (name, data) VALUES (?, ?)",
+                                         (task.get("name", ""), self._encode(task)))
+                task["id"] = cur.lastrowid
+            self._conn.executemany("UPDATE tasks SET name = ?, data = ? WHERE id = ?",
+                                   [(t.get("name", ""), self._encode(t), t["id"]) for t in updates])
+            self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(t["id"],) for t in deletes])
+            self._conn.executemany("DELETE FROM fingerprints WHERE task_id = ?", [(t["id"],) for t in deletes])
+            self._bump_version()
+
+    def delete_task(self, task):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tasks WHERE id = ?", (task["id"],))
+            self._conn.execute("DELETE FROM fingerprints WHERE task_id = ?", (task["id"],))
+            self._bump_version()
+
+    def _bump_version(self):
+        # In the transaction of every change to task definitions
+        self._conn.execute("INSERT INTO meta (key, value) VALUES ('tasks_version', '1')"
+                           " ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def tasks_version(self):
+        # Moves on with every change to task definitions, from any process
+        return int(self.get_meta("tasks_version", 0))
+
+    def start_run(self, task, kind, started):
+        with self._lock, self._conn:
+            cur = self._conn.execute("INSERT INTO runs (task_id, kind, started) VALUES (?, ?, ?)",
+                                     (task["id"], kind, started))
+            return cur.lastrowid
+
+    def finish_run(self, run_id, ended, exit_code, duration, usage=None, lag=None, status=None):
+        # usage: cpu_user/cpu_sys seconds and max_rss_mb, where measured
+        usage = usage or {}
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET ended = ?, exit_code = ?, duration = ?, cpu_user = ?,"
+                               " cpu_sys = ?, max_rss_mb = ?, lag = ?, status = ? WHERE id = ?",
+                               (ended, exit_code, duration, usage.get("cpu_user"), usage.get("cpu_sys"),
+                                usage.get("max_rss_mb"), lag, status, run_id))
+
+    def runs(self, task_id=None, limit=100):
+        # Most recent runs first, as dicts
+        query = f"SELECT {', '.join(RUN_FIELDS)} FROM runs"
+        args = ()
+        if task_id is not None:
+            query += " WHERE task_id = ?"
+            args = (task_id,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, args + (limit,)).fetchall()
+        return [dict(zip(RUN_FIELDS, row)) for row in rows]
+
+    def recent_runs(self, per_task, statuses):
+        # (task_id, duration, cpu_user, cpu_sys, max_rss_mb) of the last
+        # per_task finished runs of every task with one of statuses (or
+        # none, from before statuses were recorded), oldest first
+        marks = ", ".join("?" * len(statuses))
+        query = ("SELECT task_id, duration, cpu_user, cpu_sys, max_rss_mb FROM ("
+                 " SELECT id, task_id, duration, cpu_user, cpu_sys, max_rss_mb,"
+                 " ROW_NUMBER() OVER (PARTITION BY task_id ORDER BY id DESC) AS n FROM runs"
+                 f" WHERE duration IS NOT NULL AND (status IS NULL OR status IN ({marks})))"
+                 " WHERE n <= ? ORDER BY id")
+        with self._lock:
+            return self._conn.execute(query, tuple(statuses) + (per_task,)).fetchall()
+
+    def start_pipeline(self, root_id, started):
+        with self._lock, self._conn:
+            cur = self._conn.execute("INSERT INTO pipeline_runs (root_id, started) VALUES (?, ?)",
+                                     (root_id, started))
+            return cur.lastrowid
+
+    def finish_pipeline(self, summary):
+        # summary as built by dag.PipelineRun; the path and node states are JSON
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE pipeline_runs SET ended = ?, status = ?, wall = ?, critical_seconds = ?,"
+                               " critical_path = ?, nodes = ? WHERE id = ?",
+                               (summary["ended"], summary["status"], summary["wall"],
+                                summary["critical_seconds"], json.dumps(summary["critical_path"]),
+                                json.dumps(summary["nodes"]), summary["id"]))
+
+    def pipelines(self, root_id=None, limit=50):
+        # Most recent pipeline runs first, as dicts
+        query = "SELECT id, root_id, started, ended, status, wall, critical_seconds, critical_path, nodes FROM pipeline_runs"
+        args = ()
+        if root_id is not None:
+            query += " WHERE root_id = ?"
+            args = (root_id,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, args + (limit,)).fetchall()
+        keys = ("id", "root_id", "started", "ended", "status", "wall", "critical_seconds", "critical_path", "nodes")
+        result = []
+        for row in rows:
+            run = dict(zip(keys, row))
+            run["critical_path"] = json.loads(run["critical_path"] or "[]")
+            run["nodes"] = {int(k): v for k, v in json.loads(run["nodes"] or "{}").items()}
+            result.append(run)
+        return result
+
+    def get_fingerprint(self, task_id):
+        # (digest, files) recorded after the task's last successful run, or None
+        with self._lock:
+            row = self._conn.execute("SELECT digest, files FROM fingerprints WHERE task_id = ?", (task_id,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set_fingerprint(self, task_id, digest, files):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO fingerprints (task_id, digest, files, recorded)"
+                               " VALUES (?, ?, ?, datetime('now', 'localtime'))",
+                               (task_id, digest, json.dumps(files)))
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate_json(self, json_file, source=None):
+        # One-time import of an existing tasks.json; returns how many tasks.
+        # source, if given, is recorded as the "source" of every task
+        if self.get_meta("migrated_json") or not os.path.isfile(json_file):
+            return 0
+        with open(json_file, "r") as f:
+            tasks = json.load(f)
+        with self._lock, self._conn:
+            for task in tasks:
+                if source is not None:
+                    task.setdefault("source", source)
+                cur = self._conn.execute("INSERT INTO tasks (name, data) VALUES (?, ?)",
+                                         (task.get("name", ""), self._encode(task)))
+                task["id"] = cur.lastrowid
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               ("migrated_json", os.path.abspath(json_file)))
+        return len(tasks)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The engine keeps logs/ and settings relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def wait_for(predicate, timeout=5.0, interval=0.02):
+    # Poll predicate() until it is true; returns its last value
+    import time
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value or time.monotonic() >= deadline:
+            return value
+        time.sleep(interval)
+
+def make_engine(folder, **settings):
+    # A TaskEngine on its own database in folder, without the optional
+    # background services (search index, warm interpreters)
+    import task_core
+    values = dict(task_core.DEFAULT_SETTINGS, search_index=False, python_workers=0, log_level="WARNING")
+    values.update(settings)
+    return task_core.TaskEngine(values, db_file=os.path.join(folder, "tasks.db"),
+                                tasks_file=os.path.join(folder, "tasks.json"))
+
+def new_task(folder, name, cron_expr="0 0 1 1 *", **fields):
+    # Fields of a task running a small Python script in folder
+    path = os.path.join(folder, f"{name}.py")
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write(fields.pop("script", "print('hello')\n"))
+    fields.pop("script", None)
+    task = {"name": name, "file_path": path, "cron_expr": cron_expr, "status": "Active",
+            "retention": 1, "log_executions": 1, "max_instances": 1, "depends_on": []}
+    task.update(fields)
+    return task
+
+@pytest.fixture
+def engine(workdir):
+    engines = []
+    def start(**settings):
+        created = make_engine(str(workdir), **settings)
+        created.start()
+        engines.append(created)
+        return created
+    yield start
+    for created in engines:
+        created.stop()
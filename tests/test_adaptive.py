@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime, timedelta
+
+import adaptive
+import task_core
+from task_core import ExecutionPool
+from conftest import new_task, wait_for
+from task_store import TaskStore
+
+def usage(cpu, rss):
+    return {"cpu_user": cpu, "cpu_sys": 0.0, "max_rss_mb": rss}
+
+def test_format_duration():
+    assert adaptive.format_duration(0.85) == "850ms"
+    assert adaptive.format_duration(12.34) == "12.3s"
+    assert adaptive.format_duration(245) == "4m05s"
+    assert adaptive.format_duration(7800) == "2h10m"
+
+def test_history_stats():
+    history = adaptive.RunHistory(window=3)
+    assert history.stats(1) is None and history.predict(1) == (0.0, 0.0)
+    for wall in (100, 1, 2, 3):
+        history.observe(1, "ok", wall, usage(wall / 2, wall * 10))
+    # Only executed runs count, and only the last `window` of them
+    history.observe(1, "unchanged", 50, {})
+    history.observe(1, "skipped", None, {})
+    stats = history.stats(1)
+    assert stats == {"runs": 3, "p50": 2, "p95": 3, "rss_mb": 30, "cores": 0.5}
+    assert history.predict(1) == (30, 0.5)
+    # Unmeasured runs still count for the duration only
+    history.observe(2, "failed", 4, {})
+    assert history.stats(2)["cores"] is None and history.predict(2) == (0.0, 0.0)
+    history.forget(1)
+    assert history.stats(1) is None
+
+def test_history_loads_from_store(workdir):
+    store = TaskStore("tasks.db")
+    try:
+        task = new_task(str(workdir), "loaded")
+        store.insert_task(task)
+        for duration, status in ((5, "ok"), (7, "failed"), (9, "unchanged")):
+            run_id = store.start_run(task, "scheduled", "2024-01-01 00:00:00")
+            store.finish_run(run_id, "2024-01-01 00:00:10", 0, duration, usage(duration, 64), status=status)
+        history = adaptive.RunHistory()
+        history.observe(task["id"], "ok", 11, {})
+        history.load(store)
+        # The run observed while loading is kept as the newest one
+        assert history.stats(task["id"])["runs"] == 3
+        assert history.stats(task["id"])["p95"] == 11
+        assert history.predict(task["id"]) == (64, 1.0)
+    finally:
+        store.close()
+
+def test_admission_holds_runs_over_budget():
+    history = adaptive.RunHistory()
+    history.observe("heavy", "ok", 10, usage(10, 600))
+    history.observe("light", "ok", 10, usage(5, 100))
+    admission = adaptive.Admission(history, memory_mb=1000, cpu=2, max_delay=60)
+    now = datetime.now()
+    assert admission.acquire("heavy", now, 0) is True
+    # Another heavy run would take memory over the budget; a light one fits
+    assert admission.acquire("heavy", now, 10) is False
+    assert admission.acquire("light", now, 0) is True
+    # Held for too long: nothing behind it may overtake it
+    assert admission.acquire("heavy", now, 60) is None
+    assert admission.stats()["held"] == 1
+    admission.release("heavy")
+    assert admission.acquire("heavy", now, 70) is True
+    assert admission.stats()["delayed"] == 1
+    admission.release("heavy")
+    admission.release("light")
+    stats = admission.stats()
+    assert (stats["running"], stats["reserved_memory_mb"], stats["reserved_cores"]) == (0, 0.0, 0.0)
+
+def test_admission_always_admits_when_idle_and_forgets_dropped_jobs():
+    history = adaptive.RunHistory()
+    history.observe("huge", "ok", 10, usage(80, 5000))
+    admission = adaptive.Admission(history, memory_mb=1000, cpu=2)
+    now = datetime.now()
+    assert admission.acquire("huge", now, 0) is True
+    assert admission.acquire("huge", now, 0) is False
+    admission.discard("huge", now)
+    assert admission.stats()["held"] == 0
+
+def heavy_history():
+    history = adaptive.RunHistory()
+    history.observe("heavy", "ok", 10, usage(10, 600))
+    return history
+
+def test_release_by_another_pool_starts_held_jobs():
+    admission = adaptive.Admission(heavy_history(), memory_mb=1000)
+    # The budget is taken by a run of the other engine sharing it
+    assert admission.acquire("heavy", datetime.now(), 0)
+    pool = ExecutionPool(max_workers=1, admission=admission)
+    started = threading.Event()
+    pool.submit("heavy", lambda wait: started.set())
+    assert not started.wait(0.2)
+    admission.release("heavy")
+    assert started.wait(5)
+    assert pool.wait_idle(5)
+
+def test_release_by_the_thread_pool_starts_held_async_runs(engine, workdir):
+    eng = engine(engine="asyncio", memory_budget_mb=1000)
+    task = new_task(str(workdir), "heavy")
+    eng.add_task(task)
+    eng.history.observe(task["id"], "ok", 10, usage(10, 600))
+    assert eng.admission.acquire(task["id"], datetime.now(), 0)
+    assert eng.supervisor.submit(task["id"], task, manual=True)
+    assert not wait_for(lambda: eng.store.runs(task["id"]), timeout=0.2)
+    eng.admission.release(task["id"])
+    assert wait_for(lambda: eng.store.runs(task["id"]))
+    assert eng.supervisor.wait_idle(10)
+
+def test_predicted_end():
+    history = adaptive.RunHistory()
+    admission = adaptive.Admission(history)
+    admission.acquire("new", datetime.now(), 0)
+    assert admission.predicted_end("new") is None  # no history
+    history.observe("known", "ok", 30, {})
+    assert admission.predicted_end("known") is None  # not running
+    before = datetime.now()
+    admission.acquire("known", before, 0)
+    end = admission.predicted_end("known")
+    assert before + timedelta(seconds=30) <= end <= datetime.now() + timedelta(seconds=30)
+
+def test_engine_estimate(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "estimated", next_run="2030-01-01 00:00:00")
+    eng.add_task(task)
+    assert eng.estimate(task) is None
+    eng._execute_task(task, manual=True)
+    assert wait_for(lambda: eng.history.stats(task["id"]) is not None)
+    estimate = eng.estimate(task)
+    assert estimate["runs"] == 1
+    expected = task_core.parse_time(task["next_run"]) + timedelta(seconds=estimate["p50"])
+    assert estimate["expected_end"] == expected
@@ -0,0 +1,71 @@
+import threading
+
+from conftest import new_task, wait_for
+from async_engine import AsyncSupervisor
+
+def test_manual_run_is_recorded(engine, workdir):
+    eng = engine(engine="asyncio")
+    task = new_task(str(workdir), "hello", script="print('hello from the loop')\n")
+    eng.add_task(task)
+    assert eng.run_task(task)
+    assert wait_for(lambda: eng.store.runs(task["id"]) and eng.store.runs(task["id"])[0]["ended"])
+    run = eng.store.runs(task["id"])[0]
+    assert (run["kind"], run["exit_code"], run["status"]) == ("manual", 0, "ok")
+    assert run["cpu_user"] is None  # not measured by this engine
+    entry = eng.log_store.executions(task)[-1]
+    with open(eng.log_store.segment_path(task, entry), encoding="utf-8") as f:
+        text = f.read()
+    assert "==== MANUAL EXECUTION" in text
+    assert "hello from the loop" in text
+    assert task["last_execution"] not in ("running...", None)
+
+def test_timeout_is_recorded(engine, workdir):
+    eng = engine(engine="asyncio")
+    task = new_task(str(workdir), "slow", script="import time\ntime.sleep(30)\n", timeout=1)
+    eng.add_task(task)
+    eng.run_task(task)
+    assert wait_for(lambda: eng.store.runs(task["id"]) and eng.store.runs(task["id"])[0]["ended"], timeout=15)
+    assert eng.store.runs(task["id"])[0]["status"] == "timeout"
+    entry = eng.log_store.executions(task)[-1]
+    with open(eng.log_store.segment_path(task, entry), encoding="utf-8") as f:
+        assert "==== KILLED (timeout after 1s" in f.read()
+
+def test_cancel_reports_dropped_jobs(engine, workdir):
+    eng = engine(engine="asyncio")
+    supervisor = AsyncSupervisor(eng, max_jobs=1)
+    blocker = new_task(str(workdir), "blocker", script="import time\ntime.sleep(30)\n")
+    queued = new_task(str(workdir), "queued")
+    eng.add_task(blocker)
+    eng.add_task(queued)
+    statuses = {}
+    done = threading.Event()
+    def on_done(name):
+        def record(status):
+            statuses[name] = status
+            if len(statuses) == 2:
+                done.set()
+        return record
+    try:
+        supervisor.submit(blocker["id"], blocker, on_done=on_done("blocker"))
+        assert wait_for(lambda: eng.log_store.executions(blocker))  # started and logging
+        supervisor.submit(queued["id"], queued, on_done=on_done("queued"))
+        assert supervisor.is_queued(queued["id"])
+        supervisor.cancel()
+        assert done.wait(15)
+        assert statuses == {"queued": "cancelled", "blocker": "killed"}
+        assert eng.store.runs(queued["id"]) == []
+        assert eng.store.runs(blocker["id"])[0]["status"] == "killed"
+    finally:
+        supervisor.cancel()
+        supervisor.wait_idle(10)
+        supervisor.close()
+
+def test_skip_unchanged(engine, workdir):
+    eng = engine(engine="asyncio")
+    task = new_task(str(workdir), "same", skip_unchanged=True)
+    eng.add_task(task)
+    for _ in range(2):
+        eng.supervisor.submit(task["id"], task)
+        assert eng.supervisor.wait_idle(10)
+    # Most recent first: the second run was skipped
+    assert [run["status"] for run in eng.store.runs(task["id"])] == ["unchanged", "ok"]
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCH)
+
+import bench_engine
+
+SMALL = ["--fleets", "20", "--lag-seconds", "0.2", "--log-sizes", "1024", "--launch-runs", "2",
+         "--stub-output", "100"]
+
+def run_bench(*args):
+    return subprocess.run([sys.executable, os.path.join(BENCH, "bench_engine.py")] + SMALL + list(args),
+                          capture_output=True, text=True, timeout=120)
+
+def test_small_fleet_report_and_compare(workdir):
+    first = run_bench("--out", "first.json")
+    assert first.returncode == 0, first.stderr
+    with open("first.json") as f:
+        report = json.load(f)
+    assert set(report["results"]) == {"tick", "lag", "store", "logs", "launch"}
+    assert set(report["results"]["tick"]) == {"20"}
+    assert report["meta"]["args"]["fleets"] == "20"
+    # A huge threshold: the same code is never a regression of itself
+    second = run_bench("--out", "second.json", "--compare", "first.json", "--threshold", "1000")
+    assert second.returncode == 0, second.stderr
+    assert "compared with first.json" in second.stderr
+
+def test_compare_flags_regressions(capsys):
+    baseline = {"results": {"tick": {"mean": 1.0}, "logs": {"1024": {"mb_per_s": 100.0}}, "lag": {"count": 5}}}
+    slower = {"results": {"tick": {"mean": 1.5}, "logs": {"1024": {"mb_per_s": 100.0}}, "lag": {"count": 50}}}
+    assert bench_engine.compare(slower, baseline, 0.2) == 1
+    assert "REGRESSION" in capsys.readouterr().err
+    # Throughput regresses when it drops; counts are not compared
+    less = {"results": {"tick": {"mean": 1.0}, "logs": {"1024": {"mb_per_s": 50.0}}, "lag": {"count": 5}}}
+    assert bench_engine.compare(less, baseline, 0.2) == 1
+    assert bench_engine.compare(baseline, baseline, 0.2) == 0
@@ -0,0 +1,111 @@
+import json
+import threading
+import http.client
+
+import pytest
+
+import control_api
+from conftest import new_task
+
+@pytest.fixture
+def api(engine, workdir):
+    running = engine()
+    server = control_api.serve(running, 0)
+    port = server.server_address[1]
+    def call(method, path, body=None, host="127.0.0.1"):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        headers = {"Host": host}
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        conn.request(method, path, data, headers)
+        response = conn.getresponse()
+        result = response.status, json.loads(response.read() or b"null")
+        conn.close()
+        return result
+    call.engine = running
+    yield call
+    control_api.shutdown(server)
+
+def test_clean_task_defaults_and_errors():
+    task = control_api.clean_task({"file_path": "/x/job.py", "cron_expr": "* * * * *", "id": 5})
+    assert task["name"] == "job.py" and task["retention"] == 1 and "id" not in task
+    for fields in ({"cron_expr": "* * * * *"}, {"file_path": "a", "cron_expr": "nope"},
+                   {"file_path": "a", "cron_expr": "* * * * *", "retention": 0},
+                   {"file_path": "a", "cron_expr": "* * * * *", "misfire": "later"},
+                   {"file_path": "a"}):
+        with pytest.raises(control_api.ApiError):
+            control_api.clean_task(fields)
+    assert control_api.clean_task({"jitter": None, "misfire": None}, partial=True) == {"jitter": None, "misfire": None}
+
+def test_crud_and_batch(api, workdir):
+    status, task = api("POST", "/tasks", new_task(str(workdir), "a"))
+    assert status == 201 and task["next_run"] != "-"
+    status, updated = api("PATCH", f"/tasks/{task['id']}", {"cron_expr": "*/5 * * * *"})
+    assert status == 200 and updated["cron_expr"] == "*/5 * * * *"
+    status, body = api("POST", "/batch", {"create": [new_task(str(workdir), "b"), new_task(str(workdir), "c")],
+                                           "update": [{"id": task["id"], "name": "a2"}]})
+    assert status == 200 and len(body["created"]) == 2 and body["updated"] == [task["id"]]
+    status, tasks = api("GET", "/tasks")
+    assert sorted(t["name"] for t in tasks) == ["a2", "b", "c"]
+    assert api("DELETE", f"/tasks/{task['id']}")[0] == 200
+    assert api("GET", f"/tasks/{task['id']}")[0] == 404
+    # A bad batch changes nothing
+    status, _ = api("POST", "/batch", {"create": [new_task(str(workdir), "d")], "delete": [12345]})
+    assert status == 404 and len(api("GET", "/tasks")[1]) == 2
+
+def test_batch_keeps_task_lookup_in_step(api, workdir):
+    engine = api.engine
+    status, body = api("POST", "/batch", {"create": [new_task(str(workdir), f"t{i}") for i in range(50)]})
+    ids = body["created"]
+    assert status == 200 and all(engine.get_task(task_id)["id"] == task_id for task_id in ids)
+    status, body = api("POST", "/batch", {"delete": ids[::2], "run": ids[:2]})
+    # A task deleted by the batch is not run
+    assert status == 200 and list(body["triggered"]) == [str(ids[1])]
+    assert [task["id"] for task in engine.tasks] == ids[1::2]
+    assert engine.get_task(ids[0]) is None and not engine.has_task({"id": ids[0]})
+    # A copy of a task is not the task
+    assert not engine.has_task(dict(engine.get_task(ids[1])))
+
+def test_rejects_foreign_host_and_cycles(api, workdir):
+    assert api("GET", "/tasks", host="evil.example")[0] == 403
+    _, a = api("POST", "/tasks", new_task(str(workdir), "a"))
+    _, b = api("POST", "/tasks", new_task(str(workdir), "b", depends_on=[a["id"]]))
+    status, body = api("PATCH", f"/tasks/{a['id']}", {"depends_on": [b["id"]]})
+    assert status == 400 and "cycle" in body["error"].lower()
+
+def test_concurrent_changes_from_api_and_engine(api, workdir):
+    # The window and tasks.json reloads change tasks without the API; the
+    # engine lock keeps the task list, children and listings consistent
+    engine = api.engine
+    errors = []
+    def from_engine(prefix):
+        try:
+            for i in range(30):
+                task = new_task(str(workdir), f"{prefix}{i}")
+                engine.add_task(task)
+                engine.update_task(task, {"cron_expr": "*/2 * * * *"})
+                if i % 2:
+                    engine.remove_task(task)
+        except Exception as e:
+            errors.append(e)
+    def from_api():
+        try:
+            for i in range(30):
+                status, task = api("POST", "/tasks", new_task(str(workdir), f"api{i}"))
+                assert status == 201
+                assert api("GET", "/tasks")[0] == 200
+                if i % 2:
+                    assert api("DELETE", f"/tasks/{task['id']}")[0] == 200
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=from_engine, args=(p,)) for p in "xy"] + [threading.Thread(target=from_api)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    assert not errors
+    tasks = api("GET", "/tasks")[1]
+    assert len(tasks) == 45 and len({t["id"] for t in tasks}) == 45
+    assert sorted(t["id"] for t in engine.store.load_tasks()) == sorted(t["id"] for t in tasks)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import sqlite3
+import subprocess
+from collections import Counter
+
+from coordination import Coordinator
+from conftest import make_engine, new_task
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+def test_each_occurrence_is_claimed_once(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    a, b = Coordinator(db, lease=30, grace=0), Coordinator(db, lease=30, grace=0)
+    try:
+        assert a.claim(1, "2026-01-01 00:00:00")
+        assert not b.claim(1, "2026-01-01 00:00:00")
+        assert b.claim(1, "2026-01-01 00:01:00")
+        # Both agree on who is preferred for an occurrence
+        assert {a.preferred(7, "x"), b.preferred(7, "x")} == {a.preferred(7, "x")}
+        assert sorted([a.is_preferred(7, "x"), b.is_preferred(7, "x")]) == [False, True]
+    finally:
+        a.stop()
+        b.stop()
+
+def test_expired_lease_is_taken_over(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    dead, alive = Coordinator(db, lease=0.2), Coordinator(db, lease=0.2)
+    try:
+        assert dead.claim(3, "occ")
+        time.sleep(0.3)  # dead stops renewing
+        assert alive._take_over_expired() == [(3, "occ")]
+        assert alive._take_over_expired() == []
+        # Finished claims are never taken over
+        alive.release(3, "occ")
+        assert alive.claim(4, "occ")
+        alive.release(4, "occ")
+        time.sleep(0.3)
+        assert alive._take_over_expired() == []
+    finally:
+        dead.stop()
+        alive.stop()
+
+CHILD = """
+import sys, time
+sys.path[:0] = [{tests!r}, {repo!r}]
+from conftest import make_engine
+engine = make_engine({folder!r}, coordination=True, lease_seconds=5, claim_grace_seconds=0.5, task_sync_seconds=0.2)
+engine.start()
+time.sleep({seconds})
+engine.stop(timeout=5)
+"""
+
+def runs_of(folder, task_id):
+    conn = sqlite3.connect(os.path.join(folder, "tasks.db"))
+    try:
+        return [row[0] for row in conn.execute("SELECT started FROM runs WHERE task_id = ?", (task_id,))]
+    finally:
+        conn.close()
+
+def test_instances_share_runs_and_follow_changes(tmp_path):
+    # Two runner processes on one tasks.db; a third process (this one)
+    # changes and deletes tasks while they run
+    folder = str(tmp_path)
+    editor = make_engine(folder)
+    changed = new_task(folder, "changed", "* * * * * *")
+    deleted = new_task(folder, "deleted", "* * * * * *")
+    editor.add_task(changed)
+    editor.add_task(deleted)
+    code = CHILD.format(tests=TESTS, repo=os.path.dirname(TESTS), folder=folder, seconds=9)
+    children = [subprocess.Popen([sys.executable, "-c", code], cwd=folder) for _ in range(2)]
+    try:
+        time.sleep(4)
+        assert runs_of(folder, changed["id"]) and runs_of(folder, deleted["id"])
+        editor.update_task(changed, {"cron_expr": "0 0 1 1 *"})
+        editor.remove_task(deleted)
+        time.sleep(1.5)  # several sync intervals, and runs already started finish
+        settled = {task_id: len(runs_of(folder, task_id)) for task_id in (changed["id"], deleted["id"])}
+        time.sleep(2.5)
+        assert {task_id: len(runs_of(folder, task_id)) for task_id in settled} == settled
+    finally:
+        for child in children:
+            assert child.wait(30) == 0
+        editor.stop()
+    # No occurrence ran on both instances
+    for task_id in (changed["id"], deleted["id"]):
+        started = runs_of(folder, task_id)
+        assert max(Counter(started).values()) == 1, started
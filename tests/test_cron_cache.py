@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import new_task, wait_for
+from cron_cache import CronCache
+
+BASE = datetime(2024, 1, 1, 10, 7, 30)
+
+def test_next_runs_match_cron():
+    cache = CronCache()
+    assert cache.next_run("*/15 * * * *", BASE) == datetime(2024, 1, 1, 10, 15)
+    assert cache.next_run("0 0 1 1 *", BASE) == datetime(2025, 1, 1)
+    assert cache.compile("30 9 * * 1-5").next_times(BASE, 3) == [
+        datetime(2024, 1, 2, 9, 30), datetime(2024, 1, 3, 9, 30), datetime(2024, 1, 4, 9, 30)]
+
+def test_compiled_schedules_are_shared():
+    cache = CronCache()
+    first = cache.compile("*/5 * * * *")
+    # Whitespace differences are the same expression
+    assert cache.compile(" */5  * * * * ") is first
+    assert cache.stats() == {"size": 1, "maxsize": 1024, "hits": 1, "misses": 1}
+
+def test_memo_per_minute_does_not_leak_across_bases():
+    schedule = CronCache().compile("*/5 * * * *")
+    assert schedule.next_after(BASE) == datetime(2024, 1, 1, 10, 10)
+    assert schedule.next_after(BASE.replace(second=59)) == datetime(2024, 1, 1, 10, 10)
+    assert schedule.next_after(datetime(2024, 1, 1, 10, 10)) == datetime(2024, 1, 1, 10, 15)
+    # Asking for more times than memoized recomputes
+    assert len(schedule.next_times(BASE, 4)) == 4
+
+def test_invalid_expressions_are_cached_errors():
+    cache = CronCache()
+    with pytest.raises(ValueError, match="Invalid cron expression 'not cron'"):
+        cache.compile("not cron")
+    assert not cache.is_valid("not cron")
+    assert cache.next_run("not cron", BASE) is None
+    assert cache.stats()["misses"] == 1
+
+def test_batch_computes_each_expression_once():
+    cache = CronCache()
+    result = cache.next_runs([(1, "0 * * * *"), (2, "0 * * * *"), (3, "bad")], BASE, k=2)
+    assert result == {1: [datetime(2024, 1, 1, 11), datetime(2024, 1, 1, 12)],
+                      2: [datetime(2024, 1, 1, 11), datetime(2024, 1, 1, 12)], 3: []}
+    assert result[1] is not result[2]
+    assert cache.stats()["misses"] == 2
+
+def test_lru_eviction():
+    cache = CronCache(maxsize=2)
+    cache.compile("0 * * * *")
+    cache.compile("1 * * * *")
+    cache.compile("0 * * * *")  # most recently used again
+    cache.compile("2 * * * *")
+    assert cache.stats()["size"] == 2
+    hits = cache.stats()["hits"]
+    cache.compile("0 * * * *")
+    assert cache.stats()["hits"] == hits + 1
+
+def test_seconds_field():
+    cache = CronCache()
+    assert cache.compile("* * * * * */10").next_times(BASE, 3) == [
+        datetime(2024, 1, 1, 10, 7, 40), datetime(2024, 1, 1, 10, 7, 50), datetime(2024, 1, 1, 10, 8)]
+    # Not memoized per minute: each base gets its own answer
+    assert cache.next_run("* * * * * */10", BASE.replace(second=51)) == datetime(2024, 1, 1, 10, 8)
+
+def test_every_interval():
+    cache = CronCache()
+    schedule = cache.compile("@every 1h30m")
+    assert schedule.next_after(datetime(2024, 1, 1, 10, 0)) == datetime(2024, 1, 1, 10, 30)
+    assert schedule.next_times(datetime(2024, 1, 1, 10, 30), 2) == [datetime(2024, 1, 1, 12), datetime(2024, 1, 1, 13, 30)]
+    assert cache.next_run("@EVERY 30s", BASE) == datetime(2024, 1, 1, 10, 8)
+    for bad in ("@every", "@every 0s", "@every 5x", "@every 5m 3s", "@every 1h-5m"):
+        assert not cache.is_valid(bad), bad
+
+def test_engine_fires_every_second(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "often", "@every 1s")
+    eng.add_task(task)
+    assert wait_for(lambda: len(eng.store.runs(task["id"])) >= 2, timeout=10)
+    assert all(run["kind"] == "scheduled" for run in eng.store.runs(task["id"]))
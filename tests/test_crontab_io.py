@@ -0,0 +1,85 @@
+import os
+from datetime import datetime
+
+import crontab_io
+from task_store import TaskStore
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+CRONTAB = """\
+# m h dom mon dow command
+MAILTO=ops@example.com
+PATH=/usr/bin:/bin
+
+# name: nightly backup
+30 2 * * * /opt/backup.sh --full
+@hourly  python3 /opt/report.py > /dev/null
+*/5 * * * * date +\\%s
+"""
+
+def test_parse_entries_and_environment():
+    tasks, errors, notes = crontab_io.parse(CRONTAB, now=NOW)
+    assert errors == []
+    assert notes == [(2, "MAILTO is a cron setting and was not imported")]
+    assert [t["name"] for t in tasks] == ["nightly backup", "python3", "date"]
+    backup, report, date = tasks
+    assert (backup["cron_expr"], backup["command"]) == ("30 2 * * *", "/opt/backup.sh --full")
+    assert backup["next_run"] == "2024-01-02 02:30:00"
+    assert report["cron_expr"] == "0 * * * *"
+    assert date["command"] == "date +%s"
+    assert all(t["env"] == {"PATH": "/usr/bin:/bin"} for t in tasks)
+    assert backup["cwd"] == os.path.expanduser("~")
+
+def test_all_problems_are_reported_with_line_numbers():
+    text = ("@reboot /opt/start.sh\n"
+            "61 * * * * /bin/true\n"
+            "* * * * *\n"
+            "* * * * * echo 50%\n"
+            "@fortnightly /bin/true\n"
+            "0 0 * * * /bin/ok\n")
+    tasks, errors, _ = crontab_io.parse(text, now=NOW)
+    assert [t["command"] for t in tasks] == ["/bin/ok"]
+    assert [line for line, _ in errors] == [1, 2, 3, 4, 5]
+    assert "runs at boot" in errors[0][1]
+    assert "Invalid cron expression" in errors[1][1]
+    assert errors[2][1] == "missing command"
+    assert "unescaped %" in errors[3][1]
+    assert "not a known macro" in errors[4][1]
+
+def test_system_format_and_unique_names():
+    text = "0 1 * * * root /usr/bin/job\n0 2 * * * backup /usr/bin/job\n"
+    tasks, errors, notes = crontab_io.parse(text, system=True, taken_names=["job"], now=NOW)
+    assert errors == []
+    assert [t["name"] for t in tasks] == ["job (2)", "job (3)"]
+    assert [t["command"] for t in tasks] == ["/usr/bin/job", "/usr/bin/job"]
+    assert notes == [(0, "entries for user backup run as the runner's own user"),
+                     (0, "entries for user root run as the runner's own user")]
+
+def test_export_imports_back_as_the_same_tasks():
+    tasks, _, _ = crontab_io.parse(CRONTAB, now=NOW)
+    tasks.append({"name": "after", "file_path": "/opt/after.py", "cron_expr": "", "depends_on": [1]})
+    tasks.append({"name": "fast", "file_path": "/opt/fast.py", "cron_expr": "@every 10s"})
+    text = crontab_io.export(tasks)
+    assert "# after: runs only after its upstream tasks" in text
+    assert "# fast: '@every 10s' has no crontab form" in text
+    again, errors, _ = crontab_io.parse(text, now=NOW)
+    assert errors == []
+    assert [(t["name"], t["cron_expr"], t["command"], t.get("env")) for t in again] == \
+        [(t["name"], t["cron_expr"], t["command"], t.get("env")) for t in tasks[:3]]
+
+def test_command_line_import(workdir, capsys):
+    with open("crontab", "w") as f:
+        f.write("0 0 * * * /bin/true\n61 * * * * /bin/false\n")
+    assert crontab_io.main(["crontab", "--db", "tasks.db"]) == 1
+    assert "nothing imported" in capsys.readouterr().err
+    assert crontab_io.main(["crontab", "--db", "tasks.db", "--skip-invalid", "--dry-run"]) == 0
+    store = TaskStore("tasks.db")
+    try:
+        assert store.load_tasks() == []
+        assert crontab_io.main(["crontab", "--db", "tasks.db", "--skip-invalid"]) == 0
+        assert [t["command"] for t in store.load_tasks()] == ["/bin/true"]
+    finally:
+        store.close()
+    assert crontab_io.main(["exported", "--db", "tasks.db"], export_mode=True) == 0
+    with open("exported") as f:
+        assert "0 0 * * * /bin/true" in f.read()
@@ -0,0 +1,69 @@
+import pytest
+
+import dag
+from conftest import new_task, wait_for
+
+def graph():
+    # root -> a -> c, root -> b
+    return [{"id": 1, "name": "root"}, {"id": 2, "name": "a", "depends_on": [1]},
+            {"id": 3, "name": "b", "depends_on": ["1"]}, {"id": 4, "name": "c", "depends_on": [2]}]
+
+def test_children_and_downstream():
+    tasks = graph()
+    children = dag.build_children(tasks)
+    assert {k: [t["id"] for t in v] for k, v in children.items()} == {1: [2, 3], 2: [4]}
+    assert [t["id"] for t in dag.downstream(tasks[0], children)] == [1, 2, 3, 4]
+    assert [t["id"] for t in dag.downstream(tasks[1], children)] == [2, 4]
+
+def test_validate():
+    tasks = graph()
+    dag.validate(tasks, None, [1, 2])
+    dag.validate(tasks, 3, [2])
+    with pytest.raises(ValueError, match="Unknown upstream task id 9"):
+        dag.validate(tasks, None, [9])
+    with pytest.raises(ValueError, match="cannot depend on itself"):
+        dag.validate(tasks, 2, [2])
+    with pytest.raises(ValueError, match="Dependency cycle through root"):
+        dag.validate(tasks, 1, [4])
+
+def add_graph(eng, folder, fail=None):
+    root = new_task(folder, "root")
+    eng.add_task(root)
+    a = new_task(folder, "a", "", depends_on=[root["id"]], script="raise SystemExit(1)\n" if fail == "a" else "pass\n")
+    eng.add_task(a)
+    b = new_task(folder, "b", "", depends_on=[root["id"]])
+    eng.add_task(b)
+    c = new_task(folder, "c", "", depends_on=[a["id"], b["id"]])
+    eng.add_task(c)
+    return root, a, b, c
+
+def test_pipeline_runs_every_node(engine, workdir):
+    eng = engine()
+    root, a, b, c = add_graph(eng, str(workdir))
+    assert eng.run_task(root)
+    assert wait_for(lambda: eng.store.pipelines(root["id"]) and eng.store.pipelines(root["id"])[0]["ended"], timeout=15)
+    [pipeline] = eng.store.pipelines(root["id"])
+    assert pipeline["status"] == "ok"
+    assert pipeline["nodes"] == {root["id"]: "ok", a["id"]: "ok", b["id"]: "ok", c["id"]: "ok"}
+    assert pipeline["critical_path"][0] == root["id"] and pipeline["critical_path"][-1] == c["id"]
+    # c waited for both of its parents
+    assert eng.store.runs(c["id"])[0]["started"] >= max(eng.store.runs(t["id"])[0]["started"] for t in (a, b))
+
+def test_failed_node_skips_descendants(engine, workdir):
+    eng = engine()
+    root, a, b, c = add_graph(eng, str(workdir), fail="a")
+    eng.run_task(root)
+    assert wait_for(lambda: eng.store.pipelines(root["id"]) and eng.store.pipelines(root["id"])[0]["ended"], timeout=15)
+    [pipeline] = eng.store.pipelines(root["id"])
+    assert pipeline["status"] == "failed"
+    assert pipeline["nodes"][a["id"]] == "failed"
+    assert pipeline["nodes"][b["id"]] == "ok"
+    assert pipeline["nodes"][c["id"]] == dag.UPSTREAM_FAILED
+    assert eng.store.runs(c["id"])[0]["status"] == dag.UPSTREAM_FAILED
+    assert c["last_execution"].startswith("Skipped: upstream task a failed")
+
+def test_engine_rejects_cycles(engine, workdir):
+    eng = engine()
+    root, a, b, c = add_graph(eng, str(workdir))
+    with pytest.raises(ValueError, match="cycle"):
+        eng.update_task(root, dict(root, depends_on=[c["id"]]))
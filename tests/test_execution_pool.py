@@ -0,0 +1,73 @@
+import threading
+import time
+
+from conftest import wait_for
+from task_core import ExecutionPool
+
+def test_runs_at_most_max_workers():
+    pool = ExecutionPool(max_workers=2)
+    lock = threading.Lock()
+    active = [0, 0]  # now, peak
+    def job(wait):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+    for i in range(6):
+        assert pool.submit(i, job)
+    assert pool.wait_idle(5)
+    assert active[1] == 2
+    stats = pool.stats()
+    assert (stats["queued"], stats["running"], stats["max_workers"]) == (0, 0, 2)
+    assert stats["wait_max"] >= stats["wait_mean"] >= 0
+
+def test_queued_task_is_not_queued_twice():
+    pool = ExecutionPool(max_workers=1)
+    release = threading.Event()
+    ran = []
+    pool.submit("blocker", lambda wait: release.wait(5))
+    assert pool.submit("task", lambda wait: ran.append("first"))
+    assert pool.is_queued("task")
+    assert not pool.submit("task", lambda wait: ran.append("second"))
+    # Catch-up runs may be queued more than once
+    assert pool.submit("task", lambda wait: ran.append("catch-up"), unique=False)
+    release.set()
+    assert pool.wait_idle(5)
+    assert ran == ["first", "catch-up"]
+
+def test_instance_limit_passes_over_to_other_tasks():
+    pool = ExecutionPool(max_workers=3)
+    release = threading.Event()
+    order = []
+    pool.submit("a", lambda wait: release.wait(5), max_instances=1)
+    assert wait_for(lambda: pool.running_count("a"))
+    # The second run of "a" waits for the first; "b" behind it starts at once
+    pool.submit("a", lambda wait: order.append("a"), max_instances=1)
+    pool.submit("b", lambda wait: order.append("b"))
+    assert wait_for(lambda: order)
+    assert order == ["b"]
+    assert pool.is_queued("a")
+    release.set()
+    assert pool.wait_idle(5)
+    assert order == ["b", "a"]
+
+def test_failing_job_frees_its_slot():
+    pool = ExecutionPool(max_workers=1)
+    ran = []
+    def fail(wait):
+        raise RuntimeError("boom")
+    pool.submit("bad", fail)
+    pool.submit("good", lambda wait: ran.append(wait))
+    assert pool.wait_idle(5)
+    assert len(ran) == 1 and ran[0] >= 0
+    assert pool.running_count("bad") == 0
+
+def test_wait_idle_times_out():
+    pool = ExecutionPool(max_workers=1)
+    release = threading.Event()
+    pool.submit("slow", lambda wait: release.wait(5))
+    assert not pool.wait_idle(0.05)
+    release.set()
+    assert pool.wait_idle(5)
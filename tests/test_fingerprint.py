@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import fingerprint
+from conftest import new_task
+from task_store import TaskStore
+
+@pytest.fixture
+def store(workdir):
+    store = TaskStore("tasks.db")
+    yield store
+    store.close()
+
+def make_task(store, folder, **fields):
+    os.makedirs(os.path.join(folder, "data", "sub"), exist_ok=True)
+    for name in ("data/a.csv", "data/sub/b.csv", "data/skip.txt"):
+        with open(os.path.join(folder, name), "w") as f:
+            f.write(name)
+    task = new_task(folder, "job", inputs=["data/**/*.csv"], skip_unchanged=True, **fields)
+    store.insert_task(task)
+    return task
+
+def test_input_files(store, workdir):
+    task = make_task(store, str(workdir))
+    assert fingerprint.input_files(task) == sorted([
+        str(workdir / "data" / "a.csv"), str(workdir / "data" / "sub" / "b.csv"), str(workdir / "job.py")])
+    # A folder means everything below it; a command has no script file
+    command = dict(task, inputs=["data"], command="echo hi")
+    assert len(fingerprint.input_files(command)) == 3
+
+def test_unchanged_until_an_input_changes(store, workdir):
+    fps = fingerprint.Fingerprints(store)
+    task = make_task(store, str(workdir))
+    first = fps.compute(task)
+    assert first[2] == 3
+    assert not fps.unchanged(task, first)
+    fps.record(task, first)
+    # Same sizes and times: nothing is read again
+    again = fps.compute(task)
+    assert again[0] == first[0] and again[2] == 0
+    assert fps.unchanged(task, again)
+    # Touched but equal content: re-hashed, still unchanged
+    path = str(workdir / "data" / "a.csv")
+    os.utime(path, ns=(0, 10**18))
+    touched = fps.compute(task)
+    assert touched[2] == 1 and fps.unchanged(task, touched)
+    with open(path, "a") as f:
+        f.write("more")
+    assert not fps.unchanged(task, fps.compute(task))
+    # The environment is part of it too
+    assert not fps.unchanged(dict(task, env={"X": "1"}), fps.compute(dict(task, env={"X": "1"})))
+
+def test_recorded_fingerprint_survives_restart(store, workdir):
+    task = make_task(store, str(workdir))
+    fps = fingerprint.Fingerprints(store)
+    fps.record(task, fps.compute(task))
+    reloaded = fingerprint.Fingerprints(store)
+    assert reloaded.compute(task)[2] == 0
+    assert reloaded.unchanged(task, reloaded.compute(task))
+    reloaded.forget(task["id"])
+    store.delete_task(task)
+    assert reloaded.last(task["id"]) is None
+
+def test_engine_skips_unchanged_scheduled_runs(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "skippy", skip_unchanged=True)
+    eng.add_task(task)
+    for _ in range(2):
+        eng._execute_task(task)
+    # Manual runs always run
+    eng._execute_task(task, manual=True)
+    assert [run["status"] for run in eng.store.runs(task["id"])] == ["ok", "unchanged", "ok"]
+    with open(task["file_path"], "a") as f:
+        f.write("print('changed')\n")
+    assert eng._execute_task(task) == "ok"
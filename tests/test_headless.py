@@ -0,0 +1,54 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from conftest import wait_for
+from task_store import TaskStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.skipif(os.name == "nt", reason="sends SIGTERM")
+def test_daemon_runs_tasks_and_stops_on_sigterm(workdir):
+    script = workdir / "tick.py"
+    script.write_text("print('tick')\n")
+    with open("settings.json", "w") as f:
+        json.dump({"search_index": False, "python_workers": 0}, f)
+    with open("tasks.json", "w") as f:
+        json.dump([{"name": "tick", "file_path": str(script), "cron_expr": "* * * * * */1",
+                    "status": "Active", "retention": 1, "log_executions": 1, "max_instances": 1}], f)
+    # Fails to start if anything on the daemon's import path needs tkinter
+    code = ("import sys, builtins\n"
+            "real = builtins.__import__\n"
+            "def guard(name, *args, **kwargs):\n"
+            "    if name.split('.')[0] in ('tkinter', '_tkinter'):\n"
+            "        raise ImportError('tkinter imported by the daemon')\n"
+            "    return real(name, *args, **kwargs)\n"
+            "builtins.__import__ = guard\n"
+            "sys.argv = ['task_runner.py', '--headless']\n"
+            f"sys.path.insert(0, {ROOT!r})\n"
+            "import runpy\n"
+            f"runpy.run_path({os.path.join(ROOT, 'task_runner.py')!r}, run_name='__main__')\n")
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        assert wait_for(lambda: os.path.exists(os.path.join("logs", "tick", "index.json")) or proc.poll() is not None,
+                        timeout=15)
+        assert proc.poll() is None, proc.stderr.read().decode()
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(15) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stderr.close()
+    # tasks.json was imported into the database on start, and the task ran
+    store = TaskStore("tasks.db")
+    try:
+        [task] = store.load_tasks()
+        assert task["name"] == "tick"
+        assert store.runs(task["id"])
+    finally:
+        store.close()
@@ -0,0 +1,104 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+import limits
+from conftest import new_task
+
+posix = pytest.mark.skipif(os.name == "nt", reason="POSIX process groups and rlimits")
+
+def test_task_limit():
+    assert limits.task_limit({"timeout": "30"}, "timeout") == 30
+    assert limits.task_limit({"timeout": -5}, "timeout") == 0
+    assert limits.task_limit({"timeout": "soon"}, "timeout") == 0
+    assert limits.task_limit({}, "timeout") == 0
+
+@posix
+def test_run_status():
+    assert limits.run_status(0) == "ok"
+    assert limits.run_status(1) == "failed"
+    assert limits.run_status(None) == "error"
+    assert limits.run_status(0, timed_out=True) == "timeout"
+    assert limits.run_status(-signal.SIGXCPU) == "cpu_limit"
+    assert limits.run_status(128 + signal.SIGKILL) == "killed"
+    assert limits.run_status(-signal.SIGTERM) == "killed"
+
+def test_wrap_command_without_io_priority():
+    assert limits.wrap_command({}, 'python "x.py"') == 'python "x.py"'
+    assert limits.io_prefix({"io_priority": "normal"}) == []
+
+@posix
+def test_popen_kwargs():
+    assert limits.popen_kwargs({}) == {"start_new_session": True}
+    assert limits.popen_kwargs({"mem_limit_mb": 256}) == {"start_new_session": True}
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="prlimit")
+def test_apply_limits_to_started_process():
+    import resource
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"], **limits.popen_kwargs({}))
+    try:
+        niceness = os.getpriority(os.PRIO_PROCESS, proc.pid)
+        limits.apply_limits({"cpu_limit": 7, "mem_limit_mb": 4096, "max_open_files": 64, "nice": 3}, proc.pid)
+        assert resource.prlimit(proc.pid, resource.RLIMIT_CPU) == (7, 7 + limits.KILL_GRACE)
+        assert resource.prlimit(proc.pid, resource.RLIMIT_AS) == (4096 * 2**20,) * 2
+        assert resource.prlimit(proc.pid, resource.RLIMIT_NOFILE) == (64, 64)
+        assert os.getpriority(os.PRIO_PROCESS, proc.pid) == min(19, niceness + 3)
+    finally:
+        proc.kill()
+        proc.wait()
+    # Gone already: nothing to do
+    limits.apply_limits({"cpu_limit": 7}, proc.pid)
+
+@posix
+def test_terminate_tree_kills_grandchildren():
+    # The shell starts a grandchild in the same session: both must go
+    proc = subprocess.Popen(["/bin/sh", "-c", "sleep 30 & echo $!; wait"], stdout=subprocess.PIPE,
+                            **limits.popen_kwargs({}))
+    grandchild = int(proc.stdout.readline())
+    limits.terminate_tree(proc, grace=1)
+    proc.wait(5)
+    proc.stdout.close()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(grandchild, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("grandchild survived")
+
+def test_watchdog_fires_only_on_timeout():
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"], **limits.popen_kwargs({}))
+    watchdog = limits.Watchdog(proc, 0.2)
+    assert proc.wait(10) != 0
+    assert watchdog.fired
+    quick = subprocess.Popen([sys.executable, "-c", "pass"])
+    watchdog = limits.Watchdog(quick, 5)
+    quick.wait(10)
+    watchdog.cancel()
+    assert not watchdog.fired
+
+def test_engine_timeout_is_recorded(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "slow", script="import time\ntime.sleep(30)\n", timeout=1)
+    eng.add_task(task)
+    eng.run_task(task)
+    assert eng.pool.wait_idle(15)
+    assert eng.store.runs(task["id"])[0]["status"] == "timeout"
+    entry = eng.log_store.executions(task)[-1]
+    with open(eng.log_store.segment_path(task, entry), encoding="utf-8") as f:
+        assert "==== KILLED (timeout after 1s" in f.read()
+
+@posix
+def test_engine_cpu_limit(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "spin", script="while True:\n    pass\n", cpu_limit=1, timeout=30)
+    eng.add_task(task)
+    eng.run_task(task)
+    assert eng.pool.wait_idle(20)
+    assert eng.store.runs(task["id"])[0]["status"] == "cpu_limit"
@@ -0,0 +1,87 @@
+import io
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import log_archive
+from conftest import wait_for
+from task_core import LogStore
+
+TASK = {"name": "archived", "log_executions": 1, "retention": 1}
+
+def write_segment(store, text):
+    entry, path = store.open_segment(TASK, "scheduled")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    store.close_segment(TASK, entry, 0, "ok")
+    return entry
+
+def read_archived(store, entry):
+    out = io.BytesIO()
+    store.open_archived(TASK, entry, out)
+    return out.getvalue().decode()
+
+@pytest.fixture
+def store(workdir):
+    return LogStore(archiver=log_archive.LogArchiver(keep_days=30))
+
+def test_trimmed_segments_are_archived(store):
+    for i in range(3):
+        write_segment(store, f"run {i}\n" * 1000)
+    # The two oldest leave the hot window and end up in the archive
+    assert wait_for(lambda: len(log_archive.archive_entries(store.task_dir(TASK))) == 2)
+    assert wait_for(lambda: [e["seq"] for e in store.executions(TASK)] == [3])
+    assert sorted(os.listdir(store.task_dir(TASK))) == ["00000003.log", "archive", "index.json"]
+    entries = store.executions(TASK, archived=True)
+    assert [e["seq"] for e in entries] == [1, 2, 3]
+    assert "archive" in entries[0] and "archive" not in entries[2]
+    # Each execution is read back from its own gzip member
+    assert read_archived(store, entries[1]) == "run 1\n" * 1000
+    assert read_archived(store, entries[0]) == "run 0\n" * 1000
+
+def test_reused_numbers_are_kept_apart(store):
+    write_segment(store, "old\n")
+    write_segment(store, "new\n")
+    assert wait_for(lambda: log_archive.archive_entries(store.task_dir(TASK)))
+    [archived] = log_archive.archive_entries(store.task_dir(TASK))
+    # Earlier executions that got the same numbers before the counter was kept
+    with open(os.path.join(log_archive.archive_dir(store.task_dir(TASK)), log_archive.INDEX_FILE), "a") as f:
+        for seq, start in ((1, "2000-01-01 00:00:00"), (2, "2000-01-02 00:00:00")):
+            f.write(json.dumps(dict(archived, seq=seq, start=start)) + "\n")
+    entries = store.executions(TASK, archived=True)
+    assert [(e["seq"], e["start"][:4]) for e in entries] == [
+        (1, "2000"), (2, "2000"), (1, archived["start"][:4]), (2, archived["start"][:4])]
+    assert "archive" not in entries[-1]
+
+def test_torn_index_line_is_skipped(store):
+    write_segment(store, "first\n")
+    write_segment(store, "second\n")
+    assert wait_for(lambda: log_archive.archive_entries(store.task_dir(TASK)))
+    with open(os.path.join(log_archive.archive_dir(store.task_dir(TASK)), log_archive.INDEX_FILE), "a") as f:
+        f.write('{"seq": 9, "arch')
+    [entry] = log_archive.archive_entries(store.task_dir(TASK))
+    assert entry["seq"] == 1
+
+def test_truncated_archive_is_an_error(store):
+    write_segment(store, "x" * 100000)
+    write_segment(store, "y\n")
+    assert wait_for(lambda: log_archive.archive_entries(store.task_dir(TASK)))
+    [entry] = log_archive.archive_entries(store.task_dir(TASK))
+    path = os.path.join(log_archive.archive_dir(store.task_dir(TASK)), entry["archive"])
+    with open(path, "r+b") as f:
+        f.truncate(entry["offset"] + entry["length"] // 2)
+    with pytest.raises(OSError, match="truncated"):
+        read_archived(store, entry)
+
+def test_expire_drops_old_months(store):
+    write_segment(store, "old\n")
+    write_segment(store, "new\n")
+    assert wait_for(lambda: log_archive.archive_entries(store.task_dir(TASK)))
+    archiver = store.archiver
+    now = datetime.now()
+    assert archiver.expire(store.task_dir(TASK), now) == 0
+    assert archiver.expire(store.task_dir(TASK), now.replace(year=now.year + 1)) == 1
+    assert log_archive.archive_entries(store.task_dir(TASK)) == []
+    assert os.listdir(log_archive.archive_dir(store.task_dir(TASK))) == [log_archive.INDEX_FILE]
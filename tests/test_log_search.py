@@ -0,0 +1,134 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import log_search
+from conftest import wait_for
+from task_core import LogStore
+
+def fts5_available():
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE t USING fts5(body)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+pytestmark = pytest.mark.skipif(not fts5_available(), reason="SQLite without FTS5")
+
+def write_segment(store, task, text, exit_code=0):
+    entry, path = store.open_segment(task, "scheduled")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    store.close_segment(task, entry, exit_code, "ok" if exit_code == 0 else "failed")
+    return entry
+
+@pytest.fixture
+def indexed(workdir):
+    # A log store whose finished segments are indexed; returns (store, conn)
+    indexer = log_search.SearchIndexer("search.db", max_bytes=1000)
+    store = LogStore(indexer=indexer)
+    conn = log_search.connect("search.db")
+    yield store, conn
+    conn.close()
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM executions").fetchone()[0]
+
+def test_finished_segments_are_searchable(indexed):
+    store, conn = indexed
+    backup = {"id": 1, "name": "backup", "log_executions": 5}
+    report = {"id": 2, "name": "report", "log_executions": 5}
+    write_segment(store, backup, "Connection TIMEOUT after 30s\n", exit_code=1)
+    write_segment(store, backup, "all good\n")
+    write_segment(store, report, "timeout reading data\n")
+    assert wait_for(lambda: count(conn) == 3)
+    # Substrings match case-insensitively
+    hits = log_search.search(conn, "timeout")
+    assert sorted((h["task"], h["seq"]) for h in hits) == [("backup", 1), ("report", 1)]
+    assert "[" in hits[0]["snippet"]
+    assert [h["task"] for h in log_search.search(conn, "timeout", task="backup")] == ["backup"]
+    assert [h["seq"] for h in log_search.search(conn, "timeout", status="failed")] == [1]
+    assert [h["seq"] for h in log_search.search(conn, task="backup")] == [2, 1]
+    # Not valid FTS5 syntax: searched for literally
+    assert log_search.search(conn, 'after "30s') == []
+    assert len(log_search.search(conn, "TIMEOUT after")) == 1
+
+def test_runs_after_a_full_sweep_are_indexed(indexed):
+    store, conn = indexed
+    task = {"id": 1, "name": "nightly", "log_executions": 5, "retention": 1}
+    write_segment(store, task, "Backup done\n")
+    assert wait_for(lambda: count(conn) == 1)
+    store.sweep([task], now=datetime.now() + timedelta(days=2))
+    write_segment(store, task, "Disk full\n")
+    assert wait_for(lambda: count(conn) == 2)
+    assert [h["task"] for h in log_search.search(conn, "Disk full")] == ["nightly"]
+    # An execution that got a number already used before is indexed too
+    [entry] = store.executions(task)
+    earlier = (datetime.now() - timedelta(hours=1)).strftime(log_search.TIME_FORMAT)
+    store.indexer.submit(store, task, dict(entry, start=earlier))
+    assert wait_for(lambda: count(conn) == 3)
+
+def test_old_index_is_rebuilt_without_the_number_key(workdir):
+    conn = sqlite3.connect("search.db")
+    conn.executescript("CREATE TABLE executions (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER,"
+                       " task TEXT NOT NULL, seq INTEGER NOT NULL, kind TEXT, started TEXT, ended TEXT,"
+                       " exit_code INTEGER, status TEXT, bytes INTEGER, UNIQUE (task, seq));"
+                       "INSERT INTO executions (task, seq, started) VALUES ('job', 1, '2024-01-01 00:00:00');")
+    conn.close()
+    conn = log_search.connect("search.db")
+    try:
+        with conn:
+            conn.execute("INSERT INTO executions (task, seq, started) VALUES ('job', 1, '2024-02-01 00:00:00')")
+        assert [h["started"] for h in log_search.search(conn, task="job")] == [
+            "2024-02-01 00:00:00", "2024-01-01 00:00:00"]
+    finally:
+        conn.close()
+    # Opening it again leaves it as it is
+    log_search.connect("search.db").close()
+
+def test_large_output_keeps_head_and_tail(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_bytes(b"head" + b"x" * 5000 + b"tail")
+    text = log_search.read_capped(str(path), 100)
+    assert text.startswith("head") and text.endswith("tail")
+    assert len(text) < 120
+    assert log_search.read_capped(str(path), 0) == path.read_text()
+
+def test_backfill_and_prune(workdir):
+    task = {"id": 1, "name": "old", "log_executions": 5}
+    store = LogStore()
+    write_segment(store, task, "written before indexing\n")
+    indexer = log_search.SearchIndexer("search.db", keep_days=1)
+    store.indexer = indexer
+    indexer.backfill(store, [task])
+    conn = log_search.connect("search.db")
+    try:
+        assert wait_for(lambda: count(conn) == 1)
+        assert log_search.search(conn, "before indexing")[0]["task"] == "old"
+        # Indexing the same segment again adds nothing
+        indexer.submit(store, task, store.executions(task)[0])
+        indexer.backfill(store, [task])
+        done = threading.Event()
+        indexer._queue.put((done.set, ()))
+        assert done.wait(5) and count(conn) == 1
+        with conn:
+            conn.execute("UPDATE executions SET started = '2000-01-01 00:00:00'")
+        indexer._queue.put((indexer.prune, ()))
+        assert wait_for(lambda: count(conn) == 0)
+    finally:
+        conn.close()
+
+def test_command_line(indexed, capsys):
+    store, conn = indexed
+    write_segment(store, {"id": 1, "name": "job", "log_executions": 5}, "needle in the output\n")
+    assert wait_for(lambda: count(conn) == 1)
+    assert log_search.main(["needle", "--json", "--db", "search.db"]) == 0
+    [line] = capsys.readouterr().out.splitlines()
+    assert json.loads(line)["task"] == "job"
+    assert log_search.main(["needle", "--db", "missing.db"]) == 1
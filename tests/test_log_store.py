@@ -0,0 +1,89 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from task_core import LogStore, TIME_FORMAT
+
+TASK = {"name": "My Task!", "log_executions": 2, "retention": 1}
+
+def write_segment(store, task, text, exit_code=0):
+    entry, path = store.open_segment(task, "scheduled")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    store.close_segment(task, entry, exit_code, "ok" if exit_code == 0 else "failed")
+    return entry
+
+def test_segments_are_indexed(workdir):
+    store = LogStore()
+    entry = write_segment(store, TASK, "first\n")
+    assert entry["file"] == "00000001.log"
+    assert store.task_dir(TASK) == os.path.join("logs", "my_task_")
+    [listed] = store.executions(TASK)
+    assert (listed["seq"], listed["exit_code"], listed["status"], listed["bytes"]) == (1, 0, "ok", 6)
+    # The index on disk survives a restart
+    assert LogStore().executions(TASK) == [listed]
+
+def test_trim_keeps_last_executions(workdir):
+    store = LogStore()
+    for i in range(4):
+        write_segment(store, TASK, f"run {i}\n")
+    entries = store.executions(TASK)
+    assert [e["seq"] for e in entries] == [3, 4]
+    assert sorted(os.listdir(store.task_dir(TASK))) == ["00000003.log", "00000004.log", "index.json"]
+
+def test_running_segment_is_never_trimmed(workdir):
+    store = LogStore()
+    task = dict(TASK, log_executions=1)
+    running, _ = store.open_segment(task, "manual")
+    write_segment(store, task, "a\n")
+    write_segment(store, task, "b\n")
+    seqs = [e["seq"] for e in store.executions(task)]
+    assert running["seq"] in seqs
+    assert seqs[-1] == 3
+
+def test_sweep_applies_retention(workdir):
+    store = LogStore()
+    write_segment(store, TASK, "old\n")
+    assert store.sweep([TASK]) == 0
+    assert store.sweep([TASK], now=datetime.now() + timedelta(days=2)) == 1
+    assert store.executions(TASK) == []
+
+def test_numbers_are_not_reused_after_a_full_sweep(workdir):
+    store = LogStore()
+    write_segment(store, TASK, "one\n")
+    write_segment(store, TASK, "two\n")
+    assert store.sweep([TASK], now=datetime.now() + timedelta(days=2)) == 2
+    assert store.executions(TASK) == []
+    assert write_segment(store, TASK, "three\n")["seq"] == 3
+    # The counter is kept in index.json across restarts
+    assert write_segment(LogStore(), TASK, "four\n")["seq"] == 4
+
+def test_index_without_counter_continues_after_last_entry(workdir):
+    os.makedirs(os.path.join("logs", "my_task_"))
+    with open(os.path.join("logs", "my_task_", "index.json"), "w") as f:
+        json.dump([{"seq": 7, "file": "00000007.log", "kind": "scheduled", "start": "2024-01-01 00:00:00",
+                    "end": "2024-01-01 00:00:01", "exit_code": 0, "bytes": 0}], f)
+    assert write_segment(LogStore(), TASK, "next\n")["seq"] == 8
+
+def test_migrates_legacy_log(workdir):
+    with open("my_task_.log", "w", encoding="utf-8") as f:
+        f.write("old output\n")
+    store = LogStore()
+    [entry] = store.executions(TASK)
+    assert (entry["kind"], entry["file"]) == ("legacy", "legacy.log")
+    assert not os.path.exists("my_task_.log")
+    with open(store.segment_path(TASK, entry), encoding="utf-8") as f:
+        assert f.read() == "old output\n"
+    # New executions follow it
+    assert write_segment(store, TASK, "new\n")["seq"] == 1
+
+def test_corrupt_index_starts_over(workdir):
+    os.makedirs(os.path.join("logs", "my_task_"))
+    with open(os.path.join("logs", "my_task_", "index.json"), "w") as f:
+        f.write("{not json")
+    store = LogStore()
+    assert store.executions(TASK) == []
+    write_segment(store, TASK, "fresh\n")
+    with open(os.path.join("logs", "my_task_", "index.json")) as f:
+        assert [e["seq"] for e in json.load(f)["entries"]] == [1]
+    assert datetime.strptime(store.executions(TASK)[0]["end"], TIME_FORMAT)
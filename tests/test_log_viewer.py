@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("tkinter")  # log_viewer imports it at the top
+
+import log_viewer
+from log_viewer import LineIndex, MappedLog
+
+def build(buf):
+    index = LineIndex()
+    while index.extend(buf, len(buf)):
+        pass
+    return index
+
+def test_offsets_and_lines(monkeypatch):
+    monkeypatch.setattr(log_viewer, "INDEX_CHUNK", 1000)  # several extend() steps
+    lines = [f"line {i}".encode() for i in range(500)]
+    buf = b"\n".join(lines) + b"\n"
+    index = build(buf)
+    assert index.lines == 501  # the empty line after the last newline
+    for n in (0, 1, 63, 64, 65, 200, 499):
+        start = index.offset(buf, n)
+        assert buf[start:buf.index(b"\n", start)] == lines[n]
+        assert index.line_of(buf, start) == n
+        assert index.line_of(buf, start + 3) == n
+    assert index.offset(buf, 10_000) == len(buf)
+    assert not index.extend(buf, len(buf))
+
+def test_index_grows_with_the_file(workdir):
+    path = workdir / "segment.log"
+    path.write_bytes(b"")
+    log = MappedLog(str(path))
+    try:
+        assert log.buf == b""
+        index = LineIndex()
+        assert not index.extend(log.buf, len(log.buf))
+        with open(path, "ab") as f:
+            f.write(b"a\nb\n")
+        assert log.remap()
+        assert not log.remap()
+        index.extend(log.buf, len(log.buf))
+        with open(path, "ab") as f:
+            f.write(b"c\n")
+        log.remap()
+        index.extend(log.buf, len(log.buf))
+        assert index.lines == 4
+        assert log.buf[index.offset(log.buf, 2):] == b"c\n"
+    finally:
+        log.close()
@@ -0,0 +1,63 @@
+import http.client
+import os
+
+import pytest
+
+import metrics
+from conftest import new_task
+
+def test_histograms_and_counters():
+    m = metrics.Metrics()
+    m.observe_run("a", {"wall": 0.3, "cpu_user": 0.1, "cpu_sys": 0.05, "max_rss_mb": 20, "exit_code": 0, "lag": 0.002})
+    m.observe_run("a", {"wall": 7, "exit_code": 2})
+    m.observe_run('we"ird', {"status": "unchanged"})
+    text = m.render()
+    assert 'taskrunner_run_duration_seconds_bucket{task="a",le="0.5"} 1' in text
+    assert 'taskrunner_run_duration_seconds_bucket{task="a",le="+Inf"} 2' in text
+    assert 'taskrunner_run_duration_seconds_sum{task="a"} 7.300000' in text
+    assert 'taskrunner_run_cpu_seconds_count{task="a"} 1' in text
+    assert 'taskrunner_run_max_rss_megabytes_bucket{task="a",le="32"} 1' in text
+    assert 'taskrunner_runs_total{task="a",status="ok"} 1' in text
+    assert 'taskrunner_runs_total{task="a",status="failed"} 1' in text
+    assert 'taskrunner_runs_total{task="we\\"ird",status="unchanged"} 1' in text
+    assert 'taskrunner_last_exit_code{task="a"} 2' in text
+    m.forget("a")
+    assert 'task="a"' not in m.render()
+
+def test_gauges_and_file(tmp_path):
+    m = metrics.Metrics(gauges=lambda: [("taskrunner_queued", "Queued runs", 3)])
+    path = str(tmp_path / "runner.prom")
+    m.write_file(path)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    assert "# TYPE taskrunner_queued gauge\ntaskrunner_queued 3\n" in text
+
+def test_http_endpoint():
+    m = metrics.Metrics()
+    m.observe_run("a", {"wall": 1, "exit_code": 0})
+    server = metrics.serve(m, 0)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert 'taskrunner_runs_total{task="a",status="ok"} 1' in response.read().decode()
+        conn.request("GET", "/other")
+        assert conn.getresponse().status == 404
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="needs wait4 for CPU and memory")
+def test_engine_records_usage(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "busy", script="sum(range(10**6))\n")
+    eng.add_task(task)
+    eng.run_task(task)
+    assert eng.pool.wait_idle(10)
+    run = eng.store.runs(task["id"])[0]
+    assert run["cpu_user"] is not None and run["max_rss_mb"] > 0
+    text = eng.metrics.render()
+    assert 'taskrunner_runs_total{task="busy",status="ok"} 1' in text
+    assert "taskrunner_tasks 1\n" in text
@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import misfire
+from conftest import new_task, wait_for
+
+DUE = datetime(2024, 1, 1, 10, 0)
+
+def test_task_settings_fall_back_to_defaults():
+    assert misfire.policy({}, "skip") == "skip"
+    assert misfire.policy({"misfire": "catchup"}, "skip") == "catchup"
+    assert misfire.policy({"misfire": "bogus"}) == "coalesce"
+    assert misfire.grace({"misfire_grace": ""}, 30) == 30
+    assert misfire.grace({"misfire_grace": 5}, 30) == 5
+    assert misfire.catchup_max({"catchup_max": 0}) == 1
+
+def test_jitter_is_fixed_per_task():
+    offsets = {misfire.jitter_offset({"id": i}, 10) for i in range(50)}
+    assert all(0 <= offset <= 10 for offset in offsets)
+    assert len(offsets) > 25  # spread out
+    assert misfire.jitter_offset({"id": 7}, 10) == misfire.jitter_offset({"id": 7}, 10)
+    assert misfire.jitter_offset({"id": 7, "jitter": 0}, 10) == 0.0
+    assert misfire.jitter_offset({"id": 7}) == 0.0
+
+def test_missed_and_catchup_times():
+    now = DUE + timedelta(minutes=10, seconds=30)
+    assert misfire.count_missed("* * * * *", DUE, now) == "11"
+    assert misfire.count_missed("* * * * * *", DUE - timedelta(days=1), now) == "1000+"
+    times = misfire.catchup_times("* * * * *", DUE, now, now - timedelta(minutes=3), 10)
+    assert times == [DUE + timedelta(minutes=m) for m in (8, 9, 10)]
+    # At most `limit`, the latest ones
+    times = misfire.catchup_times("* * * * *", DUE, now, DUE, 2)
+    assert times == [DUE + timedelta(minutes=9), DUE + timedelta(minutes=10)]
+
+def test_start_limiter():
+    limiter = misfire.StartLimiter(rate=10, burst=2)
+    assert limiter.reserve() == 0 and limiter.reserve() == 0
+    third, fourth = limiter.reserve(), limiter.reserve()
+    assert 0.05 < third <= 0.1 < fourth <= 0.2
+    stats = limiter.stats()
+    assert stats["delayed"] == 2 and stats["delay_max"] == fourth
+    time.sleep(0.3)
+    assert limiter.reserve() == 0
+
+@pytest.mark.parametrize("policy, expected", [
+    ("coalesce", [DUE]),
+    ("skip", []),
+    ("catchup", [DUE + timedelta(minutes=m) for m in (4, 5)]),
+])
+def test_engine_due_runs(engine, workdir, policy, expected):
+    eng = engine(misfire_grace_seconds=90, catchup_max=3)
+    task = new_task(str(workdir), "late", "* * * * *", misfire=policy)
+    eng.add_task(task)
+    now = DUE + timedelta(minutes=5, seconds=30)
+    lag = (now - DUE).total_seconds()
+    assert eng._due_runs(task, DUE, now, lag, 0) == expected
+    # On time: always exactly the due time
+    assert eng._due_runs(task, now, now, 0, 0) == [now]
+    assert sum(eng.misfires.values()) >= 1
+
+def test_jitter_longer_than_interval_catches_up_nothing(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "jittered", "* * * * *", misfire="catchup", jitter=90)
+    eng.add_task(task)
+    # Each fire comes 90s after its due time, on time: only that time runs
+    for minute in range(3):
+        due = DUE + timedelta(minutes=minute)
+        assert eng._due_runs(task, due, due + timedelta(seconds=90), 0, 90) == [due]
+    assert sum(eng.misfires.values()) == 0
+
+def test_engine_runs_late_task_once(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "coalesced", "* * * * *")
+    eng.add_task(task)
+    eng.scheduler.schedule(task["id"], datetime.now() - timedelta(minutes=30), task)
+    assert wait_for(lambda: eng.store.runs(task["id"]))
+    assert eng.pool.wait_idle(10)
+    assert len(eng.store.runs(task["id"])) == 1
+    assert eng.misfires["coalesced"] == 1
+    assert datetime.strptime(task["next_run"], "%Y-%m-%d %H:%M:%S") > datetime.now()
@@ -0,0 +1,75 @@
+import io
+import subprocess
+import sys
+
+from conftest import new_task
+from task_core import LiveTail, OutputCapture, stream_output, wait_with_usage
+
+def capture(chunks, max_bytes=0, tail=None):
+    written = []
+    out = OutputCapture(written.append, tail, max_bytes)
+    for chunk in chunks:
+        out.feed(chunk)
+    total, dropped = out.close()
+    return "".join(written), total, dropped
+
+def test_decodes_across_chunk_boundaries():
+    data = "héllo\r\nwörld\n".encode("utf-8")
+    # Split inside a multi-byte character and between \r and \n
+    text, total, dropped = capture([data[:2], data[2:7], data[7:]])
+    assert text == "héllo\nwörld\n"
+    assert (total, dropped) == (len(data), 0)
+
+def test_cap_keeps_head_and_tail():
+    data = b"".join(f"{i:04d}\n".encode() for i in range(1000))
+    tail = LiveTail()
+    text, total, dropped = capture([data[i:i + 100] for i in range(0, len(data), 100)], max_bytes=100, tail=tail)
+    assert total == len(data)
+    assert dropped == len(data) - 100
+    assert text.startswith("0000\n")
+    assert f"[... {dropped} bytes truncated ...]" in text
+    assert text.endswith("0999\n")
+    # Followers still see everything as it arrives, up to the tail's ring
+    assert tail.read()[0].endswith("0999\n")
+
+def test_under_cap_is_unchanged():
+    text, total, dropped = capture([b"short\n"], max_bytes=100)
+    assert (text, total, dropped) == ("short\n", 6, 0)
+
+def test_live_tail_ring():
+    tail = LiveTail(max_chars=10)
+    for i in range(10):
+        tail.write(f"{i}" * 4)
+    text, pos, skipped = tail.read(0)
+    assert pos == 40
+    assert text.endswith("9999") and len(text) <= 14
+    assert skipped == 40 - len(text)
+    # Nothing new: a follower waiting with a timeout gets no text
+    assert tail.read(pos, timeout=0.01) == ("", 40, 0)
+
+def test_stream_output_from_process():
+    proc = subprocess.Popen([sys.executable, "-c", "import sys\nfor i in range(3): print(i, flush=True)\nsys.exit(3)"],
+                            stdout=subprocess.PIPE)
+    out = io.StringIO()
+    with proc:
+        total, dropped = stream_output(proc.stdout, out.write)
+        exit_code, usage = wait_with_usage(proc)
+    assert out.getvalue() == "0\n1\n2\n"
+    assert (total, dropped) == (6, 0)
+    assert exit_code == 3
+    assert set(usage) == {"cpu_user", "cpu_sys", "max_rss_mb"}
+
+def test_engine_run_writes_output_and_trailer(engine, workdir):
+    eng = engine(max_output_bytes=64)
+    task = new_task(str(workdir), "noisy", script="print('x' * 1000)\nraise SystemExit(2)\n")
+    eng.add_task(task)
+    eng.run_task(task)
+    assert eng.pool.wait_idle(10)
+    run = eng.store.runs(task["id"])[0]
+    assert (run["exit_code"], run["status"]) == (2, "failed")
+    entry = eng.log_store.executions(task)[-1]
+    with open(eng.log_store.segment_path(task, entry), encoding="utf-8") as f:
+        text = f.read()
+    assert "==== MANUAL EXECUTION" in text
+    assert "bytes truncated" in text
+    assert "KILLED" not in text
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from conftest import new_task, wait_for
+from py_workers import WarmPool
+
+@pytest.fixture
+def pool():
+    pool = WarmPool(size=1, max_runs=3)
+    yield pool
+    pool.close()
+
+def run(pool, path, env=None):
+    with pool.run(str(path), os.path.dirname(str(path)), env) as job:
+        output = b""
+        while True:
+            data = job.stdout.read1(65536)
+            if not data:
+                break
+            output += data
+        return job.wait(), output.decode(), job.usage()
+
+def test_runs_script_in_warm_worker(pool, tmp_path):
+    script = tmp_path / "job.py"
+    script.write_text("import os, sys\nprint(os.environ['GREETING'], os.getcwd())\n"
+                      "print('to stderr', file=sys.stderr)\nsys.exit(3)\n")
+    exit_code, output, usage = run(pool, script, {"GREETING": "hi"})
+    assert exit_code == 3
+    assert f"hi {tmp_path}\n" in output
+    assert "to stderr\n" in output
+    assert set(usage) == {"cpu_user", "cpu_sys", "max_rss_mb"}
+    # The variable was set for that job only
+    script.write_text("import os\nprint(os.environ.get('GREETING'))\n")
+    assert run(pool, script)[:2] == (0, "None\n")
+
+def test_workers_are_reused_then_recycled(pool, tmp_path):
+    script = tmp_path / "ok.py"
+    script.write_text("print('ok')\n")
+    for _ in range(2):
+        assert run(pool, script)[:2] == (0, "ok\n")
+    assert pool.stats()["started"] == 1
+    # The third run reaches max_runs: the worker is replaced in the background
+    assert run(pool, script)[:2] == (0, "ok\n")
+    assert pool.stats()["recycled"] == 1
+    assert wait_for(lambda: pool.stats()["idle"] == 1)
+    assert pool.stats()["started"] == 2
+
+def test_jobs_import_their_own_modules(pool, tmp_path):
+    for name in ("first", "second"):
+        folder = tmp_path / name
+        folder.mkdir()
+        (folder / "utils.py").write_text(f"NAME = {name!r}\n")
+        (folder / "job.py").write_text("import utils\nprint(utils.NAME)\n")
+    assert run(pool, tmp_path / "first" / "job.py")[:2] == (0, "first\n")
+    assert run(pool, tmp_path / "second" / "job.py")[:2] == (0, "second\n")
+    assert pool.stats()["started"] == 1
+
+def test_exception_and_kill(pool, tmp_path):
+    failing = tmp_path / "fail.py"
+    failing.write_text("raise RuntimeError('boom')\n")
+    exit_code, output, _ = run(pool, failing)
+    assert exit_code == 1
+    assert "RuntimeError: boom" in output
+    slow = tmp_path / "slow.py"
+    slow.write_text("import time\nprint('started', flush=True)\ntime.sleep(30)\n")
+    with pool.run(str(slow), str(tmp_path)) as job:
+        output = b""
+        while not output.endswith(b"\n"):
+            output += job.stdout.read1()  # print() may arrive in two frames
+        assert output == b"started\n"
+        job.kill()
+        assert job.stdout.read1() == b""
+        assert job.wait() == -9
+    # The killed worker is not handed out again
+    assert run(pool, failing)[0] == 1
+
+def test_engine_runs_warm_task(engine, workdir):
+    eng = engine(python_workers=1)
+    task = new_task(str(workdir), "warm", script="print('warm run')\n", warm_python=True)
+    eng.add_task(task)
+    eng.run_task(task)
+    assert eng.pool.wait_idle(15)
+    run_row = eng.store.runs(task["id"])[0]
+    assert (run_row["exit_code"], run_row["status"]) == (0, "ok")
+    entry = eng.log_store.executions(task)[-1]
+    with open(eng.log_store.segment_path(task, entry), encoding="utf-8") as f:
+        assert "warm run" in f.read()
+    assert eng.warm_pool.stats()["started"] >= 1
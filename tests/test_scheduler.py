@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import new_task, wait_for
+from task_core import TimerHeapScheduler
+
+@pytest.fixture
+def scheduler():
+    # A running scheduler recording (key, item) in firing order
+    fired = []
+    sched = TimerHeapScheduler(lambda key, item, when: fired.append((key, item)))
+    thread = threading.Thread(target=sched.run, daemon=True)
+    thread.start()
+    yield sched, fired
+    sched.stop()
+    thread.join(5)
+
+def test_fires_in_time_order(scheduler):
+    sched, fired = scheduler
+    now = datetime.now()
+    sched.schedule("c", now + timedelta(seconds=0.3), 3)
+    sched.schedule("a", now + timedelta(seconds=0.1), 1)
+    sched.schedule("b", now + timedelta(seconds=0.2), 2)
+    assert wait_for(lambda: len(fired) == 3)
+    assert fired == [("a", 1), ("b", 2), ("c", 3)]
+    assert len(sched) == 0
+    assert sched.lag_stats()["count"] == 3
+
+def test_reschedule_and_unschedule(scheduler):
+    sched, fired = scheduler
+    now = datetime.now()
+    sched.schedule("moved", now + timedelta(hours=1), "late")
+    sched.schedule("gone", now + timedelta(seconds=0.1))
+    sched.unschedule("gone")
+    # An earlier time wakes the sleeping loop; the old entry never fires
+    sched.schedule("moved", now + timedelta(seconds=0.1), "early")
+    assert wait_for(lambda: fired)
+    assert fired == [("moved", "early")]
+    assert sched.next_fire_time() is None
+
+def test_schedule_many_keeps_existing_entries():
+    sched = TimerHeapScheduler(lambda key, item, when: None)
+    now = datetime.now()
+    sched.schedule("a", now + timedelta(minutes=1), "kept")
+    sched.schedule_many([("a", now, "ignored"), ("b", now + timedelta(minutes=2), None), ("c", None, None)])
+    assert len(sched) == 2
+    assert sched.next_fire_time() == now + timedelta(minutes=1)
+
+def test_lazy_deletion_compacts_heap():
+    sched = TimerHeapScheduler(lambda key, item, when: None)
+    now = datetime.now()
+    for i in range(200):
+        sched.schedule(i, now + timedelta(minutes=i))
+    for i in range(150):
+        sched.unschedule(i)
+    assert len(sched) == 50
+    assert len(sched._heap) < 200
+    assert sched.next_fire_time() == now + timedelta(minutes=150)
+
+def test_dispatch_error_does_not_stop_loop():
+    fired = []
+    def on_due(key, item, when):
+        if key == "bad":
+            raise RuntimeError("boom")
+        fired.append(key)
+    sched = TimerHeapScheduler(on_due)
+    thread = threading.Thread(target=sched.run, daemon=True)
+    thread.start()
+    try:
+        now = datetime.now()
+        sched.schedule("bad", now)
+        sched.schedule("good", now + timedelta(seconds=0.1))
+        assert wait_for(lambda: fired == ["good"])
+    finally:
+        sched.stop()
+        thread.join(5)
+
+def test_engine_runs_due_task(engine, workdir):
+    eng = engine()
+    task = new_task(str(workdir), "due")
+    eng.add_task(task)
+    # Due now: the engine's scheduler fires it and computes the next run
+    eng.scheduler.schedule(task["id"], datetime.now(), task)
+    assert wait_for(lambda: eng.store.runs(task["id"]) and eng.store.runs(task["id"])[0]["ended"])
+    assert eng.store.runs(task["id"])[0]["kind"] == "scheduled"
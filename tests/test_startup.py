@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import task_core
+from conftest import make_engine, new_task, wait_for
+from task_store import TaskStore
+
+def test_parse_time():
+    assert task_core.parse_time("2024-01-02 03:04:05") == datetime(2024, 1, 2, 3, 4, 5)
+    for bad in (None, "-", "", "2024-01-02", "2024-01-02T03:04:05.123"):
+        with pytest.raises(ValueError):
+            task_core.parse_time(bad)
+
+def test_only_tasks_due_soon_are_scheduled_at_construction(workdir):
+    folder = str(workdir)
+    store = TaskStore("tasks.db")
+    soon = datetime.now() + timedelta(seconds=60)
+    later = datetime.now() + timedelta(days=1)
+    tasks = [new_task(folder, "soon", next_run=soon.strftime(task_core.TIME_FORMAT)),
+             new_task(folder, "later", next_run=later.strftime(task_core.TIME_FORMAT)),
+             new_task(folder, "unknown", "0 0 1 1 *")]
+    store.apply_batch(tasks)
+    store.close()
+    eng = make_engine(folder)
+    try:
+        assert len(eng.scheduler) == 1
+        assert {task["name"] for task in eng._deferred} == {"later", "unknown"}
+        eng.start()
+        # The rest follows in the background, with next_run computed once
+        assert wait_for(lambda: len(eng.scheduler) == 3)
+        unknown = next(task for task in eng.tasks if task["name"] == "unknown")
+        assert unknown["next_run"].endswith("-01-01 00:00:00")
+        assert wait_for(lambda: "next_run" in next(t for t in eng.store.load_tasks() if t["name"] == "unknown"))
+    finally:
+        eng.stop()
+
+def test_task_removed_before_deferred_pass_is_not_scheduled(workdir):
+    folder = str(workdir)
+    store = TaskStore("tasks.db")
+    task = new_task(folder, "gone", next_run=(datetime.now() + timedelta(days=1)).strftime(task_core.TIME_FORMAT))
+    store.insert_task(task)
+    store.close()
+    eng = make_engine(folder)
+    try:
+        eng.remove_task(eng.tasks[0])
+        # The pass start() runs in the background, here on this thread
+        eng._schedule_deferred()
+        assert len(eng.scheduler) == 0
+    finally:
+        eng.store.close()
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import threading
+
+import pytest
+
+import task_file
+from conftest import new_task, make_engine, wait_for
+
+def managed(task_id, name, **fields):
+    task = {"id": task_id, "name": name, "file_path": f"/x/{name}.py", "cron_expr": "0 0 * * *",
+            "status": "Active", "retention": 1, "log_executions": 1, "max_instances": 1,
+            "depends_on": [], "source": task_file.SOURCE}
+    task.update(fields)
+    return task
+
+def entry(name, **fields):
+    return dict({"name": name, "file_path": f"/x/{name}.py", "cron_expr": "0 0 * * *"}, **fields)
+
+def test_diff_creates_updates_and_deletes():
+    tasks = [managed(1, "keep"), managed(2, "edit"), managed(3, "gone")]
+    create, update, delete = task_file.diff(tasks, [entry("keep"), entry("edit", cron_expr="*/5 * * * *"), entry("new")])
+    assert [t["name"] for t in create] == ["new"] and create[0]["source"] == task_file.SOURCE
+    assert [(t["id"], fields) for t, fields in update] == [(2, {"cron_expr": "*/5 * * * *"})]
+    assert [t["id"] for t in delete] == [3]
+
+def test_diff_leaves_window_tasks_alone():
+    window = managed(1, "mine", source=None)
+    create, update, delete = task_file.diff([window], [entry("other")])
+    assert [t["name"] for t in create] == ["other"] and not update and not delete
+    # Its name is not taken over by the file (it would be deleted later)
+    with pytest.raises(ValueError, match="window"):
+        task_file.diff([window], [entry("mine")])
+
+@pytest.mark.parametrize("entries, message", [
+    ([entry("a"), entry("a")], "more than one"),
+    ([entry("a", cron_expr="bad")], "Invalid cron"),
+    (["a"], "JSON object"),
+])
+def test_diff_rejects_invalid_files(entries, message):
+    with pytest.raises(ValueError, match=message):
+        task_file.diff([], entries)
+
+def write_entries(folder, entries):
+    with open(os.path.join(folder, "tasks.json"), "w") as f:
+        json.dump(entries, f)
+
+def test_reload_applies_edits(workdir):
+    folder = str(workdir)
+    write_entries(folder, [new_task(folder, "a"), new_task(folder, "b")])
+    engine = make_engine(folder, reload_tasks_file=True)
+    engine.start()
+    try:
+        # Imported at startup and managed by the file from then on
+        assert wait_for(lambda: engine._tasks_file_seen is not None)
+        assert sorted(t["name"] for t in engine.tasks) == ["a", "b"]
+        assert all(t.get("source") == task_file.SOURCE for t in engine.tasks)
+        window = new_task(folder, "w")
+        engine.add_task(window)
+        write_entries(folder, [new_task(folder, "a", cron_expr="*/5 * * * *"), new_task(folder, "c")])
+        engine.reload_tasks_file()
+        names = {t["name"]: t for t in engine.list_tasks()}
+        assert sorted(names) == ["a", "c", "w"] and names["a"]["cron_expr"] == "*/5 * * * *"
+        assert window in engine.tasks
+        # Invalid file: nothing changes
+        write_entries(folder, [new_task(folder, "a"), new_task(folder, "w")])
+        engine.reload_tasks_file()
+        assert sorted(t["name"] for t in engine.tasks) == ["a", "c", "w"]
+    finally:
+        engine.stop()
+
+def test_imported_tasks_are_managed_once_reload_is_turned_on(workdir):
+    folder = str(workdir)
+    write_entries(folder, [new_task(folder, "a")])
+    make_engine(folder).stop()
+    engine = make_engine(folder, reload_tasks_file=True)
+    try:
+        write_entries(folder, [new_task(folder, "a", cron_expr="*/5 * * * *")])
+        engine.reload_tasks_file()
+        assert [(t["name"], t["cron_expr"]) for t in engine.tasks] == [("a", "*/5 * * * *")]
+    finally:
+        engine.stop()
+
+def test_overlapping_reloads_create_once(workdir, monkeypatch):
+    # A slow diff widens the window between reading the tasks and applying
+    diff = task_file.diff
+    def slow_diff(tasks, entries):
+        result = diff(tasks, entries)
+        time.sleep(0.05)
+        return result
+    monkeypatch.setattr(task_file, "diff", slow_diff)
+    folder = str(workdir)
+    engine = make_engine(folder, reload_tasks_file=True)
+    try:
+        for round in range(3):
+            write_entries(folder, [new_task(folder, f"t{round}-{i}") for i in range(20)])
+            barrier = threading.Barrier(4)
+            def reload():
+                barrier.wait()
+                engine.reload_tasks_file()
+            threads = [threading.Thread(target=reload) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(30)
+            names = [t["name"] for t in engine.tasks]
+            assert sorted(names) == sorted(f"t{round}-{i}" for i in range(20))
+    finally:
+        engine.stop()
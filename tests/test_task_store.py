@@ -0,0 +1,99 @@
+import json
+import sqlite3
+
+import pytest
+
+from task_store import TaskStore
+
+@pytest.fixture
+def store(workdir):
+    store = TaskStore("tasks.db")
+    yield store
+    store.close()
+
+def test_task_round_trip(store):
+    task = {"name": "a", "cron_expr": "0 * * * *", "env": {"X": "1"}}
+    task_id = store.insert_task(task)
+    assert task["id"] == task_id
+    task["cron_expr"] = "*/5 * * * *"
+    store.update_task(task)
+    other = store.insert_task({"name": "b"})
+    assert store.load_tasks() == [task, {"name": "b", "id": other}]
+    store.delete_task(task)
+    assert [t["name"] for t in store.load_tasks()] == ["b"]
+
+def test_runtime_update_keeps_settings(store):
+    task = {"name": "a", "cron_expr": "0 * * * *"}
+    store.insert_task(task)
+    version = store.tasks_version()
+    # A stale copy elsewhere only writes the runtime fields back
+    stale = dict(task, cron_expr="stale", next_run="2030-01-01 00:00:00", last_execution="x")
+    store.update_runtime(stale)
+    [loaded] = store.load_tasks()
+    assert loaded["cron_expr"] == "0 * * * *"
+    assert (loaded["next_run"], loaded["last_execution"]) == ("2030-01-01 00:00:00", "x")
+    assert store.tasks_version() == version
+
+def test_version_moves_with_definitions(store):
+    assert store.tasks_version() == 0
+    task = {"name": "a"}
+    store.insert_task(task)
+    store.update_task(task)
+    store.apply_batch(inserts=[{"name": "b"}])
+    store.delete_task(task)
+    assert store.tasks_version() == 4
+    # Visible to other connections (other instances)
+    other = TaskStore("tasks.db")
+    try:
+        assert other.tasks_version() == 4
+    finally:
+        other.close()
+
+def test_apply_batch(store):
+    keep = {"name": "keep"}
+    gone = {"name": "gone"}
+    store.insert_task(keep)
+    store.insert_task(gone)
+    store.set_fingerprint(gone["id"], "digest", [])
+    keep["cron_expr"] = "0 0 * * *"
+    new = {"name": "new"}
+    store.apply_batch(inserts=[new], updates=[keep], deletes=[gone])
+    assert new["id"] > gone["id"]
+    assert store.load_tasks() == [keep, new]
+    assert store.get_fingerprint(gone["id"]) is None
+
+def test_run_history(store):
+    task = {"name": "a"}
+    store.insert_task(task)
+    first = store.start_run(task, "scheduled", "2024-01-01 00:00:00")
+    store.finish_run(first, "2024-01-01 00:00:02", 0, 2.0, {"cpu_user": 0.5}, lag=0.1, status="ok")
+    second = store.start_run(task, "manual", "2024-01-01 01:00:00")
+    runs = store.runs(task["id"])
+    assert [run["id"] for run in runs] == [second, first]
+    assert runs[0]["ended"] is None
+    assert (runs[1]["duration"], runs[1]["cpu_user"], runs[1]["lag"], runs[1]["status"]) == (2.0, 0.5, 0.1, "ok")
+    assert store.runs(limit=1) == runs[:1]
+
+def test_migrate_json_once(store, workdir):
+    with open("tasks.json", "w") as f:
+        json.dump([{"id": "old", "name": "a"}, {"name": "b"}], f)
+    assert store.migrate_json("tasks.json", source="tasks.json") == 2
+    assert store.migrate_json("tasks.json") == 0
+    tasks = store.load_tasks()
+    assert [(t["name"], t["source"]) for t in tasks] == [("a", "tasks.json"), ("b", "tasks.json")]
+    assert all(isinstance(t["id"], int) for t in tasks)
+    assert store.migrate_json("missing.json") == 0
+
+def test_old_runs_table_gets_new_columns(workdir):
+    conn = sqlite3.connect("old.db")
+    conn.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL,"
+                 " kind TEXT NOT NULL, started TEXT NOT NULL, ended TEXT, exit_code INTEGER, duration REAL)")
+    conn.execute("INSERT INTO runs (task_id, kind, started) VALUES (1, 'manual', '2024-01-01 00:00:00')")
+    conn.commit()
+    conn.close()
+    store = TaskStore("old.db")
+    try:
+        [run] = store.runs()
+        assert run["kind"] == "manual" and run["status"] is None
+    finally:
+        store.close()
@@ -0,0 +1,119 @@
+import os
+import sys
+import shutil
+import threading
+
+import pytest
+
+import triggers
+from conftest import wait_for
+
+class Recorder:
+    def __init__(self):
+        self.paths = []
+        self.lock = threading.Lock()
+
+    def __call__(self, task, path):
+        with self.lock:
+            self.paths.append(path)
+
+    def seen(self, path):
+        with self.lock:
+            return path in self.paths
+
+def write(path, text="x"):
+    with open(path, "w") as f:
+        f.write(text)
+
+def test_split_spec(tmp_path):
+    assert triggers.split_spec(str(tmp_path)) == (str(tmp_path), "*")
+    assert triggers.split_spec(str(tmp_path / "*.csv")) == (str(tmp_path), "*.csv")
+    assert triggers.split_spec(str(tmp_path / "later") + os.sep) == (str(tmp_path / "later"), "*")
+    with pytest.raises(ValueError):
+        triggers.split_spec(str(tmp_path / "*" / "a.csv"))
+
+def test_matches_skips_hidden_files():
+    assert triggers.matches("a.csv", "*.csv")
+    assert not triggers.matches(".a.csv", "*.csv")
+    assert triggers.matches(".a.csv", ".*")
+
+@pytest.mark.parametrize("backend", ["poll", "auto"])
+def test_poll_backend_without_inotify(tmp_path, monkeypatch, backend):
+    # As on Windows: no inotify, so the thread waits on its event and scans
+    monkeypatch.setattr(triggers._Inotify, "create", classmethod(lambda cls: None))
+    recorder = Recorder()
+    watcher = triggers.Watcher(recorder, backend=backend, poll_seconds=0.1)
+    write(tmp_path / "old.csv")
+    watcher.set_task({"id": 1, "name": "t", "watch": [str(tmp_path / "*.csv")]})
+    watcher.start()
+    try:
+        assert wait_for(lambda: watcher.stats()["polled"] == 1)
+        assert wait_for(lambda: watcher._polled.get(str(tmp_path)) is not None)
+        write(tmp_path / "new.csv")
+        write(tmp_path / "skip.txt")
+        assert wait_for(lambda: recorder.seen(str(tmp_path / "new.csv")))
+        assert watcher.stats()["backend"] == "poll"
+        assert not recorder.seen(str(tmp_path / "old.csv"))
+        assert not recorder.seen(str(tmp_path / "skip.txt"))
+        # A second task added later is picked up through the wake-up event
+        other = tmp_path / "other"
+        other.mkdir()
+        watcher.set_task({"id": 2, "name": "u", "watch": [str(other)]})
+        assert wait_for(lambda: watcher._polled.get(str(other)) is not None)
+        write(other / "a")
+        assert wait_for(lambda: recorder.seen(str(other / "a")))
+    finally:
+        watcher.stop()
+    watcher._thread.join(2)
+    assert not watcher._thread.is_alive()
+
+inotify = pytest.mark.skipif(not sys.platform.startswith("linux") or triggers._Inotify.create() is None,
+                             reason="needs inotify")
+
+@inotify
+def test_inotify_reports_closed_files(tmp_path):
+    recorder = Recorder()
+    watcher = triggers.Watcher(recorder, poll_seconds=0.1)
+    watcher.set_task({"id": 1, "name": "t", "watch": [str(tmp_path)]})
+    watcher.start()
+    try:
+        assert wait_for(lambda: watcher.stats()["inotify_watches"] == 1)
+        write(tmp_path / "a")
+        assert wait_for(lambda: recorder.seen(str(tmp_path / "a")))
+        assert watcher.stats()["backend"] == "inotify"
+    finally:
+        watcher.stop()
+
+@inotify
+def test_inotify_rewatches_recreated_folder(tmp_path):
+    # Deleted and recreated well within poll_seconds of the last sync
+    folder = tmp_path / "in"
+    folder.mkdir()
+    recorder = Recorder()
+    watcher = triggers.Watcher(recorder, poll_seconds=0.2)
+    watcher.set_task({"id": 1, "name": "t", "watch": [str(folder)]})
+    watcher.start()
+    try:
+        assert wait_for(lambda: watcher.stats()["inotify_watches"] == 1)
+        shutil.rmtree(folder)
+        folder.mkdir()
+        assert wait_for(lambda: str(folder) in watcher._dir_wds and watcher.stats()["inotify_watches"] == 1)
+        write(folder / "b")
+        assert wait_for(lambda: recorder.seen(str(folder / "b")))
+    finally:
+        watcher.stop()
+
+@inotify
+def test_missing_folder_is_watched_once_created(tmp_path):
+    folder = tmp_path / "later"
+    recorder = Recorder()
+    watcher = triggers.Watcher(recorder, poll_seconds=0.1)
+    watcher.set_task({"id": 1, "name": "t", "watch": [str(folder) + os.sep]})
+    watcher.start()
+    try:
+        folder.mkdir()
+        assert wait_for(lambda: watcher.stats()["inotify_watches"] == 1)
+        write(folder / "c")
+        assert wait_for(lambda: recorder.seen(str(folder / "c")))
+    finally:
+        watcher.stop()
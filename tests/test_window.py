@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from conftest import make_engine, new_task
+
+tk = pytest.importorskip("tkinter")
+
+@pytest.fixture
+def window(workdir):
+    # The Tk window on a fresh engine; skipped where there is no display
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        pytest.skip(f"no display: {e}")
+    import task_runner
+    app = task_runner.TaskRunner(make_engine(str(workdir)))
+    yield app
+    app.engine.stop()
+    app.root.destroy()
+
+def rows(app):
+    return [(iid, app.task_tree.item(iid, "values")[0]) for iid in app.task_tree.get_children()]
+
+def test_rows_follow_task_changes(window, workdir):
+    app = window
+    first = new_task(str(workdir), "first")
+    second = new_task(str(workdir), "second")
+    app.engine.add_task(first)
+    app.engine.add_task(second)
+    app.update_task_list()
+    assert rows(app) == [(str(first["id"]), "first"), (str(second["id"]), "second")]
+    assert app.page_label.cget("text") == "Page 1/1 (2 tasks)"
+    # Only the changed row is rewritten; the other keeps its cached values
+    kept = app.row_cache[str(second["id"])]
+    first["status"] = "Paused"
+    app.update_task_list()
+    assert app.task_tree.item(str(first["id"]), "values")[4] == "Paused"
+    assert app.row_cache[str(second["id"])] is kept
+    app.engine.remove_task(first)
+    app.update_task_list()
+    assert rows(app) == [(str(second["id"]), "second")]
+    assert str(first["id"]) not in app.row_cache
+
+def test_engine_events_are_drained_on_the_tk_loop(window, workdir, monkeypatch):
+    app = window
+    task = new_task(str(workdir), "evented")
+    refreshes = []
+    update = app.update_task_list
+    monkeypatch.setattr(app, "update_task_list", lambda: (refreshes.append(1), update()))
+    # Engine threads only queue events; a burst is one refresh
+    thread = threading.Thread(target=app.engine.add_task, args=(task,))
+    thread.start()
+    thread.join()
+    for _ in range(5):
+        app.on_engine_event("changed", task, None)
+    assert not refreshes
+    app.drain_ui_events()
+    assert len(refreshes) == 1
+    assert rows(app) == [(str(task["id"]), "evented")]
@@ -0,0 +1,317 @@
+"""File-change triggers ("watch" in a task).
+
+A task's "watch" is a list of directories (end the path with a separator
+if it does not exist yet), single files, or patterns such as
+/data/incoming/*.csv with wildcards in the last part only. A file counts as
+changed once it has been written and closed, or moved in. On Linux the
+directories are watched with inotify (through ctypes), so nothing runs
+until something happens; elsewhere, with "watch_backend": "poll", or once
+the inotify watch limit is reached, they are scanned every
+"watch_poll_seconds" instead. Subdirectories are not watched.
+
+The engine collects the changed paths and debounces them into one run.
+"""
+import os
+import re
+import sys
+import errno
+import fnmatch
+import select
+import time
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+READ_SIZE = 64 * 1024
+MAGIC = re.compile(r"[*?[]")
+
+def split_spec(spec):
+    # (directory, file name pattern) for one watch entry; raises ValueError
+    path = os.path.abspath(os.path.expanduser(spec))
+    if spec.endswith(("/", os.sep)) or (not MAGIC.search(os.path.basename(path)) and os.path.isdir(path)):
+        return path, "*"
+    folder, pattern = os.path.split(path)
+    if MAGIC.search(folder):
+        raise ValueError(f"{spec}: wildcards are only supported in the last part of a watch path")
+    return folder, pattern
+
+def matches(name, pattern):
+    # Like glob: "*" does not match hidden files (often partial downloads)
+    if name.startswith(".") and not pattern.startswith("."):
+        return False
+    return fnmatch.fnmatch(name, pattern)
+
+class _Inotify:
+    # The inotify fd and a pipe that wakes the watcher thread out of
+    # select(); both only exist on Linux, where select() takes any fd
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+
+    @classmethod
+    def create(cls):
+        # None where inotify is not available
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError):
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logging.warning(f"inotify is not available ({os.strerror(ctypes.get_errno())}), polling watched folders")
+            return None
+        return cls(libc, fd)
+
+    def add(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def remove(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def wait(self, timeout):
+        # Until events are queued (True), wake() is called or the timeout
+        # (None = no timeout) passes
+        readable, _, _ = select.select([self.fd, self._wake_r], [], [], timeout)
+        if self._wake_r in readable:
+            os.read(self._wake_r, 4096)
+        return self.fd in readable
+
+    def wake(self):
+        os.write(self._wake_w, b"x")
+
+    def read(self):
+        # (wd, mask, name) of every queued event
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+class Watcher:
+    # One thread for every watched task. on_change(task, path) is called
+    # from it for each changed file. Directories that do not exist (yet) are
+    # retried every poll interval; files already in a directory when it is
+    # first watched do not count as changes.
+    def __init__(self, on_change, backend="auto", poll_seconds=2):
+        self.on_change = on_change
+        self.backend = backend
+        self.poll_seconds = max(0.1, float(poll_seconds or 2))
+        self._lock = threading.Lock()
+        self._specs = {}  # task id -> (task, [(directory, pattern)])
+        self._dirs = {}  # directory -> [(task, pattern)], replaced whole on every change
+        self._inotify = None
+        self._wds = {}  # inotify watch descriptor -> directory
+        self._dir_wds = {}
+        self._polled = {}  # directory -> {name: (mtime_ns, size)}, or None before its first scan
+        self._wakeup = threading.Event()  # set when the watched folders changed or on stop
+        self._thread = None
+        self._started = False
+        self._stopped = False
+
+    def set_task(self, task):
+        # (Re)read the task's "watch" list; an empty one stops watching for it
+        specs = []
+        for spec in task.get("watch") or []:
+            try:
+                specs.append(split_spec(spec))
+            except ValueError as e:
+                logging.error(f"Not watching for {task.get('name')}: {e}")
+        with self._lock:
+            if specs:
+                self._specs[task["id"]] = (task, specs)
+            elif self._specs.pop(task["id"], None) is None:
+                return
+            self._rebuild()
+        self._wake()
+
+    def remove_task(self, task_id):
+        with self._lock:
+            if self._specs.pop(task_id, None) is None:
+                return
+            self._rebuild()
+        self._wake()
+
+    def _rebuild(self):
+        dirs = {}
+        for task, specs in self._specs.values():
+            for folder, pattern in specs:
+                dirs.setdefault(folder, []).append((task, pattern))
+        self._dirs = dirs
+
+    def start(self):
+        self._started = True
+        self._wake()
+
+    def _wake(self):
+        if not self._started or self._stopped:
+            return
+        if self._thread is None:
+            if not self._specs:
+                return
+            if self.backend != "poll":
+                self._inotify = _Inotify.create()
+            self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+            self._thread.start()
+        else:
+            self._signal()
+
+    def _signal(self):
+        self._wakeup.set()
+        inotify = self._inotify
+        if inotify is not None:
+            inotify.wake()
+
+    def stop(self):
+        self._stopped = True
+        if self._thread is not None:
+            self._signal()
+
+    def stats(self):
+        backend = None if self._thread is None else "inotify" if self._inotify else "poll"
+        return {"backend": backend, "directories": len(self._dirs),
+                "inotify_watches": len(self._wds), "polled": len(self._polled)}
+
+    def _run(self):
+        next_check = 0
+        try:
+            while not self._stopped:
+                if self._wakeup.is_set():
+                    self._wakeup.clear()
+                    next_check = 0  # the watched folders changed
+                now = time.monotonic()
+                if now >= next_check:
+                    waiting = self._sync()
+                    if self._polled:
+                        self._scan()
+                    next_check = now + self.poll_seconds
+                # Blocks until an event arrives unless something must be checked
+                timeout = max(0, next_check - time.monotonic()) if waiting else None
+                if self._inotify is None:
+                    self._wakeup.wait(timeout)
+                elif self._inotify.wait(timeout) and self._read_events():
+                    next_check = 0  # a watched folder went away: watch it again once it is back
+        except Exception as e:
+            logging.error(f"File watcher stopped: {e}")
+        finally:
+            if self._inotify:
+                self._inotify.close()
+
+    def _sync(self):
+        # Bring the inotify watches and polled directories in line with
+        # _dirs; True if anything has to be checked again after poll_seconds
+        dirs = self._dirs
+        missing = False
+        for folder in list(self._dir_wds):
+            if folder not in dirs:
+                wd = self._dir_wds.pop(folder)
+                self._wds.pop(wd, None)
+                self._inotify.remove(wd)
+        for folder in list(self._polled):
+            if folder not in dirs:
+                del self._polled[folder]
+        for folder in dirs:
+            if folder in self._dir_wds or folder in self._polled:
+                continue
+            if not os.path.isdir(folder):
+                missing = True
+                continue
+            if self._inotify is not None:
+                try:
+                    wd = self._inotify.add(folder)
+                    self._wds[wd] = folder
+                    self._dir_wds[folder] = wd
+                    continue
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        missing = True
+                        continue
+                    logging.warning(f"Cannot watch {folder} with inotify ({e.strerror}), polling it")
+            self._polled[folder] = None
+        return missing or bool(self._polled)
+
+    def _read_events(self):
+        # True if a watched folder was deleted or moved away
+        lost = False
+        for wd, mask, name in self._inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: every task gets its folders as the change
+                logging.warning("inotify queue overflowed, some changed files are not known")
+                for folder, watchers in self._dirs.items():
+                    for task, _ in watchers:
+                        self.on_change(task, folder)
+                continue
+            folder = self._wds.get(wd)
+            if folder is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # The folder went away; _sync() waits for it to come back
+                if mask & IN_IGNORED or self._dir_wds.get(folder) == wd:
+                    self._wds.pop(wd, None)
+                    if self._dir_wds.get(folder) == wd:
+                        del self._dir_wds[folder]
+                        if mask & IN_MOVE_SELF:
+                            self._inotify.remove(wd)
+                    lost = True
+                continue
+            if not mask & IN_ISDIR:
+                self._changed(folder, name)
+        return lost
+
+    def _scan(self):
+        for folder in list(self._polled):
+            try:
+                with os.scandir(folder) as entries:
+                    files = {}
+                    for entry in entries:
+                        if entry.is_file():
+                            st = entry.stat()
+                            files[entry.name] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                # Gone; watched again (inotify first) once it is back
+                del self._polled[folder]
+                continue
+            previous = self._polled[folder]
+            self._polled[folder] = files
+            if previous is None:
+                continue
+            for name, signature in files.items():
+                if previous.get(name) != signature:
+                    self._changed(folder, name)
+
+    def _changed(self, folder, name):
+        for task, pattern in self._dirs.get(folder, ()):
+            if matches(name, pattern):
+                self.on_change(task, os.path.join(folder, name))